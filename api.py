@@ -0,0 +1,593 @@
+""" Local JSON-RPC API, so scripts, cron jobs and build hooks can change the tasks of a running app.
+
+Start either app with TODO_API set to a port (8765), host:port (127.0.0.1:8765)
+or a Unix socket path (/tmp/todo.sock). Calls are JSON-RPC 2.0 objects, or
+arrays of them, POSTed over HTTP:
+
+    curl -d '{"jsonrpc": "2.0", "id": 1, "method": "add", "params": {"text": "Buy milk"}}' localhost:8765
+
+or with the client in this file:
+
+    python api.py add '{"text": "Buy milk", "reminder": "daily 09:00"}'
+    python api.py list '{"limit": 10}'
+
+Methods: add, add_many, update, remove, remove_many, set_reminder,
+set_reminders and list; see TaskCalls. Reminders use the rules the apps
+store (recurrence.py), and a bare "HH:mm" means once, today or tomorrow
+if that time has passed.
+"""
+import argparse
+import asyncio
+import http.client
+import itertools
+import json
+import os
+import socket
+import stat
+import sys
+import threading
+from collections import deque
+
+from recurrence import rule_from_input
+from taskstore import STATUS_NONE, STATUS_DONE, STATUS_WRONG
+
+DEFAULT_ADDRESS = "127.0.0.1:8765"
+# Calls run per event-loop turn of the app, the rest wait for the next turn
+API_BATCH = 2000
+# Seconds the tasks changed by API calls are gathered for before the list shows them
+VIEW_INTERVAL = 0.1
+# Most tasks one list call returns
+MAX_LIST = 1000
+# Largest request body read, in bytes
+MAX_BODY = 16 * 1024 * 1024
+
+# JSON-RPC error codes
+PARSE_ERROR = -32700
+INVALID_REQUEST = -32600
+METHOD_NOT_FOUND = -32601
+INVALID_PARAMS = -32602
+INTERNAL_ERROR = -32603
+TASK_ERROR = -32000  # The call was well formed but can't be done, e.g. a duplicate task
+
+# Default for update() arguments that leave the task's value alone
+KEEP = object()
+
+
+class CallError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+def parse_address(address):
+    """ (host, port) for "port" or "host:port", the path itself for a Unix socket """
+    if os.sep in address or address.endswith(".sock"):
+        return address
+    host, _, port = address.rpartition(":")
+    return host or "127.0.0.1", int(port)
+
+
+def task_text(value):
+    if not isinstance(value, str) or not value.strip():
+        raise CallError(INVALID_PARAMS, "Task text must be a non-empty string")
+    return value.strip()
+
+
+def reminder_rule(value):
+    if value is None or value == "":
+        return None
+    if not isinstance(value, str):
+        raise CallError(INVALID_PARAMS, "Reminder must be a string")
+    try:
+        return rule_from_input(value)
+    except ValueError:
+        raise CallError(INVALID_PARAMS, f"Malformed reminder: {value!r}") from None
+
+
+def task_status(value):
+    if isinstance(value, bool) or value not in (STATUS_NONE, STATUS_DONE, STATUS_WRONG):
+        raise CallError(INVALID_PARAMS, f"Status must be {STATUS_NONE}, {STATUS_DONE} or {STATUS_WRONG}")
+    return value
+
+
+def text_list(value):
+    if not isinstance(value, list):
+        raise CallError(INVALID_PARAMS, "Expected a list of task texts")
+    return [task_text(text) for text in value]
+
+
+def row_json(row):
+    text, reminder, status = row
+    return {"text": text, "reminder": reminder, "status": status}
+
+
+class TaskCalls:
+    """ The API's methods, run on the app's thread against its storage for one batch of calls.
+
+    Writes are gathered in pending, text -> row or None for a removed task, and
+    stored with one delete_many and one put_many when the batch is done, or
+    before a list call so it sees them. A stored task given a new text is
+    stored with storage.rename(), so it keeps its place. changes keeps
+    everything the batch did, in the (text, row) form storage.take_changes()
+    uses, and renamed the (old text, new text) pairs, for the app to apply to
+    its list.
+    """
+
+    def __init__(self, storage):
+        self.storage = storage
+        self.pending = {}
+        self.renames = {}  # New text -> the stored task's text, for tasks renamed since the last flush
+        self.changes = {}
+        self.renamed = []
+
+    def row(self, text):
+        if text in self.pending:
+            return self.pending[text]
+        return self.storage.get(text)
+
+    def existing(self, text):
+        row = self.row(text)
+        if row is None:
+            raise CallError(TASK_ERROR, f"No such task: {text!r}")
+        return row
+
+    def set(self, text, row):
+        self.pending[text] = row
+        self.changes[text] = row
+
+    def flush(self):
+        renamed = {}
+        for text, old_text in self.renames.items():
+            row = self.pending[text]
+            if row is not None:  # Otherwise it was removed after all
+                self.storage.rename(old_text, *row)
+                renamed[old_text] = text
+        self.renamed.extend(renamed.items())
+        deleted = [text for text, row in self.pending.items() if row is None and text not in renamed]
+        if deleted:
+            self.storage.delete_many(deleted)
+        rows = [row for text, row in self.pending.items() if row is not None and text not in self.renames]
+        if rows:
+            self.storage.put_many(rows)
+        self.pending = {}
+        self.renames = {}
+
+    def run(self, call):
+        """ Run one JSON-RPC call object, return its response, or None for a notification """
+        call_id = call.get("id") if isinstance(call, dict) else None
+        try:
+            if not isinstance(call, dict) or call.get("jsonrpc") != "2.0" or not isinstance(call.get("method"), str):
+                raise CallError(INVALID_REQUEST, "Invalid request")
+            method = METHODS.get(call["method"])
+            if method is None:
+                raise CallError(METHOD_NOT_FOUND, f"Method not found: {call['method']!r}")
+            params = call.get("params", [])
+            try:
+                if isinstance(params, dict):
+                    result = method(self, **params)
+                elif isinstance(params, list):
+                    result = method(self, *params)
+                else:
+                    raise CallError(INVALID_PARAMS, "params must be an array or an object")
+            except TypeError as error:
+                raise CallError(INVALID_PARAMS, str(error)) from None
+        except CallError as error:
+            return {"jsonrpc": "2.0", "id": call_id, "error": {"code": error.code, "message": str(error)}}
+        except Exception as error:
+            # A bug or a storage failure fails this call only, not the batch or the app
+            print(f"API call {call['method']!r} failed: {error!r}")
+            return {"jsonrpc": "2.0", "id": call_id, "error": {"code": INTERNAL_ERROR, "message": "Internal error"}}
+        if "id" not in call:
+            return None
+        return {"jsonrpc": "2.0", "id": call_id, "result": result}
+
+    def add(self, text, reminder=None, status=STATUS_NONE):
+        """ Add a task, return it """
+        text = task_text(text)
+        row = (text, reminder_rule(reminder), task_status(status))
+        if self.row(text) is not None:
+            raise CallError(TASK_ERROR, f"Task already exists: {text!r}")
+        self.set(text, row)
+        return row_json(row)
+
+    def add_many(self, tasks):
+        """ Add tasks given as texts or {"text", "reminder", "status"} objects, skipping ones already listed.
+
+        Every task is checked before any is added. Returns {"added": count}.
+        """
+        if not isinstance(tasks, list):
+            raise CallError(INVALID_PARAMS, "Expected a list of tasks")
+        rows = []
+        for task in tasks:
+            if isinstance(task, dict):
+                rows.append((task_text(task.get("text")), reminder_rule(task.get("reminder")),
+                             task_status(task.get("status", STATUS_NONE))))
+            else:
+                rows.append((task_text(task), None, STATUS_NONE))
+        added = 0
+        for row in rows:
+            if self.row(row[0]) is None:
+                self.set(row[0], row)
+                added += 1
+        return {"added": added}
+
+    def update(self, text, new_text=KEEP, reminder=KEEP, status=KEEP):
+        """ Rename a task and/or change its reminder or status, return it """
+        old_text, old_reminder, old_status = self.existing(task_text(text))
+        new_text = old_text if new_text is KEEP else task_text(new_text)
+        row = (
+            new_text,
+            old_reminder if reminder is KEEP else reminder_rule(reminder),
+            old_status if status is KEEP else task_status(status),
+        )
+        if new_text != old_text:
+            if self.row(new_text) is not None:
+                raise CallError(TASK_ERROR, f"Task already exists: {new_text!r}")
+            self.set(old_text, None)
+            stored_text = self.renames.pop(old_text, old_text)
+            if stored_text != new_text and self.storage.contains(stored_text):
+                self.renames[new_text] = stored_text
+        self.set(new_text, row)
+        return row_json(row)
+
+    def remove(self, text):
+        """ Remove a task """
+        text = self.existing(task_text(text))[0]
+        self.set(text, None)
+        return True
+
+    def remove_many(self, texts):
+        """ Remove the listed ones of texts, return {"removed": count} """
+        removed = 0
+        for text in text_list(texts):
+            if self.row(text) is not None:
+                self.set(text, None)
+                removed += 1
+        return {"removed": removed}
+
+    def set_reminder(self, text, reminder):
+        """ Set or, with null, clear a task's reminder, return the task """
+        return self.update(text, reminder=reminder)
+
+    def set_reminders(self, texts, reminder):
+        """ Give the listed ones of texts the same reminder, return {"updated": count} """
+        reminder = reminder_rule(reminder)
+        updated = 0
+        for text in text_list(texts):
+            row = self.row(text)
+            if row is not None:
+                self.set(text, (text, reminder, row[2]))
+                updated += 1
+        return {"updated": updated}
+
+    def list_tasks(self, cursor=None, limit=100):
+        """ Return {"tasks": [...], "cursor": ...} for up to limit tasks after cursor, in list order """
+        if isinstance(limit, bool) or not isinstance(limit, int) or limit < 1:
+            raise CallError(INVALID_PARAMS, "limit must be a positive integer")
+        if cursor is not None and (isinstance(cursor, bool) or not isinstance(cursor, int)):
+            raise CallError(INVALID_PARAMS, "cursor must be null or the cursor of the previous page")
+        self.flush()
+        rows, cursor = self.storage.page(cursor, min(limit, MAX_LIST))
+        return {"tasks": [row_json(row) for row in rows], "cursor": cursor}
+
+
+METHODS = {
+    "add": TaskCalls.add,
+    "add_many": TaskCalls.add_many,
+    "update": TaskCalls.update,
+    "remove": TaskCalls.remove,
+    "remove_many": TaskCalls.remove_many,
+    "set_reminder": TaskCalls.set_reminder,
+    "set_reminders": TaskCalls.set_reminders,
+    "list": TaskCalls.list_tasks,
+}
+
+
+class BadRequest(Exception):
+    pass
+
+
+async def read_request(reader):
+    """ Read one HTTP request, return (method, headers, body), or None once the client hangs up """
+    line = await reader.readline()
+    if not line:
+        return None
+    parts = line.decode("latin-1").split()
+    if len(parts) != 3:
+        raise BadRequest()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise BadRequest() from None
+    if not 0 <= length <= MAX_BODY:
+        raise BadRequest()
+    body = await reader.readexactly(length) if length else b""
+    return parts[0], headers, body
+
+
+def http_response(status, reason, body=b"", keep_alive=True):
+    head = (
+        f"HTTP/1.1 {status} {reason}\r\n"
+        f"Content-Type: application/json\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+
+class ApiServer:
+    """ asyncio HTTP server on its own thread, handing JSON-RPC calls to the app's thread.
+
+    The server thread only parses requests and queues their calls; listener()
+    is called from it when the queue goes from empty to not empty. The app
+    then calls process() on its own thread, through a queued Qt signal or a
+    Clock event, which runs up to API_BATCH queued calls with one storage write
+    and answers them all. Calls arriving meanwhile just join the queue, so a
+    burst of requests costs the app a few batches, not one wake-up each.
+    """
+
+    def __init__(self, address, listener=None):
+        self.address = parse_address(address)
+        self.listener = listener
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.ready = threading.Event()
+        self.error = None
+        self.closed = False
+        self.lock = threading.Lock()
+        self.queue = deque()  # (calls, future) per HTTP request
+        # Server thread only: open connections and the requests they wait on, closed and failed on shutdown
+        self.writers = set()
+        self.waiting = set()
+
+    def start(self):
+        """ Start serving, raise OSError if the address can't be bound """
+        self.thread = threading.Thread(target=self._run, name="todo-api", daemon=True)
+        self.thread.start()
+        self.ready.wait()
+        if self.error is not None:
+            raise self.error
+
+    def close(self):
+        if self.loop is None or self.error is not None or self.closed:
+            return
+        self.closed = True
+        self.listener = None
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        if isinstance(self.address, str) and os.path.exists(self.address):
+            os.unlink(self.address)
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        try:
+            self.server = self.loop.run_until_complete(self._serve())
+        except OSError as error:
+            self.error = error
+            self.loop.close()
+            self.ready.set()
+            return
+        if not isinstance(self.address, str):
+            # Port 0 binds a free port, report the one picked
+            self.address = self.server.sockets[0].getsockname()[:2]
+        self.ready.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            self._fail(self.waiting)
+            for writer in self.writers:
+                writer.close()
+            # Every handler now sees its connection end, let them finish
+            tasks = asyncio.all_tasks(self.loop)
+            if tasks:
+                self.loop.run_until_complete(asyncio.wait(tasks, timeout=1))
+            self.loop.close()
+
+    async def _serve(self):
+        if isinstance(self.address, str):
+            # A socket left behind by an instance that crashed
+            if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+                os.unlink(self.address)
+            return await asyncio.start_unix_server(self._handle, path=self.address)
+        host, port = self.address
+        return await asyncio.start_server(self._handle, host, port)
+
+    async def _handle(self, reader, writer):
+        """ Serve one connection, a request at a time while the client keeps it alive """
+        self.writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except BadRequest:
+                    writer.write(http_response(400, "Bad Request", keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, headers, body = request
+                keep_alive = headers.get("connection", "").lower() != "close"
+                if method != "POST":
+                    writer.write(http_response(405, "Method Not Allowed", keep_alive=keep_alive))
+                else:
+                    body = await self._rpc(body)
+                    if body:
+                        writer.write(http_response(200, "OK", body, keep_alive))
+                    else:
+                        writer.write(http_response(204, "No Content", keep_alive=keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    async def _rpc(self, body):
+        """ Queue the calls of one request for the app's thread, return the encoded responses """
+        try:
+            message = json.loads(body)
+        except ValueError:
+            return json.dumps({"jsonrpc": "2.0", "id": None,
+                               "error": {"code": PARSE_ERROR, "message": "Parse error"}}).encode()
+        batch = isinstance(message, list)
+        calls = message if batch else [message]
+        if not calls:
+            return json.dumps({"jsonrpc": "2.0", "id": None,
+                               "error": {"code": INVALID_REQUEST, "message": "Empty batch"}}).encode()
+        future = self.loop.create_future()
+        with self.lock:
+            self.queue.append((calls, future))
+            wake = len(self.queue) == 1
+        if wake and self.listener is not None:
+            self.listener()
+        self.waiting.add(future)
+        try:
+            responses = [response for response in await future if response is not None]
+        finally:
+            self.waiting.discard(future)
+        if not responses:
+            return b""
+        return json.dumps(responses if batch else responses[0], ensure_ascii=False).encode()
+
+    def process(self, storage, limit=API_BATCH):
+        """ On the app's thread: run queued calls against storage, about limit at a time.
+
+        Returns (changes, renamed, more): the (text, row) pairs to apply to the
+        list, the (old text, new text) pairs of tasks renamed in place, to apply
+        before them, and whether calls are still queued, in which case the app
+        calls again on its next turn.
+        """
+        if self.closed:
+            return [], [], False
+        groups = []
+        count = 0
+        with self.lock:
+            while self.queue and count < limit:
+                groups.append(self.queue.popleft())
+                count += len(groups[-1][0])
+            more = bool(self.queue)
+        calls = TaskCalls(storage)
+        answers = [(future, [calls.run(call) for call in group]) for group, future in groups]
+        try:
+            calls.flush()
+        except Exception as error:
+            # Raising here would take the app down from inside its event loop
+            print(f"Failed to store API changes: {error!r}")
+            self.loop.call_soon_threadsafe(self._fail, [future for group, future in groups])
+            return [], [], more
+        self.loop.call_soon_threadsafe(self._answer, answers)
+        return list(calls.changes.items()), calls.renamed, more
+
+    @staticmethod
+    def _answer(answers):
+        for future, responses in answers:
+            if not future.done():  # The client may have hung up
+                future.set_result(responses)
+
+    @staticmethod
+    def _fail(futures):
+        error = {"code": INTERNAL_ERROR, "message": "Internal error"}
+        for future in futures:
+            if not future.done():
+                future.set_result([{"jsonrpc": "2.0", "id": None, "error": error}])
+
+
+class ApiError(Exception):
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class ApiClient:
+    """ Calls a running app's API over one kept-alive connection.
+
+        client = ApiClient("127.0.0.1:8765")
+        client.call("add", "Buy milk", "daily 09:00")
+        client.batch([("remove", ["Buy milk"]), ("list", {"limit": 5})])
+    """
+
+    def __init__(self, address=None, timeout=30):
+        address = address or os.environ.get("TODO_API") or DEFAULT_ADDRESS
+        if isinstance(address, str):
+            address = parse_address(address)
+        if isinstance(address, str):
+            self.connection = UnixHTTPConnection(address, timeout)
+        else:
+            self.connection = http.client.HTTPConnection(*address, timeout=timeout)
+        self.ids = itertools.count(1)
+
+    def post(self, message):
+        self.connection.request("POST", "/", json.dumps(message).encode(), {"Content-Type": "application/json"})
+        response = self.connection.getresponse()
+        body = response.read()
+        if response.status not in (200, 204):
+            raise ApiError(INTERNAL_ERROR, f"HTTP {response.status} {response.reason}")
+        return json.loads(body) if body else None
+
+    def call(self, method, *args, **kwargs):
+        """ Call one method with positional or keyword params, return its result or raise ApiError """
+        response = self.post({"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": kwargs or list(args)})
+        if "error" in response:
+            raise ApiError(response["error"]["code"], response["error"]["message"])
+        return response["result"]
+
+    def batch(self, calls):
+        """ Send (method, params) calls in one request, return their results in order, ApiErrors for failures """
+        ids = [next(self.ids) for _ in calls]
+        responses = self.post([{"jsonrpc": "2.0", "id": call_id, "method": method, "params": params}
+                               for call_id, (method, params) in zip(ids, calls)])
+        by_id = {response.get("id"): response for response in responses}
+        results = []
+        for call_id in ids:
+            response = by_id.get(call_id, {"error": {"code": INTERNAL_ERROR, "message": "No response"}})
+            if "error" in response:
+                results.append(ApiError(response["error"]["code"], response["error"]["message"]))
+            else:
+                results.append(response["result"])
+        return results
+
+    def close(self):
+        self.connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Call the API of a running to-do app")
+    parser.add_argument("method", choices=sorted(METHODS))
+    parser.add_argument("params", nargs="?", default="[]", help="JSON array or object of the method's params")
+    parser.add_argument("--address", help=f"defaults to TODO_API, else {DEFAULT_ADDRESS}")
+    args = parser.parse_args()
+    params = json.loads(args.params)
+    client = ApiClient(args.address)
+    try:
+        result = client.call(args.method, **params) if isinstance(params, dict) else client.call(args.method, *params)
+    except ApiError as error:
+        print(f"Error {error.code}: {error}", file=sys.stderr)
+        sys.exit(1)
+    finally:
+        client.close()
+    print(json.dumps(result, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Decoded ringtones kept in memory, least recently used dropped first
+CACHE_BYTES = 32 * 1024 * 1024
+# Mixer channels, so reminders firing together overlap instead of cutting each other off
+CHANNELS = 8
+
+
+class AudioService:
+    """ pygame mixer started off the UI thread, with ringtones decoded ahead of playback.
+
+    pygame is imported and the mixer opened on a worker thread when start() is called,
+    nothing touches the audio device before that. preload() decodes a file into a
+    Sound on the same thread, so play() only has to hand the buffer to a free channel.
+    """
+
+    def __init__(self, cache_bytes=CACHE_BYTES, channels=CHANNELS):
+        self.cache_bytes = cache_bytes
+        self.channels = channels
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="Audio")
+        self.lock = threading.Lock()
+        self.started = None  # Future of the mixer start-up
+        self.start_failure_logged = False
+        self.pygame = None
+        self.sounds = OrderedDict()  # path -> (Sound, bytes), most recently used last
+        self.cache_size = 0
+
+    def start(self):
+        """ Import pygame and open the mixer in the background """
+        with self.lock:
+            if self.started is None:
+                self.started = self.executor.submit(self._init)
+            return self.started
+
+    def _init(self):
+        import pygame
+        pygame.mixer.init()
+        pygame.mixer.set_num_channels(self.channels)
+        self.pygame = pygame
+
+    def preload(self, path):
+        """ Decode path into the cache in the background, return the Future """
+        self.start()
+        return self.executor.submit(self._load, path)
+
+    def _sound_bytes(self, sound):
+        frequency, size, channels = self.pygame.mixer.get_init()
+        return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+    def _load(self, path):
+        """ Return the cached Sound for path, decoding it first if needed; None if pygame can't """
+        error = self.started.exception()  # Done already, start() queued it on this thread first
+        if error is not None:
+            if not self.start_failure_logged:
+                self.start_failure_logged = True
+                print(f"Audio unavailable, ringtones will not play: {error}")
+            return None
+        with self.lock:
+            entry = self.sounds.get(path)
+            if entry is not None:
+                self.sounds.move_to_end(path)
+                return entry[0]
+        try:
+            sound = self.pygame.mixer.Sound(path)
+        except self.pygame.error:
+            return None  # Not decodable as a whole, play() streams it instead
+        size = self._sound_bytes(sound)
+        with self.lock:
+            self.sounds[path] = (sound, size)
+            self.cache_size += size
+            # Always keep the newest, even if it alone is over budget
+            while self.cache_size > self.cache_bytes and len(self.sounds) > 1:
+                old_sound, old_size = self.sounds.popitem(last=False)[1]
+                self.cache_size -= old_size
+        return sound
+
+    def play(self, path):
+        """ Play path on a free channel, decoding it now if it was not preloaded.
+
+        Raises whatever pygame raises for a missing or unreadable file.
+        """
+        self.play_later(path).result()
+
+    def play_later(self, path):
+        """ Play path from the audio thread without waiting, return the Future.
+
+        The Future's result() raises whatever pygame raised for the file.
+        """
+        self.start()
+        return self.executor.submit(self._play, path)
+
+    def _play(self, path):
+        self.started.result()  # Re-raises a failed start-up, for the caller to report
+        sound = self._load(path)
+        if sound is None:
+            # Formats Sound cannot decode still play through the streaming music channel
+            self.pygame.mixer.music.load(path)
+            self.pygame.mixer.music.play()
+            return
+        channel = self.pygame.mixer.find_channel(True)  # Steals the oldest if all are busy
+        channel.play(sound)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
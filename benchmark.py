@@ -0,0 +1,359 @@
+""" Benchmark both front-ends against synthetic task lists.
+
+    python benchmark.py --sizes 1000 10000 100000 1000000 --apps qt kivy --output benchmark.json
+
+Each app and size runs in its own worker process, inside a temporary directory
+holding a generated tasks.json, so peak RSS is measured per run. Qt uses the
+offscreen platform and Kivy an offscreen SDL window, so no display is needed.
+Start-up is timed separately: the app is launched several times with
+TODO_STARTUP_EXIT=1 and the time from launch to its first painted frame is kept.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [1000, 10000, 100000, 1000000]
+APPS = ("qt", "kivy")
+# Tasks touched by each of the add / remove / reminder operations
+DEFAULT_BATCH = 100
+# Client threads calling the API at once, each adds batch tasks with one call per task
+API_CLIENTS = 4
+# Launches timed per app and size for the time to first paint
+DEFAULT_STARTUP_RUNS = 5
+WORDS = ("buy", "call", "email", "fix", "read", "write", "plan", "clean", "pay", "book", "review", "send")
+
+
+def generate_tasks(size, layout, seed=0):
+    """ Return a tasks.json dict with size tasks in the qt or kivy layout, a tenth with reminders """
+    rng = random.Random(seed)
+    tasks = {}
+    for i in range(size):
+        text = f"{rng.choice(WORDS)} {rng.choice(WORDS)} #{i}"
+        reminder = f"{rng.randrange(24):02d}:{rng.randrange(60):02d}" if i % 10 == 0 else None
+        if layout == "kivy":
+            tasks[text] = {"task_text": text, "reminder_time": reminder or ""}
+        else:
+            tasks[text] = reminder
+    return tasks
+
+
+def peak_rss():
+    """ Peak resident set size of this process in bytes, None where it cannot be read """
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+class Timings:
+    """ Collects the wall time and peak RSS after each named operation """
+
+    def __init__(self):
+        self.results = {}
+
+    def measure(self, name, func, count=1):
+        start = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - start
+        self.results[name] = {"seconds": seconds, "per_op": seconds / count, "count": count, "peak_rss": peak_rss()}
+
+
+def run_api_clients(address, count, pump):
+    """ Add count tasks from each of API_CLIENTS threads through the app's API, running pump() meanwhile """
+    from api import ApiClient
+
+    def send(client_id):
+        client = ApiClient(address)
+        for i in range(count):
+            client.call("add", f"api task {client_id} {i}")
+        client.close()
+
+    threads = [threading.Thread(target=send, args=(client_id,)) for client_id in range(API_CLIENTS)]
+    for thread in threads:
+        thread.start()
+    while any(thread.is_alive() for thread in threads):
+        pump()
+    for thread in threads:
+        thread.join()
+
+
+def run_qt(batch):
+    from PyQt5.QtWidgets import QApplication, QMessageBox
+    from PyQt5.QtCore import QItemSelection, QItemSelectionModel
+    app = QApplication([])
+    # Modal dialogs would block the run
+    QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    QMessageBox.warning = staticmethod(lambda *args, **kwargs: QMessageBox.Ok)
+    import final
+    from order import SORT_ADDED, SORT_TEXT
+
+    loaded = []
+    finish_loading = final.ToDoApp.finish_loading
+
+    def finish_and_note(self):
+        finish_loading(self)
+        loaded.append(True)
+
+    final.ToDoApp.finish_loading = finish_and_note
+    timings = Timings()
+    holder = {}
+
+    def load():
+        window = holder["window"] = final.ToDoApp()
+        window.show()
+        while not loaded:
+            app.processEvents()
+
+    timings.measure("load_tasks", load)
+    window = holder["window"]
+
+    def add(prefix="benchmark task"):
+        for i in range(batch):
+            window.input_field.setText(f"{prefix} {i}")
+            window.add_task()
+        app.processEvents()
+
+    timings.measure("add_task", add, batch)
+
+    def remove():
+        model = window.task_list.model()
+        selection = QItemSelection(model.index(0), model.index(min(batch, model.rowCount()) - 1))
+        window.task_list.selectionModel().select(selection, QItemSelectionModel.Select)
+        window.remove_task()
+        app.processEvents()
+
+    timings.measure("remove_task", remove, batch)
+    timings.measure("save_tasks", window.save_tasks)
+
+    def check():
+        now = time.time()
+        rows, cursor = window.storage.page(None, batch)
+        for text, reminder, status in rows:
+            window.storage.put(text, reminder or "08:00", status)
+            window.scheduler.schedule(text, now - 1)
+        window.check_reminders()
+
+    timings.measure("check_reminders", check, batch)
+    timings.measure("api_add", lambda: run_api_clients(window.api_server.address, batch, app.processEvents),
+                    API_CLIENTS * batch)
+
+    def sort(*sorts):
+        for choice in sorts:
+            window.sort_box.setCurrentIndex(window.sort_box.findData(choice))
+            app.processEvents()
+
+    # The first switch builds the A to Z index, after that it is kept up to date
+    timings.measure("sort_tasks", lambda: sort(SORT_TEXT))
+    timings.measure("sorted_add", lambda: add("sorted task"), batch)
+    timings.measure("switch_sort", lambda: sort(SORT_ADDED, SORT_TEXT), 2)
+
+    def theme():
+        for i in range(10):
+            window.toggle_theme()
+            app.processEvents()
+
+    timings.measure("set_theme", theme, 10)
+    window.close()
+    return timings.results
+
+
+def run_kivy(batch):
+    # kivy.py sits next to this file and would shadow the kivy package
+    sys.path[:] = [path for path in sys.path if os.path.abspath(path or os.curdir) != REPO_DIR]
+    import kivy  # noqa: F401
+    import importlib.util
+    from kivy.clock import Clock
+    sys.path.append(REPO_DIR)
+    spec = importlib.util.spec_from_file_location("kivy_app", os.path.join(REPO_DIR, "kivy.py"))
+    kivy_app = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(kivy_app)
+    from order import SORT_CHOICES, SORT_ADDED, SORT_TEXT
+    sort_labels = {choice: label for label, choice in SORT_CHOICES}
+
+    timings = Timings()
+    holder = {}
+
+    def load():
+        app = holder["app"] = kivy_app.ToDoApp()
+        app.build()
+        # There is no window loop here, start what the first frame would have
+        app.after_first_paint(0)
+        while app.load_progress.parent is not None:
+            Clock.tick()
+
+    timings.measure("load_tasks", load)
+    app = holder["app"]
+
+    def add(prefix="benchmark task"):
+        for i in range(batch):
+            app.input_field.text = f"{prefix} {i}"
+            app.reminder_field.text = ""
+            app.add_task(None)
+        Clock.tick()
+
+    timings.measure("add_task", add, batch)
+
+    def remove():
+        task_list = app.task_list
+        for row in task_list.data[:batch]:
+            task_list.set_selected(row["task_id"], True)
+        app.remove_task(None)
+        Clock.tick()
+
+    timings.measure("remove_task", remove, batch)
+    timings.measure("save_tasks", app.save_tasks)
+
+    def check():
+        now = time.time()
+        for row in app.task_list.data[:batch]:
+            text = row["task_text"]
+            app.tasks.set_reminder(app.tasks.row_of(text), row["reminder"] or "08:00")
+            app.scheduler.schedule(text, now - 1)
+        app.check_reminders(0)
+
+    timings.measure("check_reminders", check, batch)
+    timings.measure("api_add", lambda: run_api_clients(app.api_server.address, batch, Clock.tick),
+                    API_CLIENTS * batch)
+
+    def sort(*sorts):
+        for choice in sorts:
+            app.sort_spinner.text = sort_labels[choice]
+            Clock.tick()
+
+    # The first switch builds the A to Z index, after that it is kept up to date
+    timings.measure("sort_tasks", lambda: sort(SORT_TEXT))
+    timings.measure("sorted_add", lambda: add("sorted task"), batch)
+    timings.measure("switch_sort", lambda: sort(SORT_ADDED, SORT_TEXT), 2)
+    app.on_stop()
+    return timings.results
+
+
+def worker(app_name, batch):
+    results = run_qt(batch) if app_name == "qt" else run_kivy(batch)
+    print(json.dumps({"operations": results, "peak_rss": peak_rss()}))
+
+
+def entry_command(app_name):
+    """ Command line that starts an app the way a user would """
+    if app_name == "qt":
+        return [sys.executable, os.path.join(REPO_DIR, "final.py")]
+    # Run as a path, python kivy.py would put kivy.py in front of the kivy package
+    code = (f"import runpy, sys; sys.path.append({REPO_DIR!r}); "
+            f"runpy.run_path({os.path.join(REPO_DIR, 'kivy.py')!r}, run_name='__main__')")
+    return [sys.executable, "-c", code]
+
+
+def failure(proc):
+    """ The last line a failed run wrote to stderr, or its exit status """
+    return proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit {proc.returncode}"
+
+
+def time_startup(app_name, directory, env, runs):
+    """ Return (seconds from launch to first paint of each launch that worked, errors of the ones that didn't) """
+    env = dict(env, TODO_STARTUP_EXIT="1")
+    env.pop("TODO_API", None)
+    times = []
+    errors = []
+    for _ in range(runs):
+        launched = time.time()
+        proc = subprocess.run(entry_command(app_name), cwd=directory, env=env, capture_output=True, text=True)
+        lines = proc.stdout.strip().splitlines()
+        if proc.returncode != 0 or not lines:
+            errors.append(failure(proc) if proc.returncode != 0 else "no first paint reported")
+            continue
+        times.append(json.loads(lines[-1])["painted_at"] - launched)
+    return times, errors
+
+
+def run_one(app_name, size, batch, storage, startup_runs=DEFAULT_STARTUP_RUNS):
+    """ Run one app against a fresh tasks.json of size tasks, return its result dict """
+    with tempfile.TemporaryDirectory(prefix="todo-bench-") as directory:
+        with open(os.path.join(directory, "tasks.json"), "w", encoding="utf-8") as file:
+            json.dump(generate_tasks(size, app_name), file)
+        env = dict(os.environ)
+        env.update({
+            "QT_QPA_PLATFORM": "offscreen",
+            "SDL_VIDEODRIVER": "offscreen",
+            "SDL_AUDIODRIVER": "dummy",
+            "KIVY_NO_ARGS": "1",
+            "KIVY_NO_CONSOLELOG": "1",
+            "TODO_STORAGE": storage,
+            "TODO_API": "127.0.0.1:0",  # A free port
+        })
+        command = [sys.executable, os.path.abspath(__file__), "--worker", app_name, "--batch", str(batch)]
+        proc = subprocess.run(command, cwd=directory, env=env, capture_output=True, text=True)
+        startup, startup_errors = time_startup(app_name, directory, env, startup_runs)
+    result = {"app": app_name, "size": size, "storage": storage}
+    if startup:
+        startup.sort()
+        result["startup"] = {"runs": len(startup), "median": startup[len(startup) // 2],
+                             "min": startup[0], "max": startup[-1]}
+    if startup_errors:
+        result["startup_errors"] = startup_errors
+    if proc.returncode != 0:
+        result["error"] = failure(proc)
+        return result
+    # The apps print progress of their own, the JSON document is the last line
+    result.update(json.loads(proc.stdout.strip().splitlines()[-1]))
+    return result
+
+
+def print_summary(results):
+    for result in results:
+        name = f"{result['app']:5} {result['size']:>8} {result['storage']:6}"
+        if "error" in result:
+            print(f"{name}  failed: {result['error']}")
+            continue
+        operations = ", ".join(f"{op} {timing['seconds'] * 1000:.1f} ms" for op, timing in result["operations"].items())
+        rss = f"{result['peak_rss'] / 2 ** 20:.0f} MB" if result["peak_rss"] else "n/a"
+        paint = f"first paint {result['startup']['median'] * 1000:.0f} ms  " if "startup" in result else ""
+        if "startup_errors" in result:
+            paint += f"first paint failed {len(result['startup_errors'])}x: {result['startup_errors'][-1]}  "
+        print(f"{name}  peak RSS {rss}  {paint}{operations}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the to-do front-ends on synthetic tasks.json files")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--apps", nargs="+", choices=APPS, default=list(APPS))
+    parser.add_argument("--storage", choices=("json", "sqlite"), default="json")
+    parser.add_argument("--batch", type=int, default=DEFAULT_BATCH, help="tasks per add/remove/reminder operation")
+    parser.add_argument("--startup-runs", type=int, default=DEFAULT_STARTUP_RUNS,
+                        help="launches timed to first paint, 0 to skip")
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--worker", choices=APPS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        worker(args.worker, args.batch)
+        return
+    results = []
+    for size in args.sizes:
+        for app_name in args.apps:
+            results.append(run_one(app_name, size, args.batch, args.storage, args.startup_runs))
+            print_summary(results[-1:])
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
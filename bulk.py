@@ -0,0 +1,225 @@
+""" Import and export tasks in bulk, without starting either app.
+
+    python bulk.py import tasks.csv
+    python bulk.py import todo.txt --storage sqlite
+    python bulk.py export tasks.jsonl
+    python bulk.py export - --format text
+
+Tasks go straight into the storage the apps use (tasks.json and its journal, or
+tasks.db with --storage sqlite / TODO_STORAGE=sqlite), so run it while they are
+closed. Files are read and written a batch at a time.
+
+Formats, picked from the file extension unless --format is given:
+  csv    text,reminder,status columns; reminder and status are optional, a header row is recognised
+  jsonl  one {"text": ..., "reminder": ..., "status": ...} object or plain string per line
+  text   one task per line, optionally followed by a tab and a reminder
+Reminders use the rules the apps store, see recurrence.py.
+"""
+import argparse
+import csv
+import functools
+import itertools
+import json
+import operator
+import os
+import sys
+import time
+
+from recurrence import parse_rule
+from storage import open_storage, LAYOUT_QT, LAYOUT_KIVY
+from taskstore import STATUS_NONE, STATUS_DONE, STATUS_WRONG
+
+FORMATS = ("csv", "jsonl", "text")
+EXTENSIONS = {".csv": "csv", ".jsonl": "jsonl", ".ndjson": "jsonl"}
+# Tasks read, checked and stored per round trip to the storage
+BATCH_SIZE = 10000
+# Column names accepted in a CSV header and as JSONL keys
+TEXT_KEYS = ("text", "task", "task_text")
+REMINDER_KEYS = ("reminder", "reminder_time")
+STATUS_KEYS = ("status",)
+
+
+def guess_format(path):
+    return EXTENSIONS.get(os.path.splitext(path)[1].lower(), "text")
+
+
+def first_key(record, keys):
+    for key in keys:
+        if key in record:
+            return record[key]
+    return None
+
+
+def read_text(file):
+    for line in file:
+        text, _, reminder = line.rstrip("\r\n").partition("\t")
+        yield text, reminder, None
+
+
+def read_csv(file):
+    reader = csv.reader(file)
+    header = next(reader, None)
+    if header is None:
+        return
+    names = [name.strip().lower() for name in header]
+    if names and names[0] in TEXT_KEYS + REMINDER_KEYS + STATUS_KEYS:
+        columns = [next((names.index(key) for key in keys if key in names), None)
+                   for keys in (TEXT_KEYS, REMINDER_KEYS, STATUS_KEYS)]
+        records = reader
+    else:
+        # No header, the first row is already a task
+        columns = [0, 1, 2]
+        records = itertools.chain([header], reader)
+    # Short rows are padded and a missing column reads the None appended last
+    width = max(column for column in columns if column is not None) + 1
+    pick = operator.itemgetter(*(column if column is not None else -1 for column in columns))
+    for record in records:
+        if len(record) < width:
+            record.extend([None] * (width - len(record)))
+        record.append(None)
+        yield pick(record)
+
+
+def read_jsonl(file):
+    for line in file:
+        line = line.strip()
+        if not line:
+            continue
+        value = json.loads(line)
+        if isinstance(value, dict):
+            yield first_key(value, TEXT_KEYS), first_key(value, REMINDER_KEYS), first_key(value, STATUS_KEYS)
+        else:
+            yield value, None, None
+
+
+READERS = {"csv": read_csv, "jsonl": read_jsonl, "text": read_text}
+
+
+class ImportStats:
+    def __init__(self):
+        self.read = 0
+        self.added = 0
+        self.skipped = 0  # Empty lines and rows without a task
+        self.bad_reminders = 0
+
+
+def clean_rows(raw_rows, stats):
+    """ Turn raw (text, reminder, status) values into storage rows, dropping what can't be used """
+    for text, reminder, status in raw_rows:
+        stats.read += 1
+        text = str(text).strip() if text is not None else ""
+        if not text:
+            stats.skipped += 1
+            continue
+        reminder = str(reminder).strip() if reminder else None
+        if reminder:
+            try:
+                parse_rule(reminder)
+            except ValueError:
+                stats.bad_reminders += 1
+                reminder = None
+        try:
+            status = int(status) if status not in (None, "") else STATUS_NONE
+        except ValueError:
+            status = STATUS_NONE
+        if status not in (STATUS_NONE, STATUS_DONE, STATUS_WRONG):
+            status = STATUS_NONE
+        yield text, reminder, status
+
+
+def batches(rows, size):
+    rows = iter(rows)
+    while True:
+        batch = list(itertools.islice(rows, size))
+        if not batch:
+            return
+        yield batch
+
+
+def import_tasks(file, file_format, storage, batch_size=BATCH_SIZE):
+    """ Add every task in file that storage does not hold yet, return the ImportStats """
+    stats = ImportStats()
+    for batch in batches(clean_rows(READERS[file_format](file), stats), batch_size):
+        stats.added += storage.add_many(batch)
+    return stats
+
+
+def write_text(file, rows):
+    file.writelines(f"{text}\t{reminder}\n" if reminder else f"{text}\n" for text, reminder, status in rows)
+
+
+def write_jsonl(file, rows):
+    file.writelines(
+        json.dumps({"text": text, "reminder": reminder, "status": status}, ensure_ascii=False) + "\n"
+        for text, reminder, status in rows
+    )
+
+
+WRITERS = {"text": write_text, "jsonl": write_jsonl}
+
+
+def export_tasks(file, file_format, storage, batch_size=BATCH_SIZE):
+    """ Write every stored task to file a page at a time, return how many were written """
+    if file_format == "csv":
+        writer = csv.writer(file)
+        writer.writerow(["text", "reminder", "status"])
+        write = writer.writerows
+    else:
+        write = functools.partial(WRITERS[file_format], file)
+    written = 0
+    cursor = None
+    while True:
+        rows, cursor = storage.page(cursor, batch_size)
+        if not rows:
+            return written
+        write(rows)
+        written += len(rows)
+
+
+def open_file(path, mode):
+    if path == "-":
+        stream = sys.stdin if mode == "r" else sys.stdout
+        stream.reconfigure(newline="", encoding="utf-8")
+        return stream
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import or export to-do tasks without a display")
+    parser.add_argument("command", choices=("import", "export"))
+    parser.add_argument("path", help="file to read or write, - for stdin/stdout")
+    parser.add_argument("--format", choices=FORMATS, help="defaults to the file extension, text otherwise")
+    parser.add_argument("--storage", choices=("json", "sqlite"), help="defaults to TODO_STORAGE, else json")
+    parser.add_argument("--layout", choices=(LAYOUT_QT, LAYOUT_KIVY), default=LAYOUT_QT,
+                        help="tasks.json layout: qt for final.py (default), kivy for kivy.py")
+    parser.add_argument("--batch", type=int, default=BATCH_SIZE, help="tasks per storage batch")
+    args = parser.parse_args()
+    file_format = args.format or guess_format(args.path)
+    storage = open_storage(args.layout, args.storage)
+    start = time.perf_counter()
+    try:
+        file = open_file(args.path, "r" if args.command == "import" else "w")
+        try:
+            if args.command == "import":
+                stats = import_tasks(file, file_format, storage, args.batch)
+            else:
+                written = export_tasks(file, file_format, storage, args.batch)
+        finally:
+            if file not in (sys.stdin, sys.stdout):
+                file.close()
+        if args.command == "import":
+            storage.save()
+    finally:
+        storage.close()
+    seconds = time.perf_counter() - start
+    # Summaries go to stderr, stdout may be the export itself
+    if args.command == "import":
+        print(f"Imported {stats.added} of {stats.read} tasks in {seconds:.1f}s: "
+              f"{stats.read - stats.added - stats.skipped} duplicates, {stats.skipped} empty, "
+              f"{stats.bad_reminders} malformed reminders dropped", file=sys.stderr)
+    else:
+        print(f"Exported {written} tasks in {seconds:.1f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,62 +1,153 @@
-import sys
-import json
 import os
+import sys
+import time
+# Start-up is timed from here to the window's first paint
+STARTED = time.perf_counter()
+from contextlib import contextmanager
 from PyQt5.QtWidgets import (
-    QApplication, QWidget, QVBoxLayout, QLineEdit, QPushButton, QListWidget, QListWidgetItem,
-    QHBoxLayout, QLabel, QCheckBox, QMessageBox, QButtonGroup, QMainWindow, QTimeEdit, QFileDialog
+    QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLineEdit, QPushButton, QListView,
+    QLabel, QMessageBox, QMainWindow, QDateTimeEdit, QComboBox, QSpinBox, QFileDialog, QProgressBar,
+    QAbstractItemView, QListWidget, QShortcut
 )
-from PyQt5.QtCore import Qt, QTimer, QTime, pyqtSignal
-import pygame
+from PyQt5.QtCore import Qt, QTimer, QDateTime, QFileSystemWatcher, pyqtSignal
+from PyQt5.QtGui import QKeySequence
+from audio import AudioService
+from history import UndoHistory
+from instrument import instrumentation, timed, HEARTBEAT_INTERVAL
+from notify import NotificationQueue, summary
+from order import SORT_CHOICES, SORT_ADDED
+from recurrence import first_due, make_rule, ONCE, DAILY, WEEKDAYS, HOURLY, MONTHLY
+from scheduler import ReminderScheduler, MAX_TIMER_SLEEP
+from search import TrigramIndex
+from settings import Settings
+from storage import open_storage, ARCHIVE_DAYS
+from taskmodel import TaskListModel, TaskFilterModel, TaskDelegate, PAGE_SIZE, STATUS_DONE
+from theme import ThemeManager, DEFAULT_THEME
 
-class TaskItem(QWidget):
-    reminder_off = pyqtSignal(str)  # Signal to indicate reminder should be turned off
+# Seconds of upcoming reminders pulled from storage into the scheduler heap at a time
+REMINDER_WINDOW = 60 * 60
+# Saved tasks read (and indexed for search) per event-loop turn at startup
+LOAD_BATCH = 2000
+# Repeat choices offered next to the reminder time, the first is the default
+REPEAT_CHOICES = (
+    ("Daily", DAILY), ("Once", ONCE), ("Weekdays", WEEKDAYS), ("Every N hours", HOURLY), ("Monthly", MONTHLY),
+)
+# Due tasks listed in the reminder panel, the rest are only counted
+PANEL_TASKS = 100
+# Seconds between moves of long-done tasks into the archive, the first is once loading finishes
+ARCHIVE_INTERVAL = 60 * 60
+
+
+class ReminderPanel(QWidget):
+    """ Non-modal window listing the reminders that fired, until it is dismissed.
+
+    Reminders arriving while it is open are added to it, so however many fire
+    there is one window, and nothing waits for the user to close it.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent, Qt.Tool | Qt.WindowStaysOnTopHint)
+        self.setWindowTitle("Reminders")
+        self.setAttribute(Qt.WA_ShowWithoutActivating)  # Don't steal focus from typing
+        self.texts = []
+        layout = QVBoxLayout(self)
+        self.title = QLabel()
+        self.title.setWordWrap(True)
+        self.task_list = QListWidget()
+        self.note = QLabel()
+        self.note.hide()
+        self.dismiss_button = QPushButton("Dismiss")
+        self.dismiss_button.clicked.connect(self.dismiss)
+        layout.addWidget(self.title)
+        layout.addWidget(self.task_list)
+        layout.addWidget(self.note)
+        layout.addWidget(self.dismiss_button)
+
+    def add_reminders(self, texts):
+        listed = len(self.texts)
+        self.texts.extend(texts)
+        if listed < PANEL_TASKS:
+            self.task_list.addItems(texts[:PANEL_TASKS - listed])
+        self.title.setText(summary(self.texts))
+        self.show()
+        self.raise_()
+
+    def set_note(self, text):
+        self.note.setText(text)
+        self.note.show()
+
+    def dismiss(self):
+        self.texts = []
+        self.task_list.clear()
+        self.note.hide()
+        self.hide()
+
+
+class ArchivePanel(QWidget):
+    """ Window listing archived tasks, read from storage a page at a time once it is opened """
+    restore_requested = pyqtSignal(list)
+
+    def __init__(self, storage, parent=None):
+        super().__init__(parent, Qt.Window)
+        self.setWindowTitle("Archive")
+        self.storage = storage
+        self.cursor = None
+        self.exhausted = True
+        layout = QVBoxLayout(self)
+        self.task_list = QListWidget()
+        self.task_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.task_list.verticalScrollBar().valueChanged.connect(self.scrolled)
+        self.restore_button = QPushButton("Restore")
+        self.restore_button.clicked.connect(self.restore)
+        layout.addWidget(self.task_list)
+        layout.addWidget(self.restore_button)
+
+    def open(self):
+        """ Show the archive from the start, it may have grown since it was last open """
+        self.task_list.clear()
+        self.cursor = None
+        self.exhausted = False
+        self.fetch_page()
+        self.show()
+        self.raise_()
+
+    def fetch_page(self):
+        rows, self.cursor = self.storage.archive_page(self.cursor, PAGE_SIZE)
+        self.exhausted = len(rows) < PAGE_SIZE
+        self.task_list.addItems([text for text, reminder, status in rows])
+
+    def scrolled(self, value):
+        if value == self.task_list.verticalScrollBar().maximum() and not self.exhausted:
+            self.fetch_page()
+
+    def restore(self):
+        items = self.task_list.selectedItems()
+        if not items:
+            QMessageBox.warning(self, "No Selection", "Please select a task to restore!")
+            return
+        texts = [item.text() for item in items]
+        for item in items:
+            self.task_list.takeItem(self.task_list.row(item))
+        self.restore_requested.emit(texts)
 
-    def __init__(self, text):
-        super().__init__()
-        self.checkbox_done = QCheckBox("✅")
-        self.checkbox_wrong = QCheckBox("❌")
-        self.label = QLabel(text)
-        
-        # Create a button group to ensure only one checkbox is selected at a time
-        self.button_group = QButtonGroup()
-        self.button_group.addButton(self.checkbox_done)
-        self.button_group.addButton(self.checkbox_wrong)
-        
-        # Connect the button group's signal to handle checkbox changes
-        self.button_group.buttonClicked.connect(self.on_checkbox_clicked)
-        
-        # Layout for the task item
-        layout = QHBoxLayout()
-        layout.addWidget(self.checkbox_done)
-        layout.addWidget(self.checkbox_wrong)
-        layout.addWidget(self.label)
-        layout.setSpacing(10)  # Increased spacing for better touch interaction
-        layout.setContentsMargins(10, 5, 10, 5)  # Set margins for padding
-        
-        self.setLayout(layout)
-        
-    def setText(self, text):
-        self.label.setText(text)
-        
-    def text(self):
-        return self.label.text()
-    
-    def on_checkbox_clicked(self, button):
-        # Ensure only the clicked checkbox is selected, the other gets deselected
-        if button == self.checkbox_done:
-            self.checkbox_wrong.setChecked(False)
-            self.reminder_off.emit(self.text())  # Emit signal to turn off reminder
-        else:
-            self.checkbox_done.setChecked(False)
 
 class ToDoApp(QMainWindow):
+    # Emitted from the audio thread when a ringtone could not be played
+    playback_failed = pyqtSignal(str)
+    # Emitted, from the storage's writer thread for tasks.json, when other instances changed tasks
+    storage_changed = pyqtSignal()
+    # Emitted, from the API server's thread, when calls are waiting to be run
+    api_requests = pyqtSignal()
+
     def __init__(self):
         super().__init__()
         self.setWindowTitle("To-Do List App")
         self.setGeometry(100, 100, 400, 600)  # Adjusted height for more space on mobile
         
-        # Initialize Pygame mixer for sound playback
-        pygame.mixer.init()
+        # pygame and the mixer are only started once the window is up, off the UI thread
+        self.audio = AudioService()
+        # Audio, the API and loading tasks wait for the first paint, see after_first_paint
+        self.painted = False
         
         # Central widget and layout
         self.central_widget = QWidget()
@@ -70,10 +161,49 @@ class ToDoApp(QMainWindow):
         self.edit_button = QPushButton("Edit Task")
         self.update_button = QPushButton("Update Task")
         self.remove_button = QPushButton("Remove Task")
-        self.task_list = QListWidget()
+        self.done_button = QPushButton("Mark Done")
+        self.archive_button = QPushButton("Show Archive")
+        self.undo_button = QPushButton("Undo")
+        self.redo_button = QPushButton("Redo")
+        # Tasks live in a model as plain records, the delegate paints only the visible rows
+        self.task_model = TaskListModel(self)
+        self.task_model.reminder_off.connect(self.turn_off_reminder)  # Connect the signal to handle reminder turn-off
+        self.task_model.status_changed.connect(self.save_task)
+        # The list shows the model through a filter backed by a trigram index of every task
+        self.search_index = TrigramIndex()
+        self.filter_model = TaskFilterModel(self.task_model, self.search_index, self)
+        self.filter_field = QLineEdit()
+        self.filter_field.setPlaceholderText("Filter tasks")
+        self.filter_field.textChanged.connect(self.filter_model.set_query)
+        # Sorted and grouped orders are indexes the model keeps up to date, see order.py
+        self.sort_box = QComboBox()
+        for label, sort in SORT_CHOICES:
+            self.sort_box.addItem(label, sort)
+        self.task_list = QListView()
+        self.task_list.setModel(self.filter_model)
+        self.task_list.setItemDelegate(TaskDelegate(self.task_list))
+        self.task_list.setUniformItemSizes(True)
+        # Shift/Ctrl-click select several tasks, the buttons act on all of them at once
+        self.task_list.setSelectionMode(QAbstractItemView.ExtendedSelection)
+        self.load_progress = QProgressBar()
+        self.load_progress.setFormat("Loading tasks... %p%")
+        self.load_progress.hide()
         
         # Reminder widgets
-        self.reminder_time = QTimeEdit()
+        self.reminder_time = QDateTimeEdit(QDateTime.currentDateTime())
+        self.reminder_time.setDisplayFormat("yyyy-MM-dd HH:mm")
+        self.reminder_time.setCalendarPopup(True)
+        self.repeat_box = QComboBox()
+        for label, kind in REPEAT_CHOICES:
+            self.repeat_box.addItem(label, kind)
+        self.repeat_hours = QSpinBox()
+        self.repeat_hours.setRange(1, 24 * 7)
+        self.repeat_hours.setPrefix("every ")
+        self.repeat_hours.setSuffix(" h")
+        self.repeat_hours.setEnabled(False)  # Only used by "Every N hours"
+        self.repeat_box.currentIndexChanged.connect(
+            lambda index: self.repeat_hours.setEnabled(self.repeat_box.itemData(index) == HOURLY)
+        )
         self.reminder_button = QPushButton("Set Reminder")
         self.ringtone_button = QPushButton("Choose Ringtone")
         self.ringtone_path = None
@@ -84,9 +214,24 @@ class ToDoApp(QMainWindow):
         self.layout.addWidget(self.edit_button)
         self.layout.addWidget(self.update_button)
         self.layout.addWidget(self.remove_button)
+        self.layout.addWidget(self.done_button)
+        self.layout.addWidget(self.archive_button)
+        history_layout = QHBoxLayout()
+        history_layout.addWidget(self.undo_button)
+        history_layout.addWidget(self.redo_button)
+        self.layout.addLayout(history_layout)
+        self.layout.addWidget(self.load_progress)
+        filter_layout = QHBoxLayout()
+        filter_layout.addWidget(self.filter_field)
+        filter_layout.addWidget(self.sort_box)
+        self.layout.addLayout(filter_layout)
         self.layout.addWidget(self.task_list)
         self.layout.addWidget(QLabel("Reminder Time:"))
         self.layout.addWidget(self.reminder_time)
+        repeat_layout = QHBoxLayout()
+        repeat_layout.addWidget(self.repeat_box)
+        repeat_layout.addWidget(self.repeat_hours)
+        self.layout.addLayout(repeat_layout)
         self.layout.addWidget(self.reminder_button)
         self.layout.addWidget(self.ringtone_button)
         
@@ -95,8 +240,8 @@ class ToDoApp(QMainWindow):
         self.layout.addWidget(self.theme_toggle_button)
         self.theme_toggle_button.clicked.connect(self.toggle_theme)
         
-        # Dictionary to keep track of tasks
-        self.task_widgets = {}
+        # tasks.json with its journal, or SQLite when TODO_STORAGE=sqlite
+        self.storage = open_storage()
         self.current_edit_task = None
         
         # Connecting button clicks to their respective methods
@@ -104,161 +249,405 @@ class ToDoApp(QMainWindow):
         self.edit_button.clicked.connect(self.start_edit_task)
         self.update_button.clicked.connect(self.update_task)
         self.remove_button.clicked.connect(self.remove_task)
+        self.done_button.clicked.connect(self.mark_done)
+        self.archive_button.clicked.connect(self.show_archive)
+        self.undo_button.clicked.connect(self.undo)
+        self.redo_button.clicked.connect(self.redo)
         self.reminder_button.clicked.connect(self.set_reminder)
         self.ringtone_button.clicked.connect(self.choose_ringtone)
         
         # Initially disable the update button
         self.update_button.setEnabled(False)
 
-        # Default theme
-        self.current_theme = 'light'
-        self.set_theme(self.current_theme)
+        # Adds, edits, removals, reminders and Mark Done can be undone (Ctrl+Z) and redone (Ctrl+Shift+Z)
+        self.history = UndoHistory()
+        QShortcut(QKeySequence.Undo, self, self.undo)
+        QShortcut(QKeySequence.Redo, self, self.redo)
+        self.update_history_buttons()
 
-        # Timer setup for reminders
+        # The theme chosen last time, light at first
+        self.settings = Settings()
+        self.themes = ThemeManager(QApplication.instance())
+        self.set_theme(self.settings.get("theme", DEFAULT_THEME))
+        # The order chosen last time, the list is still empty so this costs nothing
+        self.sort_box.setCurrentIndex(max(self.sort_box.findData(self.settings.get("sort", SORT_ADDED)), 0))
+        self.task_model.set_sort(self.sort_box.currentData())
+        self.sort_box.currentIndexChanged.connect(self.set_sort)
+
+        # Tasks done for a while move to an archive, which is only read once it is opened
+        self.archive_panel = ArchivePanel(self.storage, self)
+        self.archive_panel.restore_requested.connect(self.restore_archived)
+        self.archive_timer = QTimer(self)
+        self.archive_timer.timeout.connect(self.archive_done_tasks)
+
+        # Reminders are kept in a heap by due time, one single-shot timer is armed for the next one
+        self.scheduler = ReminderScheduler()
         self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.check_reminders)
-        self.timer.start(60000)  # Check every minute
-        
-        # Load tasks from file
+        self.reminder_window_end = 0
+
+        # Due reminders are gathered and shown together in one non-modal panel
+        self.notifications = NotificationQueue()
+        self.notify_timer = QTimer(self)
+        self.notify_timer.setSingleShot(True)
+        self.notify_timer.timeout.connect(self.show_notifications)
+        self.reminder_panel = ReminderPanel(self)
+        self.playback_failed.connect(self.reminder_panel.set_note)
+
+        # Other instances may share the storage: the watcher has it look for their
+        # changes, and only the tasks they touched are applied to the list
+        self.storage.listener = self.storage_changed.emit
+        self.storage_changed.connect(self.apply_storage_changes)
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.storage_files_changed)
+        self.file_watcher.directoryChanged.connect(self.storage_files_changed)
+        self.watch_storage_files()
+
+        # With TODO_API set, other programs can change the tasks over a local JSON-RPC API (api.py),
+        # its calls are run here in batches
+        self.api_server = None
+        self.api_changed = {}  # Texts of tasks API calls changed that the list doesn't show yet, in call order
+        self.api_view_timer = QTimer(self)
+        self.api_view_timer.setSingleShot(True)
+        self.api_view_timer.timeout.connect(self.show_api_changes)
+
+        # With TODO_INSTRUMENT=1, a heartbeat measures how late the event loop runs timers
+        if instrumentation.enabled:
+            self.heartbeat = QTimer(self)
+            self.heartbeat.timeout.connect(instrumentation.heartbeat)
+            self.heartbeat.start(int(HEARTBEAT_INTERVAL * 1000))
+            instrumentation.start()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.painted:
+            self.painted = True
+            QTimer.singleShot(0, self.after_first_paint)
+
+    def after_first_paint(self):
+        """ Start what the first paint doesn't need: audio, the API and loading tasks """
+        if instrumentation.first_paint(STARTED):
+            self.close()  # TODO_STARTUP_EXIT, a start-up benchmark run
+            return
+        self.audio.start()
+        self.start_api()
         self.load_tasks()
 
+    def start_api(self):
+        address = os.environ.get("TODO_API")
+        if not address:
+            return
+        # Imported here, asyncio is only worth loading when the API is on
+        from api import ApiServer, VIEW_INTERVAL
+        self.api_view_timer.setInterval(int(VIEW_INTERVAL * 1000))
+        self.api_server = ApiServer(address, listener=self.api_requests.emit)
+        self.api_requests.connect(self.apply_api_requests)
+        try:
+            self.api_server.start()
+        except OSError as error:
+            print(f"API not started on {address}: {error}")
+            self.api_server = None
+
+    @timed()
     def add_task(self):
         task = self.input_field.text().strip()
         if task:
             # Check if task already exists
-            if task in self.task_widgets:
+            if task in self.task_model or self.storage.contains(task):
                 QMessageBox.warning(self, "Duplicate Task", "This task is already in the list!")
             else:
-                item = QListWidgetItem(self.task_list)
-                task_item = TaskItem(task)
-                task_item.reminder_off.connect(self.turn_off_reminder)  # Connect the signal to handle reminder turn-off
-                item.setSizeHint(task_item.sizeHint())
-                self.task_list.setItemWidget(item, task_item)
-                self.task_widgets[task] = (item, None)  # No reminder initially
+                self.search_index.add(task, task)
+                self.task_model.add_task(task)  # No reminder initially
                 self.input_field.clear()
                 self.current_edit_task = None  # Reset the task being edited
                 self.update_button.setEnabled(False)  # Disable update button
                 # Save tasks to file
-                self.save_tasks()
+                self.save_task(task)
+                self.record_action([(task, None)], self.task_rows([task]))
         else:
             QMessageBox.warning(self, "Empty Input", "Please enter a task!")
 
+    def selected_tasks(self):
+        """ Return the texts of the selected rows, in list order """
+        # Walk the selection ranges, selectedRows() would call back into the model for every row
+        rows = sorted(row for span in self.task_list.selectionModel().selection() for row in range(span.top(), span.bottom() + 1))
+        return [self.filter_model.text_at(row) for row in rows]
+
     def start_edit_task(self):
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        selected_tasks = self.selected_tasks()
+        if not selected_tasks:
             QMessageBox.warning(self, "No Selection", "Please select a task to edit!")
             return
 
-        # Get the first selected item (assuming single selection)
-        selected_item = selected_items[0]
-        task_item = self.task_list.itemWidget(selected_item)
-        self.input_field.setText(task_item.text())  # Load selected item text into input field
+        # Get the first selected task (assuming single selection)
+        self.input_field.setText(selected_tasks[0])  # Load selected task text into input field
         
-        # Set the current task to be edited
-        self.current_edit_task = task_item.text()
-        self.task_list.takeItem(self.task_list.row(selected_item))
+        # Set the current task to be edited, its row stays in place until the update
+        self.current_edit_task = selected_tasks[0]
         
         # Enable the update button and disable the add button
         self.update_button.setEnabled(True)
         self.add_button.setEnabled(False)
 
+    @timed()
     def update_task(self):
         new_task = self.input_field.text().strip()
         if new_task:
             # Check if the new task already exists
-            if new_task in self.task_widgets and new_task != self.current_edit_task:
+            if new_task != self.current_edit_task and (new_task in self.task_model or self.storage.contains(new_task)):
                 QMessageBox.warning(self, "Duplicate Task", "This task is already in the list!")
             else:
-                # Remove the old item from task_widgets and list
-                if self.current_edit_task in self.task_widgets:
-                    old_item = self.task_widgets.pop(self.current_edit_task)
-                    self.task_list.takeItem(self.task_list.row(old_item[0]))
-                    
-                    # Create and add new task item
-                    new_item = QListWidgetItem(self.task_list)
-                    task_item = TaskItem(new_task)
-                    task_item.reminder_off.connect(self.turn_off_reminder)  # Connect the signal to handle reminder turn-off
-                    new_item.setSizeHint(task_item.sizeHint())
-                    self.task_list.setItemWidget(new_item, task_item)
-                    
-                    # Add the new task to the dictionary
-                    self.task_widgets[new_task] = (new_item, None)  # No reminder initially
+                # Replace the old record in its row with the new task
+                if self.current_edit_task in self.task_model:
+                    before = self.task_rows([self.current_edit_task])
+                    self.search_index.remove(self.current_edit_task)
+                    self.search_index.add(new_task, new_task)
+                    self.task_model.replace_task(self.current_edit_task, new_task)  # No reminder initially
+                    self.schedule_reminder(self.current_edit_task, None)
                     self.input_field.clear()
-                    self.current_edit_task = None  # Reset task being edited
                     self.update_button.setEnabled(False)  # Disable update button
                     self.add_button.setEnabled(True)  # Re-enable add button
                     # Save tasks to file
-                    self.save_tasks()
+                    self.storage.rename(self.current_edit_task, *self.task_model.task(new_task))
+                    if new_task != self.current_edit_task:
+                        self.record_action(before + [(new_task, None)],
+                                           [(self.current_edit_task, None)] + self.task_rows([new_task]))
+                    else:
+                        self.record_action(before, self.task_rows([new_task]))
+                    self.current_edit_task = None  # Reset task being edited
                 else:
                     QMessageBox.warning(self, "Edit Error", "Error updating the task!")
         else:
             QMessageBox.warning(self, "Empty Input", "Please enter a new task!")
 
+    @timed()
     def remove_task(self):
-        # Get selected items
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        # Get selected tasks
+        selected_tasks = self.selected_tasks()
+        if not selected_tasks:
             QMessageBox.warning(self, "No Selection", "Please select a task to remove!")
             return
         
-        # Remove selected items
-        for item in selected_items:
-            task_text = self.task_list.itemWidget(item).text()
-            if task_text in self.task_widgets:
-                self.task_widgets.pop(task_text)
-            self.task_list.takeItem(self.task_list.row(item))
+        # Remove selected tasks in one pass over the model and one storage write
+        before = self.task_rows(selected_tasks)
+        with self.view_frozen():
+            self.task_list.selectionModel().clear()  # Cheaper than letting the reset unpick it row by row
+            removed = self.task_model.remove_tasks(selected_tasks)
+        for task_text in removed:
+            self.search_index.remove(task_text)
+            self.scheduler.cancel(task_text)
+            self.notifications.discard(task_text)
+        self.delete_saved_tasks(removed)
+        self.record_action(before, [(task_text, None) for task_text in removed])
+        self.current_edit_task = None
+        self.arm_reminder_timer()
         self.update_button.setEnabled(False)  # Disable update button after removal
         self.add_button.setEnabled(True)  # Re-enable add button
-        # Save tasks to file
-        self.save_tasks()
 
+    @timed()
     def set_reminder(self):
-        selected_items = self.task_list.selectedItems()
-        if not selected_items:
+        selected_tasks = self.selected_tasks()
+        if not selected_tasks:
             QMessageBox.warning(self, "No Selection", "Please select a task to set a reminder!")
             return
 
-        reminder_time = self.reminder_time.time().toString("HH:mm")  # Use same format for consistency
-        task_item = self.task_list.itemWidget(selected_items[0])
-        task_text = task_item.text()
-        # Save the reminder time with the task
-        if task_text in self.task_widgets:
-            self.task_widgets[task_text] = (self.task_widgets[task_text][0], reminder_time)
-            self.save_tasks()
-            QMessageBox.information(self, "Reminder Set", f"Reminder for '{task_text}' set at {reminder_time}.")
-        else:
+        # The date and time picked plus the repeat choice become a rule string, see recurrence.py
+        moment = self.reminder_time.dateTime().toPyDateTime().replace(second=0, microsecond=0)
+        reminder_time = make_rule(self.repeat_box.currentData(), moment, self.repeat_hours.value())
+        # Save the reminder time with every selected task
+        before = self.task_rows(selected_tasks)
+        tasks = self.task_model.set_reminders(selected_tasks, reminder_time)
+        if not tasks:
             QMessageBox.warning(self, "Set Reminder Error", "Task not found!")
+            return
+        for task_text in tasks:
+            self.schedule_reminder(task_text, reminder_time, arm=False)
+        self.arm_reminder_timer()
+        self.save_tasks_batch(tasks)
+        self.record_action(before, self.task_rows(tasks))
+        if len(tasks) == 1:
+            QMessageBox.information(self, "Reminder Set", f"Reminder for '{tasks[0]}' set to {reminder_time}.")
+        else:
+            QMessageBox.information(self, "Reminder Set", f"Reminder for {len(tasks)} tasks set to {reminder_time}.")
+
+    @timed()
+    def mark_done(self):
+        selected_tasks = self.selected_tasks()
+        if not selected_tasks:
+            QMessageBox.warning(self, "No Selection", "Please select a task to mark as done!")
+            return
+        before = self.task_rows(selected_tasks)
+        with self.view_frozen():
+            tasks = self.task_model.set_status(selected_tasks, STATUS_DONE)
+        # Done tasks need no reminder, as when a single box is ticked
+        self.task_model.set_reminders(tasks, None)
+        for task_text in tasks:
+            self.scheduler.cancel(task_text)
+        self.arm_reminder_timer()
+        self.save_tasks_batch(tasks)
+        self.record_action(before, self.task_rows(tasks))
+
+    def task_rows(self, task_texts):
+        """ (text, row) pairs of the listed tasks among task_texts, as the undo history keeps them """
+        return [(task_text, self.task_model.task(task_text)) for task_text in task_texts if task_text in self.task_model]
+
+    def record_action(self, before, after):
+        self.history.record(before, after)
+        self.update_history_buttons()
+
+    @timed()
+    def undo(self):
+        self.apply_history(self.history.undo())
+
+    @timed()
+    def redo(self):
+        self.apply_history(self.history.redo())
+
+    def apply_history(self, changes):
+        """ Put the tasks an undo or redo touched back in the list and in storage """
+        if changes is not None:
+            self.current_edit_task = None
+            self.update_button.setEnabled(False)
+            self.add_button.setEnabled(True)
+            self.show_task_changes(changes)
+            self.delete_saved_tasks([task_text for task_text, row in changes if row is None])
+            self.storage.put_many([row for task_text, row in changes if row is not None])
+        self.update_history_buttons()
+
+    def update_history_buttons(self):
+        self.undo_button.setEnabled(self.history.can_undo)
+        self.redo_button.setEnabled(self.history.can_redo)
+
+    @contextmanager
+    def view_frozen(self):
+        """ Hold off repainting the list until a batch of changes is done """
+        self.task_list.setUpdatesEnabled(False)
+        try:
+            yield
+        finally:
+            self.task_list.setUpdatesEnabled(True)
 
     def choose_ringtone(self):
         options = QFileDialog.Options()
         ringtone_file, _ = QFileDialog.getOpenFileName(self, "Choose Ringtone", "", "Audio Files (*.wav *.mp3);;All Files (*)", options=options)
         if ringtone_file:
             self.ringtone_path = ringtone_file
+            self.audio.preload(ringtone_file)  # Decoded now, so a reminder starts playing at once
             QMessageBox.information(self, "Ringtone Selected", f"Ringtone set to: {self.ringtone_path}")
 
     def turn_off_reminder(self, task_text):
         """ Turn off the reminder for the given task """
-        if task_text in self.task_widgets:
-            self.task_widgets[task_text] = (self.task_widgets[task_text][0], None)
-            self.save_tasks()
+        if self.task_model.set_reminder(task_text, None):
+            self.schedule_reminder(task_text, None)
+            self.save_task(task_text)
+
+    def schedule_reminder(self, task_text, reminder_time, arm=True):
+        """ Put the task's next reminder in the scheduler heap, or drop it if reminder_time is None """
+        if reminder_time:
+            try:
+                due = first_due(reminder_time).timestamp()
+            except ValueError:
+                print(f"Invalid reminder time for task '{task_text}': {reminder_time}")
+                self.scheduler.cancel(task_text)
+            else:
+                self.scheduler.schedule(task_text, due)
+        else:
+            self.scheduler.cancel(task_text)
+        if arm:
+            self.arm_reminder_timer()
+
+    def load_reminder_window(self, start):
+        """ Schedule the reminders next due between start and the end of the next window.
 
+        The storage keeps every reminder's next occurrence and answers with a range
+        query on it, so tasks without a reminder in the window are never looked at and
+        no rule is expanded. A start in the past (after the machine slept) makes the
+        reminders missed since then fire right away; None reaches back to any still
+        pending, like a one-off that came due while the app was closed.
+        """
+        end = time.time() + REMINDER_WINDOW
+        for task_text, reminder_time, due in self.storage.due_between(start, end):
+            self.scheduler.schedule(task_text, due)
+        self.reminder_window_end = end
+
+    def arm_reminder_timer(self):
+        """ Restart the single-shot timer for the earliest pending reminder """
+        delay = self.scheduler.seconds_until_next()
+        if delay is None:
+            # Nothing pending, wake up to pull in the next window
+            delay = min(max(self.reminder_window_end - time.time(), 0), MAX_TIMER_SLEEP)
+        self.timer.start(int(delay * 1000))
+
+    @timed()
     def check_reminders(self):
-        current_time = QTime.currentTime().toString("HH:mm")  # Use same format as used in `set_reminder`
-        for task_text, (item, reminder_time) in self.task_widgets.items():
-            if reminder_time == current_time:
-                self.play_ringtone()
-                QMessageBox.information(self, "Reminder", f"Reminder for task: '{task_text}' is due now!")
+        now = time.time()
+        if now >= self.reminder_window_end:
+            self.load_reminder_window(self.reminder_window_end)
+        # Everything due up to now fires, including reminders missed while the machine slept
+        due_tasks = []
+        for task_text, due in self.scheduler.pop_due(now):
+            task = self.storage.get(task_text)
+            if task is None or not task[1]:
+                continue
+            due_tasks.append(task_text)
+            # Only the occurrence after this one is worked out, and only now that it fired
+            next_due = self.storage.advance(task_text, now)
+            if next_due is None:
+                # A one-off reminder is used up; the task may not be fetched into the list yet
+                self.task_model.set_reminder(task_text, None)
+                self.storage.put(task_text, None, task[2])
+                continue
+            self.task_model.set_due(task_text, next_due)
+            if next_due <= self.reminder_window_end:
+                self.scheduler.schedule(task_text, next_due)
+        self.arm_reminder_timer()
+        for task_text in due_tasks:
+            self.notifications.push(task_text)
+        self.arm_notify_timer()
+
+    def arm_notify_timer(self):
+        """ Start the single-shot timer for the next notification, unless one is running """
+        delay = self.notifications.seconds_until_flush()
+        if delay is not None and not self.notify_timer.isActive():
+            self.notify_timer.start(int(delay * 1000))
+
+    @timed()
+    def show_notifications(self):
+        """ Show everything the queue gathered in the reminder panel, with one ringtone """
+        delay = self.notifications.seconds_until_flush()
+        if delay is None:
+            return
+        if delay > 0:
+            # Rate-limited, come back when the queue allows another notification
+            self.notify_timer.start(int(delay * 1000))
+            return
+        self.reminder_panel.add_reminders(self.notifications.take())
+        self.play_ringtone()
 
+    @timed()
     def play_ringtone(self):
-        """ Play the selected ringtone """
+        """ Start the selected ringtone; problems are noted in the reminder panel """
         if self.ringtone_path:
-            try:
-                pygame.mixer.music.load(self.ringtone_path)
-                pygame.mixer.music.play()
-            except Exception as e:
-                QMessageBox.warning(self, "Playback Error", f"Failed to play the ringtone: {e}")
+            future = self.audio.play_later(self.ringtone_path)
+            future.add_done_callback(self.report_playback)
         else:
-            QMessageBox.warning(self, "No Ringtone", "No ringtone is set.")
+            self.reminder_panel.set_note("No ringtone is set.")
+
+    def report_playback(self, future):
+        # Runs on the audio thread, the signal carries the message over to the UI thread
+        error = future.exception()
+        if error is not None:
+            self.playback_failed.emit(f"Failed to play the ringtone: {error}")
+
+    def set_sort(self, index):
+        """ Show the list in the order picked in the sort box, and remember it """
+        sort = self.sort_box.itemData(index)
+        with self.view_frozen():
+            self.task_list.selectionModel().clear()
+            self.task_model.set_sort(sort)
+        self.settings.set("sort", sort)
 
     def toggle_theme(self):
         # Toggle between light and dark themes
@@ -267,93 +656,200 @@ class ToDoApp(QMainWindow):
         else:
             self.set_theme('light')
 
+    @timed()
     def set_theme(self, theme):
-        if theme == 'dark':
-            self.setStyleSheet("""
-                QWidget {
-                    background-color: #2E2E2E;
-                    color: #E0E0E0;
-                    font-family: Arial, sans-serif;
-                }
-                QLineEdit, QPushButton, QListWidget, QTimeEdit {
-                    background-color: #3E3E3E;
-                    color: #E0E0E0;
-                    border: 1px solid #555555;
-                    border-radius: 5px;
-                    padding: 5px;
-                }
-                QPushButton {
-                    font-size: 16px;
-                }
-                QListWidget {
-                    border: 1px solid #555555;
-                }
-                QCheckBox {
-                    color: #E0E0E0;
-                }
-                QLabel {
-                    font-size: 18px;
-                }
-            """)
+        # Selects rules of the stylesheet parsed at startup and a cached palette, see theme.py
+        self.current_theme = self.themes.apply(self, theme)
+        self.settings.set("theme", self.current_theme)
+        if self.current_theme == 'dark':
             self.theme_toggle_button.setText("Switch to Light Theme")
         else:
-            self.setStyleSheet("""
-                QWidget {
-                    background-color: #F0F0F0;
-                    color: #000000;
-                    font-family: Arial, sans-serif;
-                }
-                QLineEdit, QPushButton, QListWidget, QTimeEdit {
-                    background-color: #FFFFFF;
-                    color: #000000;
-                    border: 1px solid #CCCCCC;
-                    border-radius: 5px;
-                    padding: 5px;
-                }
-                QPushButton {
-                    font-size: 16px;
-                }
-                QListWidget {
-                    border: 1px solid #CCCCCC;
-                }
-                QCheckBox {
-                    color: #000000;
-                }
-                QLabel {
-                    font-size: 18px;
-                }
-            """)
             self.theme_toggle_button.setText("Switch to Dark Theme")
-        self.current_theme = theme
 
+    @timed()
+    def save_task(self, task_text):
+        """ Write one task's current state to storage """
+        self.storage.put(*self.task_model.task(task_text))
+
+    @timed()
+    def save_tasks_batch(self, task_texts):
+        """ Write many tasks' current state to storage in one batch """
+        self.storage.put_many([self.task_model.task(task_text) for task_text in task_texts])
+
+    @timed()
+    def delete_saved_tasks(self, task_texts):
+        self.storage.delete_many(task_texts)
+
+    @timed()
     def save_tasks(self):
-        try:
-            tasks_to_save = {}
-            for task_text, (item, reminder_time) in self.task_widgets.items():
-                tasks_to_save[task_text] = reminder_time
-            with open('tasks.json', 'w') as file:
-                json.dump(tasks_to_save, file, indent=4)
-        except Exception as e:
-            print(f"Failed to save tasks: {e}")
+        """ Make everything saved so far durable (journal compaction / WAL checkpoint) """
+        self.storage.save()
+
+    def save_status(self):
+        """ Return (pending writes, last flush latency in seconds) of the save pipeline """
+        return self.storage.pending_writes, self.storage.last_flush_latency
+
+    def watch_storage_files(self):
+        """ Watch the storage files and their directory, re-adding files replaced since """
+        # A file renamed over (a compacted tasks.json) drops out of the watcher, the
+        # directory is watched too so it and files created later are picked up
+        paths = [os.path.abspath(path) for path in self.storage.watch_paths()]
+        paths.append(os.path.dirname(paths[0]))
+        watched = set(self.file_watcher.files() + self.file_watcher.directories())
+        missing = [path for path in paths if path not in watched and os.path.exists(path)]
+        if missing:
+            self.file_watcher.addPaths(missing)
+
+    def storage_files_changed(self, path):
+        self.watch_storage_files()
+        self.storage.refresh()
+
+    @timed()
+    def apply_storage_changes(self):
+        """ Apply the tasks other instances added, changed or removed, row by row """
+        changes = self.storage.take_changes()
+        if changes:
+            self.show_task_changes(changes)
+
+    @timed()
+    def apply_api_requests(self):
+        """ Run the queued API calls with one storage write, and show the tasks they changed """
+        if self.api_server is None:
+            return
+        changes, renamed, more = self.api_server.process(self.storage)
+        self.rename_tasks(renamed)
+        # Every list change costs a relayout of all rows, so a stream of calls updates the
+        # list every VIEW_INTERVAL rather than on each batch; the calls are answered already
+        self.api_changed.update(changes)
+        if self.api_changed and not self.api_view_timer.isActive():
+            self.api_view_timer.start()
+        if more:
+            # Let the window repaint and handle input before the next batch
+            QTimer.singleShot(0, self.apply_api_requests)
+
+    @timed()
+    def show_api_changes(self):
+        # Read back what is stored now, the user may have changed these tasks in the meantime
+        changed, self.api_changed = self.api_changed, {}
+        self.show_task_changes([(text, self.storage.get(text)) for text in changed])
+
+    def rename_tasks(self, renamed):
+        """ Give tasks renamed in storage their new text in their own row """
+        for old_text, task_text in renamed:
+            row = self.storage.get(task_text)
+            if row is None or old_text not in self.task_model or task_text in self.task_model:
+                continue  # Not fetched yet, it comes in with its page
+            self.search_index.remove(old_text)
+            self.search_index.add(task_text, task_text)
+            self.task_model.replace_task(old_text, *row)
+            self.scheduler.cancel(old_text)
+            self.notifications.discard(old_text)
+
+    def show_task_changes(self, changes):
+        """ Apply (text, row) changes to the list, search index and reminders; a row of None removes the task """
+        removed = [text for text, row in changes if row is None]
+        with self.view_frozen():
+            self.task_model.remove_tasks(removed)
+        for task_text in removed:
+            self.search_index.remove(task_text)
+            self.scheduler.cancel(task_text)
+            self.notifications.discard(task_text)
+        self.show_saved_tasks(row for task_text, row in changes if row is not None)
+
+    def show_saved_tasks(self, rows):
+        """ Bring the list, search index and reminders in line with stored task rows """
+        indexed = []
+        for task_text, reminder_time, status in rows:
+            if task_text not in self.search_index:
+                indexed.append(task_text)
+            self.search_index.add(task_text, task_text)
+            if task_text in self.task_model:
+                self.task_model.update_task(task_text, reminder_time, status)
+            elif self.task_model.exhausted:
+                self.task_model.add_task(task_text, reminder_time, status)
+            # Otherwise the task is not fetched yet, it comes in with its page
+            self.schedule_reminder(task_text, reminder_time, arm=False)
+        self.filter_model.tasks_indexed(indexed)
+        self.arm_reminder_timer()
+
+    @timed()
+    def archive_done_tasks(self):
+        """ Move tasks done more than archive_days ago (settings.json) out of the list into the archive """
+        days = self.settings.get("archive_days", ARCHIVE_DAYS)
+        archived = self.storage.archive_done(time.time() - days * 24 * 60 * 60)
+        if not archived:
+            return
+        with self.view_frozen():
+            self.task_list.selectionModel().clear()
+            self.task_model.remove_tasks(archived)
+        for task_text in archived:
+            self.search_index.remove(task_text)
+            self.scheduler.cancel(task_text)
+            self.notifications.discard(task_text)
+        self.arm_reminder_timer()
+
+    def show_archive(self):
+        self.archive_panel.open()
+
+    @timed()
+    def restore_archived(self, task_texts):
+        """ Move tasks picked in the archive back into the list """
+        self.show_saved_tasks(self.storage.restore(task_texts))
+
+    def closeEvent(self, event):
+        # Make sure queued edits reach the disk before the window goes away
+        self.file_watcher.blockSignals(True)
+        self.storage.listener = None
+        if self.api_server is not None:
+            self.api_server.close()
+            self.api_server = None
+        self.api_view_timer.stop()
+        self.storage.close()
+        self.settings.save()
+        self.notify_timer.stop()
+        self.archive_timer.stop()
+        self.reminder_panel.close()
+        self.archive_panel.close()
+        self.audio.close()
+        instrumentation.stop()
+        super().closeEvent(event)
 
     def load_tasks(self):
-        if os.path.exists("tasks.json"):
-            with open("tasks.json", "r") as file:
-                saved_tasks = json.load(file)
-                self.task_widgets = {}
-                
-                # Add tasks to the list widget
-                for task_text, reminder_time in saved_tasks.items():
-                    list_item = QListWidgetItem(self.task_list)
-                    task_item = TaskItem(task_text)
-                    task_item.reminder_off.connect(self.turn_off_reminder)  # Connect signal for reminder turn-off
-                    list_item.setSizeHint(task_item.sizeHint())
-                    self.task_list.setItemWidget(list_item, task_item)
-                    
-                    # Store reminder time in the task_widgets dictionary
-                    self.task_widgets[task_text] = (list_item, reminder_time)
+        # The model pages rows in from storage as the list scrolls
+        self.task_model.set_storage(self.storage)
+        # tasks.json is read and indexed a batch per event-loop turn, so the window shows right away
+        self.storage.start_loading()
+        self.index_cursor = None
+        if self.storage.loading:
+            self.load_progress.setValue(0)
+            self.load_progress.show()
+        QTimer.singleShot(0, self.load_next_batch)
+
+    @timed()
+    def load_next_batch(self):
+        """ Read and index one batch of saved tasks, then yield back to the event loop """
+        self.storage.load_step(LOAD_BATCH)
+        rows, self.index_cursor = self.storage.page(self.index_cursor, LOAD_BATCH)
+        for text, reminder, status in rows:
+            self.search_index.add(text, text)
+        self.filter_model.tasks_indexed(row[0] for row in rows)
+        bar = self.task_list.verticalScrollBar()
+        if self.filter_model.rowCount() < PAGE_SIZE or bar.value() == bar.maximum():
+            self.filter_model.fetchMore()
+        if self.storage.loading or len(rows) == LOAD_BATCH:
+            self.load_progress.setValue(int(self.storage.load_progress * 100))
+            QTimer.singleShot(0, self.load_next_batch)
         else:
-            self.task_widgets = {}  # Initialize an empty task list
+            self.finish_loading()
+
+    @timed()
+    def finish_loading(self):
+        self.load_progress.hide()
+        self.filter_model.fetchMore()
+        self.archive_done_tasks()
+        self.archive_timer.start(ARCHIVE_INTERVAL * 1000)
+        self.load_reminder_window(None)
+        self.arm_reminder_timer()
 
 if __name__ == '__main__':
     app = QApplication(sys.argv)
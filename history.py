@@ -0,0 +1,89 @@
+import sys
+from collections import deque
+
+# Actions that can be undone, the oldest are forgotten first
+MAX_DEPTH = 100
+# Rough bytes of task rows the undo and redo stacks may hold between them
+MAX_BYTES = 8 * 1024 * 1024
+# Bytes counted for each (text, row) pair besides its strings: the pair and the row tuple
+PAIR_OVERHEAD = sys.getsizeof((None, None)) + sys.getsizeof((None, None, None))
+
+
+def changes_size(changes):
+    """ Rough bytes held by a list of (text, row) changes """
+    size = sys.getsizeof(changes)
+    for text, row in changes:
+        size += PAIR_OVERHEAD + sys.getsizeof(text)
+        if row is not None and row[1]:
+            size += sys.getsizeof(row[1])
+    return size
+
+
+class UndoHistory:
+    """ Undo and redo stacks of the tasks each action changed.
+
+    An action is recorded as two lists of (text, row) pairs: the touched tasks
+    before and after it, where row is (text, reminder, status) or None for a task
+    that does not exist. Only those tasks are kept, so removing five tasks from a
+    list of a million costs five rows, and the strings are the ones the task store
+    already holds. undo() and redo() return the pairs to apply, in the form
+    storage.take_changes() uses, so the front-ends apply them like another
+    instance's changes. At most max_depth actions are kept, and the oldest go
+    first once the stacks hold more than max_bytes; an action bigger than that on
+    its own is not kept at all.
+    """
+
+    def __init__(self, max_depth=MAX_DEPTH, max_bytes=MAX_BYTES):
+        self.max_depth = max_depth
+        self.max_bytes = max_bytes
+        self._undo = deque()  # (before, after, size), newest last
+        self._redo = []
+        self.bytes = 0
+
+    def __len__(self):
+        return len(self._undo)
+
+    @property
+    def can_undo(self):
+        return bool(self._undo)
+
+    @property
+    def can_redo(self):
+        return bool(self._redo)
+
+    def record(self, before, after):
+        """ Remember an action that turned the before rows into the after rows, dropping what was undone """
+        if not before and not after:
+            return
+        self.bytes -= sum(entry[2] for entry in self._redo)
+        self._redo = []
+        size = changes_size(before) + changes_size(after)
+        if size > self.max_bytes:
+            # Too big to keep, and what came before it can't be replayed without it
+            self.clear()
+            return
+        self._undo.append((before, after, size))
+        self.bytes += size
+        while len(self._undo) > self.max_depth or self.bytes > self.max_bytes:
+            self.bytes -= self._undo.popleft()[2]
+
+    def undo(self):
+        """ Return the (text, row) changes that reverse the last action, or None if there is none """
+        if not self._undo:
+            return None
+        entry = self._undo.pop()
+        self._redo.append(entry)
+        return entry[0]
+
+    def redo(self):
+        """ Return the (text, row) changes that repeat the last undone action, or None """
+        if not self._redo:
+            return None
+        entry = self._redo.pop()
+        self._undo.append(entry)
+        return entry[1]
+
+    def clear(self):
+        self._undo.clear()
+        self._redo = []
+        self.bytes = 0
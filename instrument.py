@@ -0,0 +1,187 @@
+import functools
+import inspect
+import json
+import os
+import time
+from collections import deque
+
+# Set TODO_INSTRUMENT=1 to time the hot paths and watch event-loop lag, and
+# TODO_PROFILE=<seconds> to also capture a cProfile of the first seconds of the run.
+ENV_INSTRUMENT = "TODO_INSTRUMENT"
+ENV_PROFILE = "TODO_PROFILE"
+# Set TODO_STARTUP_EXIT=1 to quit once the window is first painted, for start-up benchmarks
+ENV_STARTUP_EXIT = "TODO_STARTUP_EXIT"
+
+# Seconds between heartbeats, lag is how late each one arrives
+HEARTBEAT_INTERVAL = 0.1
+# Seconds between printed summaries
+SUMMARY_INTERVAL = 30
+# Most recent samples kept per span for the percentiles
+MAX_SAMPLES = 10000
+
+
+def percentile(ordered, fraction):
+    """ Nearest-rank percentile of an already sorted list """
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Instrumentation:
+    """ Timing spans and event-loop lag samples, summarised as counts and p50/p99 """
+
+    def __init__(self, enabled=False, profile_seconds=0, startup_exit=False):
+        self.enabled = enabled
+        self.startup_exit = startup_exit
+        self.samples = {}  # span name -> deque of durations in seconds
+        self.counts = {}  # span name -> calls, including samples rolled out of the deque
+        self.last_beat = None
+        self.last_summary = time.perf_counter()
+        self.profile_seconds = profile_seconds
+        self.profiler = None
+        self.profile_started = None
+
+    def record(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=MAX_SAMPLES)
+        samples.append(seconds)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    def span(self, name):
+        """ Context manager timing its block as name """
+        return Span(self, name) if self.enabled else NULL_SPAN
+
+    def first_paint(self, started):
+        """ Note the window's first paint, started being the perf_counter() the app was started at.
+
+        Returns True when TODO_STARTUP_EXIT asks the app to quit now. It then prints a JSON
+        line whose epoch time lets the benchmark count the interpreter's start-up as well.
+        """
+        seconds = time.perf_counter() - started
+        self.record("first_paint", seconds)
+        if self.enabled:
+            print(f"First paint {seconds * 1000:.0f} ms after start")
+        if self.startup_exit:
+            print(json.dumps({"first_paint": seconds, "painted_at": time.time()}), flush=True)
+        return self.startup_exit
+
+    def start(self):
+        """ Begin the cProfile window, if one was asked for """
+        if self.enabled and self.profile_seconds > 0 and self.profiler is None:
+            import cProfile
+            self.profiler = cProfile.Profile()
+            self.profile_started = time.perf_counter()
+            self.profiler.enable()
+
+    def heartbeat(self, *args):
+        """ Call every HEARTBEAT_INTERVAL from the event loop; records how late it ran """
+        now = time.perf_counter()
+        if self.last_beat is not None:
+            self.record("event_loop_lag", max(now - self.last_beat - HEARTBEAT_INTERVAL, 0))
+        self.last_beat = now
+        if self.profiler is not None and now - self.profile_started >= self.profile_seconds:
+            self.stop_profile()
+        if now - self.last_summary >= SUMMARY_INTERVAL:
+            self.last_summary = now
+            self.report()
+
+    def stop_profile(self):
+        if self.profiler is None:
+            return
+        import pstats
+        self.profiler.disable()
+        path = f"todo-profile-{os.getpid()}.prof"
+        self.profiler.dump_stats(path)
+        print(f"Wrote cProfile data to {path}, top functions by cumulative time:")
+        pstats.Stats(self.profiler).sort_stats("cumulative").print_stats(20)
+        self.profiler = None
+
+    def summary(self):
+        """ Return {span: {count, p50, p99, max}} with times in milliseconds """
+        result = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            result[name] = {
+                "count": self.counts[name],
+                "p50": percentile(ordered, 0.5) * 1000,
+                "p99": percentile(ordered, 0.99) * 1000,
+                "max": ordered[-1] * 1000,
+            }
+        return result
+
+    def report(self):
+        summary = self.summary()
+        if not summary:
+            return
+        print(f"{'span':24} {'count':>8} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+        for name, stats in sorted(summary.items()):
+            print(f"{name:24} {stats['count']:8} {stats['p50']:9.2f} {stats['p99']:9.2f} {stats['max']:9.2f}")
+
+    def stop(self):
+        """ End the profile window early and print a last summary """
+        if self.enabled:
+            self.stop_profile()
+            self.report()
+
+
+class Span:
+    __slots__ = ("instrumentation", "name", "start")
+
+    def __init__(self, instrumentation, name):
+        self.instrumentation = instrumentation
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.instrumentation.record(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_SPAN = NullSpan()
+
+_profile_seconds = float(os.environ.get(ENV_PROFILE, 0) or 0)
+# Asking for a profile turns the rest on as well
+instrumentation = Instrumentation(
+    enabled=os.environ.get(ENV_INSTRUMENT, "") not in ("", "0") or _profile_seconds > 0,
+    profile_seconds=_profile_seconds,
+    startup_exit=os.environ.get(ENV_STARTUP_EXIT, "") not in ("", "0"),
+)
+
+
+def timed(name=None):
+    """ Decorator recording each call as a span; returns the function untouched when disabled """
+    def decorate(func):
+        if not instrumentation.enabled:
+            return func
+        label = name or func.__name__
+        # Qt calls slots with whatever extra arguments the signal carries and drops the ones
+        # the slot cannot take, keep doing that through the wrapper
+        parameters = inspect.signature(func).parameters.values()
+        if any(p.kind == p.VAR_POSITIONAL for p in parameters):
+            accepted = None
+        else:
+            accepted = sum(1 for p in parameters if p.kind in (p.POSITIONAL_ONLY, p.POSITIONAL_OR_KEYWORD))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if accepted is not None:
+                args = args[:accepted]
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                instrumentation.record(label, time.perf_counter() - start)
+        return wrapper
+    return decorate
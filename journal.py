@@ -0,0 +1,537 @@
+import codecs
+import copy
+import json
+import os
+import re
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# Fold the journal into a new snapshot once it grows past this many bytes, or past half
+# the snapshot's size if that is larger, so big lists aren't rewritten for every burst
+COMPACT_THRESHOLD = 256 * 1024
+# Records arriving within this many seconds of each other go out in one write
+DEBOUNCE_WINDOW = 0.2
+# Bytes read from tasks.json at a time when streaming it
+CHUNK_SIZE = 64 * 1024
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# Characters that can carry on a number, never valid right after a complete value
+NUMBER_TAIL = frozenset("0123456789.eE+-")
+
+_MISSING = object()
+
+
+def write_json_atomic(path, data):
+    """ Write data as JSON to a temp file and rename it over path """
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as file:
+        json.dump(data, file, ensure_ascii=False, separators=(",", ":"))
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(tmp_path, path)
+
+
+def file_id(stat):
+    """ What identifies one version of the snapshot: a compaction renames a new file over it """
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def diff_records(before, after):
+    """ The records that turn the tasks dict before into after, keyed by task """
+    records = {key: ["s", key, value] for key, value in after.items() if before.get(key, _MISSING) != value}
+    records.update((key, ["d", key]) for key in before.keys() - after.keys())
+    return records
+
+
+def record_keys(record):
+    """ The tasks a journal record changes, a rename changes two """
+    return record[1:3] if record[0] == "m" else record[1:2]
+
+
+def copy_tasks(tasks):
+    """ Copy a tasks dict one level deep, task values are flat """
+    return {key: dict(value) if isinstance(value, dict) else value for key, value in tasks.items()}
+
+
+class FileLock:
+    """ Advisory lock shared by every process using the same tasks.json.
+
+    Held while the journal and snapshot are read or written, so an instance never
+    reads a snapshot and a journal from different sides of another's compaction.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        # flock() does not keep out threads sharing the file, this does
+        self.mutex = threading.Lock()
+
+    def __enter__(self):
+        self.mutex.acquire()
+        try:
+            if self.file is None:
+                self.file = open(self.path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            else:
+                self.file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        pass  # LK_LOCK gives up after 10 seconds, keep waiting
+        except BaseException:
+            self.mutex.release()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            else:
+                self.file.seek(0)
+                msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self.mutex.release()
+
+    def close(self):
+        with self.mutex:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+
+class JsonObjectStream:
+    """ Yields the members of a top-level JSON object while reading the file in chunks """
+
+    def __init__(self, file, chunk_size=CHUNK_SIZE):
+        self.file = file
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder("utf-8")()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    def _fill(self):
+        chunk = self.file.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buf = self.buf[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+
+    def _peek(self):
+        """ Skip whitespace and return the next character, '' at the end of the file """
+        while True:
+            self.pos = WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if self.eof:
+                return ""
+            self._fill()
+
+    def _expect(self, char):
+        if self._peek() != char:
+            raise ValueError(f"Expected '{char}' in JSON object near byte {self.bytes_read}")
+        self.pos += 1
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+                self._fill()  # The value runs past the end of the buffer
+                continue
+            # A number cut at the buffer end, "12." or "1.5e" say, decodes short: read on and retry
+            if self.eof or (end < len(self.buf) and self.buf[end] not in NUMBER_TAIL):
+                self.pos = end
+                return value
+            self._fill()
+
+    def __iter__(self):
+        self._expect("{")
+        if self._peek() == "}":
+            return
+        while True:
+            key = self._value()
+            self._expect(":")
+            yield key, self._value()
+            char = self._peek()
+            self.pos += 1
+            if char == "}":
+                return
+            if char != ",":
+                raise ValueError(f"Expected ',' or '}}' in JSON object near byte {self.bytes_read}")
+
+
+class TaskJournal:
+    """ tasks.json snapshot plus an append-only journal of changes.
+
+    Each mutation becomes one compact line: ["s", key, value], ["d", key], or
+    ["m", old_key, key, value] for a task renamed in place.
+    Loading replays the journal over the snapshot. Records are handed to a writer
+    thread, which coalesces each burst into a single write and, once the journal
+    passes compact_threshold bytes (or half the snapshot), folds it into a fresh snapshot.
+
+    Several processes can share the files. Under a FileLock the writer first takes
+    in the records other instances appended, or re-reads the files if one of them
+    compacted, so nothing it writes drops their changes. What changed is handed to
+    listener (on the writer thread) as one record per task, last writer wins.
+    """
+
+    def __init__(self, path="tasks.json", compact_threshold=COMPACT_THRESHOLD, debounce=DEBOUNCE_WINDOW):
+        self.path = path
+        self.journal_path = path + ".journal"
+        self.lock = FileLock(path + ".lock")
+        self.listener = None  # Called on the writer thread with the records other instances wrote
+        self.compact_threshold = compact_threshold
+        self.debounce = debounce
+        self.condition = threading.Condition()
+        self.queue = []  # Records waiting for the writer thread
+        self.writing = 0  # Records the writer has taken but not flushed yet
+        self.closing = False
+        self.thread = None
+        self.last_flush_latency = None  # Seconds spent in the most recent write
+        # Owned by the writer thread once it starts: what is on disk and the open journal
+        self.saved = {}
+        self.deferred = None  # Records written while stream() is still filling saved
+        self.partial = False  # A stream was abandoned, saved must never become the snapshot
+        self.stream_size = 0
+        self.stream_read = 0
+        self.file = None
+        self.journal_size = 0  # Bytes of the journal taken in, by this instance or from others
+        self.snapshot_size = 0
+        self.snapshot_id = None  # file_id() of the snapshot saved was read from or written to
+
+    @property
+    def pending_writes(self):
+        """ Number of records accepted but not yet written to disk """
+        with self.condition:
+            return len(self.queue) + self.writing
+
+    def load(self):
+        """ Return the saved tasks: the snapshot with the journal replayed on top """
+        self.flush()
+        with self.lock:
+            self.saved = self._read_state()
+        self.partial = False
+        return copy_tasks(self.saved)
+
+    def append_only(self):
+        """ Take the files as they are now without reading them, so records are only appended.
+
+        saved stays incomplete, so the journal is not compacted until load() has read
+        everything. Call before the first record is submitted.
+        """
+        with self.lock:
+            self.snapshot_id = file_id(os.stat(self.path)) if os.path.exists(self.path) else None
+            self.snapshot_size = self.snapshot_id[2] if self.snapshot_id else 0
+            self.journal_size = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        self.saved = {}
+        self.partial = True
+
+    def _read_state(self):
+        """ Read the snapshot and replay the journal over it, the caller holds the lock """
+        state = {}
+        self.snapshot_id = None
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as file:
+                self.snapshot_id = file_id(os.fstat(file.fileno()))
+                state = json.load(file)
+        self.snapshot_size = self.snapshot_id[2] if self.snapshot_id else 0
+        for record in self._read_journal():
+            self._apply(state, record)
+        return state
+
+    def stream(self):
+        """ Yield the saved (key, value) pairs while parsing the snapshot incrementally.
+
+        The journal is read first and applied to snapshot members as they stream past,
+        keys that only exist in the journal come last. Records written meanwhile are
+        held back from the writer's copy and compaction waits until the stream ends.
+        """
+        self.flush()
+        with self.condition:
+            self.deferred = []
+        overrides = {}
+        moves = {}  # Renamed key -> the key that took its place
+        file = None
+        # The snapshot is opened under the lock too, so it matches the journal even if
+        # another instance replaces it while it is being read
+        with self.lock:
+            for record in self._read_journal():
+                if record[0] == "m":
+                    # The old key's member is replaced by whatever the new key ends up as
+                    overrides.pop(record[1], None)
+                    moves[record[1]] = record[2]
+                    overrides[record[2]] = ["s", record[2], record[3]]
+                else:
+                    overrides[record[1]] = record
+            self.snapshot_id = None
+            if os.path.exists(self.path):
+                file = open(self.path, "rb")
+                self.snapshot_id = file_id(os.fstat(file.fileno()))
+        saved = {}
+        self.saved = saved
+        self.stream_size = self.snapshot_id[2] if self.snapshot_id else 0
+        self.snapshot_size = self.stream_size
+        self.stream_read = 0
+        complete = False
+        try:
+            if file is not None:
+                with file:
+                    members = JsonObjectStream(file)
+                    for key, value in members:
+                        self.stream_read = members.bytes_read
+                        while key in moves:
+                            key = moves.pop(key)
+                        record = overrides.pop(key, None)
+                        if record is not None:
+                            if record[0] == "d":
+                                continue
+                            value = record[2]
+                        saved[key] = value
+                        yield key, value
+            self.stream_read = self.stream_size
+            for key, record in overrides.items():
+                if record[0] == "s":
+                    saved[key] = record[2]
+                    yield key, record[2]
+            complete = True
+        finally:
+            if file is not None:
+                file.close()
+            with self.condition:
+                for record in self.deferred:
+                    self._apply(saved, record)
+                self.deferred = None
+                self.partial = not complete
+
+    def _read_journal(self, offset=0):
+        """ Return the records in the journal file from byte offset on and note its size """
+        records = []
+        self.journal_size = 0
+        if not os.path.exists(self.journal_path):
+            return records
+        with open(self.journal_path, "rb") as file:
+            file.seek(offset)
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # A torn last line from a crash mid-append, everything before it is intact
+                    print(f"Skipping damaged journal record in {self.journal_path}")
+            self.journal_size = file.tell()
+        return records
+
+    def _apply(self, state, record):
+        if record[0] == "s":
+            state[record[1]] = record[2]
+        elif record[0] == "d":
+            state.pop(record[1], None)
+        elif record[0] == "m":
+            old, key, value = record[1:]
+            if old in state and key not in state:
+                # Rebuilt in order so the new key takes the old one's place in the snapshot
+                items = [(key, value) if name == old else (name, item) for name, item in state.items()]
+                state.clear()
+                state.update(items)
+            else:
+                state.pop(old, None)
+                state[key] = value
+
+    def set(self, key, value):
+        """ Record that key now maps to value """
+        # Copied so later in-place edits by the caller cannot race the writer
+        self._submit(["s", key, copy.copy(value)])
+
+    def set_many(self, items):
+        """ Record many (key, value) pairs, handed to the writer in one go.
+
+        Unlike set() the values are not copied, the caller must not change them afterwards.
+        """
+        self._submit(*(["s", key, value] for key, value in items))
+
+    def delete(self, key):
+        """ Record that key was removed """
+        self._submit(["d", key])
+
+    def rename(self, old_key, key, value):
+        """ Record that old_key was replaced by key mapping to value, in the same place """
+        self._submit(["m", old_key, key, copy.copy(value)])
+
+    def compact(self):
+        """ Ask the writer to fold the journal into a new snapshot """
+        self._submit(["c"])
+
+    def refresh(self):
+        """ Ask the writer to take in what other instances wrote, listener hears of any changes """
+        self._submit(["r"])
+
+    def _submit(self, *records):
+        with self.condition:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="TaskJournal", daemon=True)
+                self.thread.start()
+            self.queue.extend(records)
+            self.condition.notify_all()
+
+    def flush(self, timeout=None):
+        """ Block until every accepted record is on disk """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.queue and not self.writing, timeout)
+
+    def close(self):
+        """ Flush pending records and stop the writer thread """
+        with self.condition:
+            self.closing = True
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        self.lock.close()
+        self.closing = False
+
+    def _run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.queue or self.closing)
+                if not self.queue:
+                    return
+                # Let the rest of the burst arrive, then take it all at once
+                deadline = time.monotonic() + self.debounce
+                while not self.closing:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self.condition.wait(remaining)
+                batch = self.queue
+                self.queue = []
+                self.writing = len(batch)
+            start = time.perf_counter()
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                print(f"Failed to save tasks: {e}")
+            self.last_flush_latency = time.perf_counter() - start
+            with self.condition:
+                self.writing = 0
+                self.condition.notify_all()
+
+    def _write_batch(self, batch):
+        with self.lock:
+            changes = self._catch_up({key for record in batch for key in record_keys(record)})
+            records = []
+            for record in batch:
+                if record[0] == "c":
+                    self._write_records(records)
+                    records = []
+                    self._write_snapshot()
+                elif record[0] != "r":
+                    records.append(record)
+            self._write_records(records)
+            if self.journal_size >= max(self.compact_threshold, self.snapshot_size // 2):
+                self._write_snapshot()
+        if changes and self.listener is not None:
+            self.listener(changes)
+
+    def _catch_up(self, local):
+        """ Take in what other instances wrote since this one last looked.
+
+        Returns the records that changed saved, one per task, leaving out the tasks in
+        local and in the queue: this instance is about to overwrite those.
+        """
+        with self.condition:
+            streaming = self.deferred is not None or self.partial
+            local.update(key for record in self.queue for key in record_keys(record))
+        journal_end = os.path.getsize(self.journal_path) if os.path.exists(self.journal_path) else 0
+        try:
+            snapshot_id = file_id(os.stat(self.path))
+        except FileNotFoundError:
+            snapshot_id = None
+        if snapshot_id != self.snapshot_id or journal_end < self.journal_size:
+            # Another instance compacted, compare with everything it wrote
+            if streaming:
+                return []  # saved is still incomplete, reloaded after the stream
+            before = self.saved
+            self.saved = self._read_state()
+            changes = diff_records(before, self.saved)
+        elif journal_end > self.journal_size:
+            records = self._read_journal(self.journal_size)
+            with self.condition:
+                if self.deferred is not None:
+                    self.deferred.extend(records)
+                    changes = {}
+                    for record in records:
+                        if record[0] == "m":
+                            # Listeners only hear of sets and deletes
+                            changes[record[1]] = ["d", record[1]]
+                            changes[record[2]] = ["s", record[2], record[3]]
+                        else:
+                            changes[record[1]] = record
+                else:
+                    saved = self.saved
+                    before = {}
+                    for record in records:
+                        for key in record_keys(record):
+                            before.setdefault(key, saved.get(key, _MISSING))
+                        self._apply(saved, record)
+                    changes = diff_records(
+                        {key: value for key, value in before.items() if value is not _MISSING},
+                        {key: saved[key] for key in before if key in saved},
+                    )
+        else:
+            return []
+        return [record for key, record in changes.items() if key not in local]
+
+    def _write_records(self, records):
+        if not records:
+            return
+        with self.condition:
+            if self.deferred is not None:
+                self.deferred.extend(records)
+            else:
+                for record in records:
+                    self._apply(self.saved, record)
+        self._append_lines([json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n" for record in records])
+
+    def _append_lines(self, lines):
+        if not lines:
+            return
+        if self.file is None:
+            self.file = open(self.journal_path, "ab")
+        data = "".join(lines).encode("utf-8")
+        self.file.write(data)
+        self.file.flush()
+        self.journal_size += len(data)
+
+    def _write_snapshot(self):
+        with self.condition:
+            if self.deferred is not None or self.partial:
+                return  # saved is still being streamed in, compact once it is complete
+        # saved only holds records already in the journal, so replaying the journal over
+        # the new snapshot is harmless if we die before the truncate below
+        write_json_atomic(self.path, self.saved)
+        self.snapshot_id = file_id(os.stat(self.path))
+        self.snapshot_size = self.snapshot_id[2]
+        # Truncated through the append handle: a handle without O_APPEND would write at its
+        # own offset after another instance truncated the journal, leaving a hole
+        if self.file is None:
+            self.file = open(self.journal_path, "ab")
+        self.file.truncate(0)
+        self.journal_size = 0
@@ -1,18 +1,47 @@
+import time
+
+# Start of the process as far as the first paint measurement is concerned
+STARTED = time.perf_counter()
+
 from kivy.app import App
 from kivy.uix.boxlayout import BoxLayout
 from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
 from kivy.uix.label import Label
 from kivy.uix.checkbox import CheckBox
 from kivy.uix.textinput import TextInput
 from kivy.uix.button import Button
-from kivy.properties import StringProperty, BooleanProperty
+from kivy.uix.progressbar import ProgressBar
+from kivy.uix.popup import Popup
+from kivy.uix.spinner import Spinner
+from kivy.properties import StringProperty, BooleanProperty, NumericProperty
 from kivy.uix.recycleboxlayout import RecycleBoxLayout
 from kivy.metrics import dp
 from kivy.lang import Builder
-import json
 import os
 from datetime import datetime, timedelta
+from heapq import merge
 from kivy.clock import Clock
+from kivy.core.window import Window
+from history import UndoHistory
+from recurrence import first_due, rule_from_input
+from scheduler import ReminderScheduler
+from search import TrigramIndex
+from instrument import instrumentation, timed, HEARTBEAT_INTERVAL
+from notify import NotificationQueue, summary
+from order import TaskOrder, SORT_CHOICES, SORT_ADDED, GROUP_DUE, sorted_by
+from settings import Settings
+from storage import open_storage, reminder_due, LAYOUT_KIVY, ARCHIVE_DAYS
+from taskstore import TaskStore, STATUS_NONE, STATUS_DONE, STATUS_WRONG
+
+# Saved tasks read per frame while tasks.json streams in at startup
+LOAD_BATCH = 2000
+# Seconds between looks at the storage files for changes made by other instances
+SYNC_INTERVAL = 1.0
+# Seconds between moves of long-done tasks into the archive, the first is once loading finishes
+ARCHIVE_INTERVAL = 60 * 60
+# Archived tasks read per page while the archive popup is scrolled
+ARCHIVE_PAGE = 200
 
 # Embed the KV code directly
 kv = '''
@@ -23,11 +52,14 @@ kv = '''
         active: root.selected
         on_active: root.on_checkbox_active(self, self.active)
     Label:
-        size_hint_x: 0.4
+        size_hint_x: 0.35
         text: root.task_text
     Label:
-        size_hint_x: 0.2
+        size_hint_x: 0.15
         text: root.reminder
+    Label:
+        size_hint_x: 0.1
+        text: root.group
     Label:
         text: 'DONE'
         size_hint_x: 0.05
@@ -54,64 +86,378 @@ kv = '''
         height: self.minimum_height
         orientation: 'vertical'
 '''
-Builder.load_string(kv)
 
-class TaskItem(BoxLayout):
+class TaskItem(RecycleDataViewBehavior, BoxLayout):
+    task_id = NumericProperty(-1)
     task_text = StringProperty("")
     reminder = StringProperty("")
     selected = BooleanProperty(False)
     done_selected = BooleanProperty(False)
     not_yet_selected = BooleanProperty(False)
-    
+    group = StringProperty("")  # Set on the first row of each group of the GROUP_DUE view
+
+    def __init__(self, **kwargs):
+        self.rv = None
+        self.refreshing = False
+        super(TaskItem, self).__init__(**kwargs)
+
+    def refresh_view_attrs(self, rv, index, data):
+        # This widget is being recycled for another row, don't echo its state back
+        self.rv = rv
+        self.refreshing = True
+        super(TaskItem, self).refresh_view_attrs(rv, index, data)
+        self.group = rv.group_heading(index)
+        self.refreshing = False
+
     def on_checkbox_active(self, checkbox, value):
         self.selected = value
+        if not self.refreshing and self.rv is not None:
+            self.rv.set_selected(self.task_id, value)
 
     def on_done_checkbox_active(self, checkbox, value):
-        if value:
-            self.parent.parent.disable_other_checkboxes(self, 'done')
         self.done_selected = value
+        if value:
+            self.not_yet_selected = False
+        self.store_status()
 
     def on_not_yet_checkbox_active(self, checkbox, value):
-        if value:
-            self.parent.parent.disable_other_checkboxes(self, 'not_yet')
         self.not_yet_selected = value
+        if value:
+            self.done_selected = False
+        self.store_status()
+
+    def store_status(self):
+        if not self.refreshing and self.rv is not None:
+            self.rv.update_row(self.task_id, done_selected=self.done_selected, not_yet_selected=self.not_yet_selected)
+            if self.rv.status_callback is not None:
+                self.rv.status_callback(self.task_id)
 
 class TaskList(RecycleView):
+    """ RecycleView whose rows are found by task id without scanning data.
+
+    Row state (selection, done / not yet) lives in the row dicts, never in the recycled
+    widgets. data holds the rows passing the filter, rows_by_id holds them all.
+
+    data is in the order rows were added, or sorted by a TaskOrder (order.py) over
+    store. A TaskOrder is built the first time its order is chosen and then kept up
+    to date row by row, and a row's place in a sorted data is found by bisecting on
+    the keys the order holds, so changes never sort data again.
+    """
+
     def __init__(self, **kwargs):
         super(TaskList, self).__init__(**kwargs)
         self.data = []
-        self.selected_item = None
-
-    def disable_other_checkboxes(self, selected_item, selected_type):
-        # Deselect previously selected checkbox in the same task item
-        if self.selected_item and self.selected_item != selected_item:
-            if self.selected_item.done_selected:
-                self.selected_item.done_selected = False
-            elif self.selected_item.not_yet_selected:
-                self.selected_item.not_yet_selected = False
-
-        # Update the reference to the newly selected item
-        self.selected_item = selected_item
-
-        # Update the checkboxes of the selected item
-        if selected_type == 'done':
-            selected_item.done_selected = True
-            selected_item.not_yet_selected = False
-        elif selected_type == 'not_yet':
-            selected_item.not_yet_selected = True
-            selected_item.done_selected = False
+        # Every row, in list order: ids are handed out in increasing order as rows are appended
+        self.rows_by_id = {}
+        self.accepts = None  # Filter for appended rows, None while every row is shown
+        self.positions = {}  # task_id -> index into data
+        # positions is only trusted below this index, removals push it down and the
+        # next lookup past it re-indexes the tail once
+        self.valid_upto = 0
+        self.selected_ids = {}  # Selected task ids, in selection order
+        self.status_callback = None  # Called with the task id when a done / not yet box is clicked
+        self.store = None  # TaskStore whose rows the task ids are, needed to sort
+        self.sort = SORT_ADDED
+        self.orders = {}  # TaskOrder name -> TaskOrder, kept up to date once built
+        self.shown = None  # TaskOrder data is sorted by, None for the order rows were added in
+
+    def position(self, task_id):
+        if self.shown is not None:
+            key = self.shown.keys.get(task_id)
+            if key is None:
+                return None
+            index = self.sorted_index(key)
+            return index if index < len(self.data) and self.data[index]["task_id"] == task_id else None
+        index = self.positions.get(task_id)
+        if index is not None and index < self.valid_upto:
+            return index
+        if self.valid_upto < len(self.data):
+            for index in range(self.valid_upto, len(self.data)):
+                self.positions[self.data[index]["task_id"]] = index
+            self.valid_upto = len(self.data)
+        return self.positions.get(task_id)
+
+    def sorted_index(self, key):
+        """ Where a row with key is, or goes, in data sorted by self.shown """
+        keys = self.shown.keys
+        data = self.data
+        low, high = 0, len(data)
+        while low < high:
+            middle = (low + high) // 2
+            if keys[data[middle]["task_id"]] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def row(self, task_id):
+        return self.rows_by_id.get(task_id)
+
+    def group_heading(self, index):
+        """ The group of the GROUP_DUE view that starts at index in data, "" if none does """
+        if self.sort != GROUP_DUE or index >= len(self.data):
+            return ""
+        group = self.shown.group(self.data[index]["task_id"])
+        if index > 0 and self.shown.group(self.data[index - 1]["task_id"]) == group:
+            return ""
+        return group
+
+    def set_sort(self, sort):
+        """ Show the rows in one of order.SORT_CHOICES, keeping the filter """
+        name = sorted_by(sort)
+        self.sort = sort
+        if name is None:
+            self.shown = None
+        else:
+            self.shown = self.orders.get(name)
+            if self.shown is None:
+                # Sorted once, kept in order from here on
+                self.shown = self.orders[name] = TaskOrder(self.store, name)
+                self.shown.build(self.rows_by_id)
+        rows_by_id = self.rows_by_id
+        if self.accepts is None:
+            shown = list(rows_by_id.values()) if self.shown is None else [rows_by_id[task_id] for task_id in self.shown]
+        else:
+            shown = self.in_order(self.data)
+        self.positions = {}
+        self.valid_upto = 0
+        self.data = shown
+
+    def in_order(self, rows):
+        """ rows sorted the way data is """
+        if self.shown is None:
+            return sorted(rows, key=lambda row: row["task_id"])
+        keys = self.shown.keys
+        return sorted(rows, key=lambda row: keys[row["task_id"]])
+
+    def place(self, rows):
+        """ Put rows at their place in data sorted by self.shown """
+        if len(rows) == 1:
+            self.data.insert(self.sorted_index(self.shown.keys[rows[0]["task_id"]]), rows[0])
+        elif rows:
+            # One merge of the few new rows into data, instead of a sort or an insert per row
+            keys = self.shown.keys
+            self.data = list(merge(self.data, self.in_order(rows), key=lambda row: keys[row["task_id"]]))
+
+    def reorder(self, task_ids):
+        """ Move rows whose text, reminder or status changed in store to their new place """
+        moved = {}  # data index -> row, found by the old key before the order moves it
+        for order in self.orders.values():
+            for task_id in task_ids:
+                if not order.stale(task_id):
+                    continue
+                if order is self.shown:
+                    index = self.position(task_id)
+                    if index is not None:
+                        moved[index] = self.data[index]
+                order.move(task_id)
+        if len(moved) == 1:
+            index, row = moved.popitem()
+            del self.data[index]
+            self.place([row])
+        elif moved:
+            self.data = [row for index, row in enumerate(self.data) if index not in moved]
+            self.place(list(moved.values()))
+
+    def set_filter(self, task_ids=None, accepts=None):
+        """ Show only the rows whose id is in task_ids, or every row if it is None.
+
+        Rows appended later are shown if accepts(row) is true.
+        """
+        rows_by_id = self.rows_by_id
+        if task_ids is None:
+            shown = list(rows_by_id.values()) if self.shown is None else [rows_by_id[task_id] for task_id in self.shown]
+        else:
+            shown = self.in_order(rows_by_id[task_id] for task_id in task_ids if task_id in rows_by_id)
+        self.accepts = accepts if task_ids is not None else None
+        self.positions = {}
+        self.valid_upto = 0
+        self.data = shown
+
+    def append_rows(self, rows):
+        for row in rows:
+            self.rows_by_id[row["task_id"]] = row
+        for order in self.orders.values():
+            for row in rows:
+                order.add(row["task_id"])
+        if self.accepts is not None:
+            rows = [row for row in rows if self.accepts(row)]
+        if self.shown is not None:
+            self.place(rows)
+            return
+        if self.valid_upto == len(self.data):
+            for index, row in enumerate(rows, len(self.data)):
+                self.positions[row["task_id"]] = index
+            self.valid_upto += len(rows)
+        self.data.extend(rows)
+
+    def remove_row(self, task_id):
+        self.rows_by_id.pop(task_id, None)
+        self.selected_ids.pop(task_id, None)
+        index = self.position(task_id)
+        for order in self.orders.values():
+            order.remove(task_id)
+        if index is None:
+            return  # Filtered out
+        if self.shown is None:
+            del self.positions[task_id]
+            self.valid_upto = min(self.valid_upto, index)
+        del self.data[index]
+
+    def remove_rows(self, task_ids):
+        """ Remove many rows with one pass over data and a single data change """
+        task_ids = set(task_ids)
+        if len(task_ids) == 1:
+            self.remove_row(next(iter(task_ids)))
+            return
+        for task_id in task_ids:
+            self.rows_by_id.pop(task_id, None)
+            self.selected_ids.pop(task_id, None)
+            for order in self.orders.values():
+                order.remove(task_id)
+        self.positions = {}
+        self.valid_upto = 0
+        self.data = [row for row in self.data if row["task_id"] not in task_ids]
+
+    def update_row(self, task_id, refresh=False, **values):
+        """ Change a row in place; with refresh, redraw it if it is on screen """
+        row = self.rows_by_id.get(task_id)
+        if row is None:
+            return
+        row.update(values)  # The same dict is in data when the row is shown
+        index = self.position(task_id)
+        if refresh and index is not None:
+            view = self.view_adapter.get_visible_view(index)
+            if view is not None:
+                view.refresh_view_attrs(self, index, self.data[index])
+
+    def set_selected(self, task_id, value):
+        self.update_row(task_id, selected=value)
+        if value:
+            self.selected_ids[task_id] = True
+        else:
+            self.selected_ids.pop(task_id, None)
+
+    def selected_rows(self):
+        return [self.rows_by_id[task_id] for task_id in self.selected_ids]
+
+    def first_selected(self):
+        """ Return the row selected first, or None """
+        for task_id in self.selected_ids:
+            return self.row(task_id)
+        return None
+
+class ReminderPanel(BoxLayout):
+    """ Strip at the top of the window naming the reminders that fired, until dismissed """
+
+    def __init__(self, **kwargs):
+        super().__init__(orientation="horizontal", size_hint=(1, None), height=dp(60), spacing=10, **kwargs)
+        self.texts = []
+        self.label = Label(halign="left", valign="middle")
+        self.label.bind(size=self.label.setter("text_size"))
+        self.dismiss_button = Button(text="Dismiss", size_hint=(None, 1), width=dp(90))
+        self.dismiss_button.bind(on_press=self.dismiss)
+        self.add_widget(self.label)
+        self.add_widget(self.dismiss_button)
+
+    def add_reminders(self, texts):
+        self.texts.extend(texts)
+        self.label.text = summary(self.texts)
+
+    def dismiss(self, instance=None):
+        self.texts = []
+        if self.parent is not None:
+            self.parent.remove_widget(self)
+
+
+class ArchivePopup(Popup):
+    """ Archived tasks, read from storage a page at a time as the list is scrolled down """
+
+    def __init__(self, storage, on_restore, **kwargs):
+        super().__init__(title="Archive", size_hint=(0.9, 0.9), **kwargs)
+        self.storage = storage
+        self.on_restore = on_restore
+        self.cursor = None
+        self.exhausted = True
+        layout = BoxLayout(orientation="vertical", spacing=10)
+        self.task_list = TaskList(size_hint=(1, 0.9))
+        self.task_list.bind(scroll_y=self.scrolled)
+        buttons = BoxLayout(size_hint=(1, 0.1), spacing=10)
+        restore_button = Button(text="Restore Selected")
+        restore_button.bind(on_press=self.restore)
+        close_button = Button(text="Close")
+        close_button.bind(on_press=self.dismiss)
+        buttons.add_widget(restore_button)
+        buttons.add_widget(close_button)
+        layout.add_widget(self.task_list)
+        layout.add_widget(buttons)
+        self.content = layout
+
+    def show(self):
+        """ Open on the start of the archive, it may have grown since it was last open """
+        self.task_list.rows_by_id = {}
+        self.task_list.selected_ids = {}
+        self.task_list.set_filter(None)
+        self.cursor = None
+        self.exhausted = False
+        self.fetch_page()
+        self.open()
+
+    def fetch_page(self):
+        rows, self.cursor = self.storage.archive_page(self.cursor, ARCHIVE_PAGE)
+        self.exhausted = len(rows) < ARCHIVE_PAGE
+        first_id = len(self.task_list.rows_by_id)
+        self.task_list.append_rows([
+            {"task_id": task_id, "task_text": text, "reminder": reminder or "", "selected": False,
+             "done_selected": status == STATUS_DONE, "not_yet_selected": status == STATUS_WRONG}
+            for task_id, (text, reminder, status) in enumerate(rows, first_id)
+        ])
+
+    def scrolled(self, instance, scroll_y):
+        if scroll_y <= 0 and not self.exhausted:
+            self.fetch_page()
+
+    def restore(self, instance):
+        selected_rows = self.task_list.selected_rows()
+        if selected_rows:
+            self.task_list.remove_rows([row["task_id"] for row in selected_rows])
+            self.on_restore([row["task_text"] for row in selected_rows])
+
 
 class ToDoApp(App):
     def build(self):
-        self.tasks = {}
-        self.reminder_interval = 60  # Interval to check reminders in seconds
+        Builder.load_string(kv)
+        self.settings = Settings()
+        # Every task in column arrays, a task's store row is its stable id in TaskList
+        self.tasks = TaskStore()
+        # tasks.json with its journal, or SQLite when TODO_STORAGE=sqlite
+        self.storage = open_storage(LAYOUT_KIVY)
+        # Other instances may share the storage, it is polled for their changes
+        # and only the tasks they touched are applied to the list
+        self.storage.listener = self.storage_changed
+        self.sync_event = Clock.schedule_interval(self.poll_storage, SYNC_INTERVAL)
+        self.stopped = False
+        # With TODO_API set, other programs can change the tasks over a local JSON-RPC API (api.py),
+        # its calls are run on the Kivy thread in batches. It is started after the first frame
+        self.api_server = None
+        self.api_changed = {}  # Texts of tasks API calls changed that the list doesn't show yet, in call order
+        self.api_view_trigger = None
+        # Reminders are kept in a heap by due time, one Clock event is armed for the next one
+        self.scheduler = ReminderScheduler()
+        self.reminder_event = None
+        # Due reminders are gathered and shown together in one panel
+        self.notifications = NotificationQueue()
+        self.notify_event = None
+        self.reminder_panel = ReminderPanel()
+        # Task ids by trigrams of their text, for the filter box
+        self.search_index = TrigramIndex()
         
         self.main_layout = BoxLayout(orientation="vertical", padding=10, spacing=10)
 
         self.input_field = TextInput(hint_text="Enter a task", size_hint=(1, 0.1))
         self.main_layout.add_widget(self.input_field)
 
-        self.reminder_field = TextInput(hint_text="Enter reminder time (e.g., 14:30)", size_hint=(1, 0.1))
+        self.reminder_field = TextInput(hint_text="Reminder, e.g. 14:30, 2026-10-20 14:30, daily 09:00, weekdays 09:00, every 3h, monthly 15 09:00", size_hint=(1, 0.1))
         self.main_layout.add_widget(self.reminder_field)
 
         self.button_layout = BoxLayout(size_hint=(1, 0.1), spacing=10)
@@ -119,107 +465,511 @@ class ToDoApp(App):
         self.edit_button = Button(text="Edit Task")
         self.update_button = Button(text="Update Task")
         self.remove_button = Button(text="Remove Task")
+        self.archive_button = Button(text="Archive")
+        self.undo_button = Button(text="Undo", disabled=True)
+        self.redo_button = Button(text="Redo", disabled=True)
         self.button_layout.add_widget(self.add_button)
         self.button_layout.add_widget(self.edit_button)
         self.button_layout.add_widget(self.update_button)
         self.button_layout.add_widget(self.remove_button)
+        self.button_layout.add_widget(self.archive_button)
+        self.button_layout.add_widget(self.undo_button)
+        self.button_layout.add_widget(self.redo_button)
         self.main_layout.add_widget(self.button_layout)
 
+        self.load_progress = ProgressBar(max=100, size_hint=(1, None), height=dp(10))
+
+        self.filter_layout = BoxLayout(size_hint=(1, 0.1), spacing=10)
+        self.filter_field = TextInput(hint_text="Filter tasks", size_hint=(0.7, 1), multiline=False)
+        self.filter_field.bind(text=self.apply_filter)
+        self.filter_layout.add_widget(self.filter_field)
+        # Sorted and grouped orders are indexes the list keeps up to date, see order.py
+        self.sort_labels = dict(SORT_CHOICES)
+        sort = self.settings.get("sort", SORT_ADDED)
+        self.sort_spinner = Spinner(
+            text=next((label for label, choice in SORT_CHOICES if choice == sort), SORT_CHOICES[0][0]),
+            values=list(self.sort_labels), size_hint=(0.3, 1),
+        )
+        self.filter_layout.add_widget(self.sort_spinner)
+        self.main_layout.add_widget(self.filter_layout)
+
         self.task_list = TaskList(size_hint=(1, 0.8))
+        self.task_list.status_callback = self.save_task_status
+        self.task_list.store = self.tasks
+        # The list is still empty, so the order chosen last time costs nothing to set up
+        self.task_list.set_sort(self.sort_labels[self.sort_spinner.text])
+        self.sort_spinner.bind(text=self.set_sort)
         self.main_layout.add_widget(self.task_list)
 
+        # Tasks done for a while move to an archive, which is only read once it is opened
+        self.archive_popup = ArchivePopup(self.storage, self.restore_archived)
+        self.archive_event = None
+
         self.add_button.bind(on_press=self.add_task)
         self.edit_button.bind(on_press=self.edit_task)
         self.update_button.bind(on_press=self.update_task)
         self.remove_button.bind(on_press=self.remove_task)
+        self.archive_button.bind(on_press=self.show_archive)
+        self.undo_button.bind(on_press=self.undo)
+        self.redo_button.bind(on_press=self.redo)
+        # Adds, edits, removals and done / not yet changes can be undone and redone
+        self.history = UndoHistory()
 
-        self.load_tasks()
-
-        # Schedule the reminder check function to run periodically
-        Clock.schedule_interval(self.check_reminders, self.reminder_interval)
+        # With TODO_INSTRUMENT=1, a heartbeat measures how late the Clock runs events
+        if instrumentation.enabled:
+            Clock.schedule_interval(instrumentation.heartbeat, HEARTBEAT_INTERVAL)
+            instrumentation.start()
 
         return self.main_layout
 
+    @timed()
     def add_task(self, instance):
         task_text = self.input_field.text.strip()
-        reminder_time = self.reminder_field.text.strip()
+        reminder_time = self.read_reminder()
         if task_text:
             if task_text not in self.tasks:
-                self.tasks[task_text] = {"task_text": task_text, "reminder_time": reminder_time}
-                self.task_list.data.append({"task_text": str(task_text), "reminder": str(reminder_time)})  # Ensure task_text and reminder are strings
+                self.task_list.append_rows([self.new_row(task_text, reminder_time)])
+                self.schedule_reminder(task_text, reminder_time)
                 self.input_field.text = ""
                 self.reminder_field.text = ""
-                self.save_tasks()
+                self.storage.put(task_text, reminder_time or None)
+                self.record_action([(task_text, None)], self.task_rows([task_text]))
             else:
                 print(f"Task '{task_text}' already exists.")
 
+    def read_reminder(self):
+        """ The rule typed in the reminder field, completed by rule_from_input; "" if none or malformed """
+        text = self.reminder_field.text.strip()
+        if not text:
+            return ""
+        try:
+            return rule_from_input(text)
+        except ValueError:
+            print(f"Invalid reminder time format: '{text}'.")
+            return ""
+
+    def new_row(self, task_text, reminder_time, status=STATUS_NONE):
+        """ Register a task and return its TaskList data row """
+        task_id = self.tasks.add(task_text, reminder_time, status, reminder_due(reminder_time))
+        self.search_index.add(task_id, task_text)
+        return {
+            "task_id": task_id,
+            "task_text": str(task_text),  # Ensure task_text and reminder are strings
+            "reminder": str(reminder_time),
+            "selected": False,
+            "done_selected": status == STATUS_DONE,
+            "not_yet_selected": status == STATUS_WRONG,
+        }
+
+    def save_task_status(self, task_id):
+        """ Store the done / not yet boxes of a row, so they are still ticked next time """
+        row = self.task_list.row(task_id)
+        if row is None:
+            return
+        if row["done_selected"]:
+            status = STATUS_DONE
+        elif row["not_yet_selected"]:
+            status = STATUS_WRONG
+        else:
+            status = STATUS_NONE
+        if status == self.tasks.status[task_id]:
+            return
+        before = self.task_rows([row["task_text"]])
+        self.tasks.status[task_id] = status
+        self.task_list.reorder([task_id])
+        self.storage.put(row["task_text"], self.tasks.reminder(task_id), status)
+        self.record_action(before, self.task_rows([row["task_text"]]))
+
     def edit_task(self, instance):
-        selected_items = [item for item in self.task_list.children[0].children if isinstance(item, TaskItem) and item.selected]
-        if selected_items:
-            selected_item = selected_items[0]
-            self.input_field.text = selected_item.task_text
-            self.reminder_field.text = selected_item.reminder
+        selected_row = self.task_list.first_selected()
+        if selected_row is not None:
+            self.input_field.text = selected_row["task_text"]
+            self.reminder_field.text = selected_row["reminder"]
 
+    @timed()
     def update_task(self, instance):
-        selected_items = [item for item in self.task_list.children[0].children if isinstance(item, TaskItem) and item.selected]
-        if selected_items:
+        selected_row = self.task_list.first_selected()
+        if selected_row is not None:
             task_text = self.input_field.text.strip()
-            reminder_time = self.reminder_field.text.strip()
+            reminder_time = self.read_reminder()
             if task_text:
-                current_task = selected_items[0].task_text
-                index = next((i for i, item in enumerate(self.task_list.data) if item['task_text'] == current_task), None)
-                if index is not None:
-                    self.task_list.data[index]['task_text'] = str(task_text)  # Ensure task_text is a string
-                    self.task_list.data[index]['reminder'] = str(reminder_time)  # Ensure reminder is a string
-                    self.task_list.refresh_from_data()
-                    self.input_field.text = ""
-                    self.reminder_field.text = ""
-                    self.save_tasks()
+                current_task = selected_row["task_text"]
+                if task_text != current_task and task_text in self.tasks:
+                    print(f"Task '{task_text}' already exists.")
+                    return
+                task_id = selected_row["task_id"]
+                touched = list(dict.fromkeys([current_task, task_text]))
+                before = self.task_rows(touched)
+                self.tasks.rename(task_id, task_text)
+                self.tasks.set_reminder(task_id, reminder_time, reminder_due(reminder_time))
+                self.search_index.add(task_id, task_text)
+                self.scheduler.cancel(current_task)
+                self.schedule_reminder(task_text, reminder_time)
+                # Only this row is redrawn, and only if it is on screen
+                self.task_list.update_row(task_id, refresh=True, task_text=str(task_text), reminder=str(reminder_time))
+                self.task_list.reorder([task_id])
+                self.input_field.text = ""
+                self.reminder_field.text = ""
+                self.storage.rename(current_task, task_text, reminder_time or None, self.tasks.status[task_id])
+                self.record_action(before, self.task_rows(touched))
 
+    @timed()
     def remove_task(self, instance):
-        selected_items = [item for item in self.task_list.children[0].children if isinstance(item, TaskItem) and item.selected]
-        if selected_items:
-            task_text = selected_items[0].task_text
-            self.tasks.pop(task_text, None)
-            self.task_list.data = [task for task in self.task_list.data if task['task_text'] != task_text]
-            self.task_list.refresh_from_data()
-            self.save_tasks()
+        # Every ticked task goes, in one pass over the list and one batch of storage writes
+        selected_rows = self.task_list.selected_rows()
+        if selected_rows:
+            before = self.task_rows([row["task_text"] for row in selected_rows])
+            for row in selected_rows:
+                self.tasks.remove(row["task_text"])
+                self.notifications.discard(row["task_text"])
+                self.scheduler.cancel(row["task_text"])
+                self.search_index.remove(row["task_id"])
+            self.arm_reminder_timer()
+            self.task_list.remove_rows([row["task_id"] for row in selected_rows])
+            self.storage.delete_many([row["task_text"] for row in selected_rows])
+            self.record_action(before, [(row["task_text"], None) for row in selected_rows])
+
+    def task_rows(self, task_texts):
+        """ (text, row) pairs for task_texts as the undo history keeps them, row None for tasks not listed """
+        pairs = []
+        for task_text in task_texts:
+            task_id = self.tasks.row_of(task_text)
+            if task_id is None:
+                pairs.append((task_text, None))
+            else:
+                text, reminder, status = self.tasks.record(task_id)
+                pairs.append((task_text, (text, reminder or None, status)))
+        return pairs
+
+    def record_action(self, before, after):
+        self.history.record(before, after)
+        self.update_history_buttons()
+
+    @timed()
+    def undo(self, instance):
+        self.apply_history(self.history.undo())
+
+    @timed()
+    def redo(self, instance):
+        self.apply_history(self.history.redo())
 
+    def apply_history(self, changes):
+        """ Put the tasks an undo or redo touched back in the list and in storage """
+        if changes is not None:
+            self.apply_task_changes(changes)
+            self.storage.delete_many([task_text for task_text, row in changes if row is None])
+            self.storage.put_many([row for task_text, row in changes if row is not None])
+        self.update_history_buttons()
+
+    def update_history_buttons(self):
+        self.undo_button.disabled = not self.history.can_undo
+        self.redo_button.disabled = not self.history.can_redo
+
+    @timed()
+    def apply_filter(self, instance, query):
+        """ Narrow the list to tasks containing query, on every keystroke """
+        if not query:
+            self.task_list.set_filter(None)
+            return
+        folded = query.casefold()
+        self.task_list.set_filter(
+            self.search_index.search(query),
+            lambda row: folded in row["task_text"].casefold(),
+        )
+
+    @timed()
+    def set_sort(self, instance, label):
+        """ Show the list in the order picked in the spinner, and remember it """
+        sort = self.sort_labels[label]
+        self.task_list.set_sort(sort)
+        self.settings.set("sort", sort)
+
+    @timed()
     def save_tasks(self):
-        with open('tasks.json', 'w') as file:
-            json.dump(self.tasks, file)
+        # Make everything saved so far durable (journal compaction / WAL checkpoint)
+        self.storage.save()
+
+    def save_status(self):
+        """ Return (pending writes, last flush latency in seconds) of the save pipeline """
+        return self.storage.pending_writes, self.storage.last_flush_latency
+
+    def poll_storage(self, dt):
+        # A couple of stat() calls, or a PRAGMA for SQLite, unless something changed
+        self.storage.refresh()
+
+    def storage_changed(self):
+        # Called on the journal's writer thread for tasks.json, the list is changed on the Kivy thread
+        Clock.schedule_once(self.apply_storage_changes)
+
+    @timed()
+    def apply_storage_changes(self, dt):
+        """ Apply the tasks other instances added, changed or removed, row by row """
+        self.apply_task_changes(self.storage.take_changes())
+
+    def apply_task_changes(self, changes):
+        """ Apply (text, row) changes to the list, search index and reminders; a row of None removes the task """
+        removed_ids = []
+        new_rows = []
+        changed_ids = []
+        for task_text, row in changes:
+            task_id = self.tasks.row_of(task_text)
+            if row is None:
+                self.scheduler.cancel(task_text)
+                self.notifications.discard(task_text)
+                if task_id is not None:
+                    self.tasks.remove(task_text)
+                    self.search_index.remove(task_id)
+                    removed_ids.append(task_id)
+                continue
+            reminder_time, status = row[1] or "", row[2]
+            if task_id is None:
+                new_rows.append(self.new_row(task_text, reminder_time, status))
+            elif self.tasks.reminder(task_id) != (reminder_time or None) or self.tasks.status[task_id] != status:
+                self.tasks.set_reminder(task_id, reminder_time, reminder_due(reminder_time))
+                self.tasks.status[task_id] = status
+                self.task_list.update_row(
+                    task_id, refresh=True, reminder=str(reminder_time),
+                    done_selected=status == STATUS_DONE, not_yet_selected=status == STATUS_WRONG,
+                )
+                changed_ids.append(task_id)
+            self.schedule_reminder(task_text, reminder_time, arm=False)
+        if removed_ids:
+            self.task_list.remove_rows(removed_ids)
+        if changed_ids:
+            self.task_list.reorder(changed_ids)
+        if new_rows:
+            self.task_list.append_rows(new_rows)
+        self.arm_reminder_timer()
+
+    def on_start(self):
+        # The window is up, the rest waits for its first frame to be drawn
+        Window.bind(on_flip=self.first_frame)
+
+    def first_frame(self, *args):
+        Window.unbind(on_flip=self.first_frame)
+        Clock.schedule_once(self.after_first_paint)
+
+    def after_first_paint(self, dt):
+        """ Start what the first frame doesn't need: the API and loading tasks """
+        if instrumentation.first_paint(STARTED):
+            self.stop()  # TODO_STARTUP_EXIT, a start-up benchmark run
+            return
+        self.start_api()
+        self.load_tasks()
+
+    def start_api(self):
+        address = os.environ.get("TODO_API")
+        if not address:
+            return
+        # Imported here, asyncio is only worth loading when the API is on
+        from api import ApiServer, VIEW_INTERVAL
+        self.api_view_trigger = Clock.create_trigger(self.show_api_changes, VIEW_INTERVAL)
+        self.api_server = ApiServer(address, listener=self.api_requests)
+        try:
+            self.api_server.start()
+        except OSError as error:
+            print(f"API not started on {address}: {error}")
+            self.api_server = None
+
+    def api_requests(self):
+        # Called on the API server's thread, the calls are run on the Kivy thread
+        Clock.schedule_once(self.apply_api_requests)
+
+    @timed()
+    def apply_api_requests(self, dt):
+        """ Run the queued API calls with one storage write, the list catches up every VIEW_INTERVAL """
+        if self.api_server is None:
+            return
+        changes, renamed, more = self.api_server.process(self.storage)
+        self.rename_tasks(renamed)
+        self.api_changed.update(changes)
+        if self.api_changed:
+            self.api_view_trigger()
+        if more:
+            # Let a frame be drawn before the next batch
+            Clock.schedule_once(self.apply_api_requests)
+
+    def rename_tasks(self, renamed):
+        """ Give tasks renamed in storage their new text in their own row, the rest of each change follows """
+        for old_text, task_text in renamed:
+            task_id = self.tasks.row_of(old_text)
+            if task_id is None or task_text in self.tasks:
+                continue
+            self.tasks.rename(task_id, task_text)
+            self.search_index.add(task_id, task_text)
+            self.scheduler.cancel(old_text)
+            self.notifications.discard(old_text)
+            self.task_list.update_row(task_id, refresh=True, task_text=str(task_text))
+            self.task_list.reorder([task_id])
+
+    @timed()
+    def show_api_changes(self, dt):
+        # Read back what is stored now, the user may have changed these tasks in the meantime
+        changed, self.api_changed = self.api_changed, {}
+        self.apply_task_changes([(text, self.storage.get(text)) for text in changed])
+
+    def on_stop(self):
+        # Kivy calls this from stop() and again when run() returns, the second time is a no-op
+        if self.stopped:
+            return
+        self.stopped = True
+        # Make sure queued edits reach the disk before the app exits
+        self.sync_event.cancel()
+        if self.api_server is not None:
+            self.api_server.close()
+            self.api_server = None
+        if self.api_view_trigger is not None:
+            self.api_view_trigger.cancel()
+        if self.archive_event is not None:
+            self.archive_event.cancel()
+        self.storage.listener = None
+        self.storage.close()
+        self.settings.save()
+        instrumentation.stop()
 
     def load_tasks(self):
-        if os.path.exists('tasks.json'):
-            with open('tasks.json', 'r') as file:
-                self.tasks = json.load(file)
-                print(f"Loaded tasks: {self.tasks}")  # Debugging line
-                if isinstance(self.tasks, dict):
-                    # Ensure each task is a dictionary
-                    self.task_list.data = [
-                        {"task_text": task["task_text"], "reminder": task.get("reminder_time", "")}
-                        for task in self.tasks.values() if isinstance(task, dict) and "task_text" in task
-                    ]
-                    self.task_list.refresh_from_data()
-                else:
-                    print("Error: Loaded tasks is not a dictionary.")
+        if self.storage.exists():
+            # Tasks are read a batch per frame, so the window shows right away
+            self.storage.start_loading()
+            self.load_cursor = None
+            self.load_progress.value = 0
+            self.main_layout.add_widget(self.load_progress, index=1)
+            Clock.schedule_once(self.load_next_batch, 0)
         else:
             print("No existing tasks found.")
 
+    @timed()
+    def load_next_batch(self, dt):
+        """ Read one batch of saved tasks into the list, then yield back to the event loop """
+        self.storage.load_step(LOAD_BATCH)
+        rows, self.load_cursor = self.storage.page(self.load_cursor, LOAD_BATCH)
+        new_rows = []
+        for text, reminder, status in rows:
+            if text in self.tasks:
+                continue  # Added while loading, already listed
+            new_rows.append(self.new_row(text, reminder or "", status))
+        self.task_list.append_rows(new_rows)
+        if self.storage.loading or len(rows) == LOAD_BATCH:
+            self.load_progress.value = self.storage.load_progress * 100
+            Clock.schedule_once(self.load_next_batch, 0)
+        else:
+            self.main_layout.remove_widget(self.load_progress)
+            # The storage already knows every reminder's next occurrence, including
+            # one-offs missed while the app was closed, which fire right away
+            for text, reminder, due in self.storage.due_between():
+                self.scheduler.schedule(text, due)
+            self.archive_done_tasks(0)
+            self.archive_event = Clock.schedule_interval(self.archive_done_tasks, ARCHIVE_INTERVAL)
+            self.arm_reminder_timer()
+            print(f"Loaded {len(self.tasks)} tasks, {self.tasks.count(STATUS_NONE)} open")
+
+    @timed()
+    def archive_done_tasks(self, dt):
+        """ Move tasks done more than archive_days ago (settings.json) out of the list into the archive """
+        days = self.settings.get("archive_days", ARCHIVE_DAYS)
+        archived = self.storage.archive_done(time.time() - days * 24 * 60 * 60)
+        if not archived:
+            return
+        removed_ids = []
+        for task_text in archived:
+            task_id = self.tasks.row_of(task_text)
+            self.scheduler.cancel(task_text)
+            self.notifications.discard(task_text)
+            if task_id is not None:
+                self.tasks.remove(task_text)
+                self.search_index.remove(task_id)
+                removed_ids.append(task_id)
+        self.task_list.remove_rows(removed_ids)
+        self.arm_reminder_timer()
+
+    def show_archive(self, instance):
+        self.archive_popup.show()
+
+    @timed()
+    def restore_archived(self, task_texts):
+        """ Move tasks picked in the archive back into the list """
+        new_rows = []
+        for task_text, reminder_time, status in self.storage.restore(task_texts):
+            if task_text in self.tasks:
+                continue
+            new_rows.append(self.new_row(task_text, reminder_time or "", status))
+            self.schedule_reminder(task_text, reminder_time, arm=False)
+        self.task_list.append_rows(new_rows)
+        self.arm_reminder_timer()
+
+    def schedule_reminder(self, task_text, reminder_time, arm=True):
+        """ Put the task's reminder in the scheduler heap, or drop it if there is none """
+        if reminder_time:
+            try:
+                # A one-off time that has already passed fires on the next check
+                due = first_due(reminder_time).timestamp()
+            except ValueError:
+                print(f"Invalid reminder time format for task '{task_text}'.")
+                self.scheduler.cancel(task_text)
+            else:
+                self.scheduler.schedule(task_text, due)
+        else:
+            self.scheduler.cancel(task_text)
+        if arm:
+            self.arm_reminder_timer()
+
+    def arm_reminder_timer(self):
+        """ Replace the pending Clock event with one for the earliest reminder """
+        if self.reminder_event is not None:
+            self.reminder_event.cancel()
+            self.reminder_event = None
+        delay = self.scheduler.seconds_until_next()
+        if delay is not None:
+            self.reminder_event = Clock.schedule_once(self.check_reminders, delay)
+
+    @timed()
     def check_reminders(self, dt):
-        now = datetime.now()
-        for task in self.tasks.values():
-            reminder_time_str = task.get("reminder_time")
-            if reminder_time_str:
-                try:
-                    reminder_time = datetime.strptime(reminder_time_str, "%H:%M").time()
-                    if now.time() >= reminder_time:
-                        print(f"Reminder: {task['task_text']} is due!")
-                        # Remove the reminder after it triggers
-                        task["reminder_time"] = ""
-                        self.save_tasks()
-                except ValueError:
-                    print(f"Invalid reminder time format for task '{task['task_text']}'.")
+        self.reminder_event = None
+        # Everything due up to now fires, including reminders missed while the app was suspended
+        now = time.time()
+        fired_ids = []
+        for task_text, due in self.scheduler.pop_due(now):
+            task_id = self.tasks.row_of(task_text)
+            if task_id is None or not self.tasks.reminder(task_id):
+                continue
+            self.notifications.push(task_text)
+            fired_ids.append(task_id)
+            # Only the occurrence after this one is worked out, and only now that it fired
+            next_due = self.storage.advance(task_text, now)
+            if next_due is not None:
+                self.tasks.set_due(task_id, next_due)
+                self.scheduler.schedule(task_text, next_due)
+            else:
+                # A one-off reminder is removed after it triggers
+                self.tasks.set_reminder(task_id, None)
+                self.storage.put(task_text, None, self.tasks.status[task_id])
+                self.task_list.update_row(task_id, refresh=True, reminder="")
+        self.task_list.reorder(fired_ids)
+        self.arm_reminder_timer()
+        self.arm_notify_timer()
+
+    def arm_notify_timer(self):
+        """ Schedule the next notification, unless one is already scheduled """
+        delay = self.notifications.seconds_until_flush()
+        if delay is not None and self.notify_event is None:
+            self.notify_event = Clock.schedule_once(self.show_notifications, delay)
+
+    @timed()
+    def show_notifications(self, dt):
+        """ Put everything the queue gathered in the reminder panel """
+        self.notify_event = None
+        delay = self.notifications.seconds_until_flush()
+        if delay is None:
+            return
+        if delay > 0:
+            # Rate-limited, come back when the queue allows another notification
+            self.notify_event = Clock.schedule_once(self.show_notifications, delay)
+            return
+        texts = self.notifications.take()
+        print(summary(texts))
+        self.reminder_panel.add_reminders(texts)
+        if self.reminder_panel.parent is None:
+            self.main_layout.add_widget(self.reminder_panel, index=len(self.main_layout.children))
 
 if __name__ == "__main__":
     ToDoApp().run()
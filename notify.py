@@ -0,0 +1,84 @@
+import time
+
+# Reminders arriving this many seconds after the first pending one are still shown with it
+COALESCE_SECONDS = 1.0
+# Notifications are shown at most this often, reminders firing in between wait for the next
+MIN_FLUSH_INTERVAL = 5.0
+# A task announced less than this many seconds ago is not announced again
+REPEAT_SECONDS = 60.0
+# Task texts spelled out in a one-line summary, the rest are counted
+SUMMARY_TASKS = 3
+
+
+def summary(texts, limit=SUMMARY_TASKS):
+    """ One line describing the due tasks in texts """
+    if len(texts) == 1:
+        return f"Reminder for task: '{texts[0]}' is due now!"
+    named = ", ".join(f"'{text}'" for text in texts[:limit])
+    more = f" and {len(texts) - limit} more" if len(texts) > limit else ""
+    return f"{len(texts)} reminders are due now: {named}{more}"
+
+
+class NotificationQueue:
+    """ Due reminders waiting to be announced, grouped into one notification per window.
+
+    The front-end pushes task texts as their reminders fire and arms a single-shot
+    timer for seconds_until_flush(). When it runs, take() hands back everything that
+    gathered in the meantime, to be shown as one non-modal notification. Flushes are
+    spaced at least min_interval apart and a task announced within the last repeat
+    seconds is dropped, so a burst of reminders never turns into a burst of windows.
+    """
+
+    def __init__(self, coalesce=COALESCE_SECONDS, min_interval=MIN_FLUSH_INTERVAL,
+                 repeat=REPEAT_SECONDS, clock=time.monotonic):
+        self.coalesce = coalesce
+        self.min_interval = min_interval
+        self.repeat = repeat
+        self.clock = clock
+        self.pending = {}  # text -> None, kept in arrival order
+        self.first_pending = None
+        self.last_flush = None
+        self.last_shown = {}  # text -> clock time it was last announced
+
+    def __len__(self):
+        return len(self.pending)
+
+    def push(self, text):
+        """ Queue text for the next notification; False if it is already queued or rate-limited """
+        now = self.clock()
+        shown = self.last_shown.get(text)
+        if text in self.pending or (shown is not None and now - shown < self.repeat):
+            return False
+        if not self.pending:
+            self.first_pending = now
+        self.pending[text] = None
+        return True
+
+    def discard(self, text):
+        """ Forget a queued text, e.g. because its task was removed """
+        self.pending.pop(text, None)
+
+    def seconds_until_flush(self):
+        """ Seconds until the pending texts should be shown, None if nothing is pending """
+        if not self.pending:
+            return None
+        due = self.first_pending + self.coalesce
+        if self.last_flush is not None:
+            due = max(due, self.last_flush + self.min_interval)
+        return max(due - self.clock(), 0)
+
+    def take(self):
+        """ Return the pending texts in arrival order and mark them as announced """
+        now = self.clock()
+        texts = list(self.pending)
+        self.pending.clear()
+        self.first_pending = None
+        if not texts:
+            return texts
+        self.last_flush = now
+        if len(self.last_shown) > 2 * len(texts) + 64:
+            # Only announcements inside the repeat window matter, drop the older ones
+            self.last_shown = {text: shown for text, shown in self.last_shown.items() if now - shown < self.repeat}
+        for text in texts:
+            self.last_shown[text] = now
+        return texts
@@ -0,0 +1,253 @@
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from taskstore import NO_REMINDER, STATUS_NONE, STATUS_DONE, STATUS_WRONG
+
+# Orders the task list can be shown in, the first is the default
+SORT_ADDED = "added"
+SORT_REMINDER = "reminder"
+SORT_STATUS = "status"
+SORT_TEXT = "text"
+GROUP_DUE = "due"
+SORT_CHOICES = (
+    ("Order added", SORT_ADDED), ("Reminder time", SORT_REMINDER), ("Status", SORT_STATUS),
+    ("A to Z", SORT_TEXT), ("Overdue / today / later", GROUP_DUE),
+)
+# Groups of the GROUP_DUE view, in the order they are shown
+OVERDUE = "Overdue"
+DUE_TODAY = "Due today"
+DUE_LATER = "Later"
+NO_DUE = "No reminder"
+
+# Items per chunk of a SortedList, a chunk twice this size is split in two
+LOAD = 1000
+# Open tasks first, then the ones marked wrong, done tasks last
+STATUS_RANK = {STATUS_NONE: 0, STATUS_WRONG: 1, STATUS_DONE: 2}
+
+
+class SortedList:
+    """ Sorted items in chunks of at most 2 * load, with a Fenwick tree of the chunk sizes.
+
+    Finding, adding and removing an item is a bisect over the chunk maxima, a list
+    insert or delete in one chunk, and a walk of the tree; the item at a position is
+    found by descending the tree. None of them touches more than one chunk, so they
+    stay logarithmic however many items there are. Items must be unique.
+    """
+
+    def __init__(self, items=(), load=LOAD):
+        self.load = load
+        items = sorted(items)
+        self.chunks = [items[i:i + load] for i in range(0, len(items), load)]
+        self.maxes = [chunk[-1] for chunk in self.chunks]
+        self.size = len(items)
+        self._build_tree()
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for chunk in self.chunks:
+            yield from chunk
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.size:
+            raise IndexError("SortedList index out of range")
+        chunk, offset = self._locate(position)
+        return self.chunks[chunk][offset]
+
+    def _build_tree(self):
+        tree = [0] * (len(self.chunks) + 1)
+        for i, chunk in enumerate(self.chunks, 1):
+            tree[i] += len(chunk)
+            parent = i + (i & -i)
+            if parent < len(tree):
+                tree[parent] += tree[i]
+        self.tree = tree
+
+    def _grow(self, chunk, delta):
+        tree = self.tree
+        i = chunk + 1
+        while i < len(tree):
+            tree[i] += delta
+            i += i & -i
+
+    def _start(self, chunk):
+        """ Position of the first item of chunk """
+        tree = self.tree
+        position = 0
+        while chunk:
+            position += tree[chunk]
+            chunk -= chunk & -chunk
+        return position
+
+    def _locate(self, position):
+        """ (chunk, offset in it) of the item at position """
+        tree = self.tree
+        chunk = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step:
+            i = chunk + step
+            if i < len(tree) and tree[i] <= position:
+                chunk = i
+                position -= tree[i]
+            step >>= 1
+        return chunk, position
+
+    def bisect_left(self, item):
+        """ Position item has, or would be added at """
+        chunk = bisect_left(self.maxes, item)
+        if chunk == len(self.chunks):
+            return self.size
+        return self._start(chunk) + bisect_left(self.chunks[chunk], item)
+
+    def index(self, item):
+        chunk = bisect_left(self.maxes, item)
+        if chunk < len(self.chunks):
+            offset = bisect_left(self.chunks[chunk], item)
+            if self.chunks[chunk][offset] == item:
+                return self._start(chunk) + offset
+        raise ValueError(f"{item!r} is not in the list")
+
+    def add(self, item):
+        """ Insert item, return its position """
+        if not self.chunks:
+            self.chunks.append([item])
+            self.maxes.append(item)
+            self.size = 1
+            self._build_tree()
+            return 0
+        chunk = min(bisect_left(self.maxes, item), len(self.chunks) - 1)
+        items = self.chunks[chunk]
+        offset = bisect_left(items, item)
+        position = self._start(chunk) + offset
+        items.insert(offset, item)
+        self.maxes[chunk] = items[-1]
+        self.size += 1
+        if len(items) > 2 * self.load:
+            # Splitting renumbers the chunks after it, the tree is rebuilt once per load inserts at most
+            self.chunks[chunk:chunk + 1] = [items[:self.load], items[self.load:]]
+            self.maxes[chunk:chunk + 1] = [items[self.load - 1], items[-1]]
+            self._build_tree()
+        else:
+            self._grow(chunk, 1)
+        return position
+
+    def remove(self, item):
+        """ Drop item, return the position it had """
+        position = self.index(item)
+        chunk = bisect_left(self.maxes, item)
+        items = self.chunks[chunk]
+        del items[bisect_left(items, item)]
+        self.size -= 1
+        if items:
+            self.maxes[chunk] = items[-1]
+            self._grow(chunk, -1)
+        else:
+            del self.chunks[chunk]
+            del self.maxes[chunk]
+            self._build_tree()
+        return position
+
+
+def text_key(store, row):
+    text = store.texts[row]
+    return text.casefold(), text, row
+
+
+def reminder_key(store, row):
+    # Tasks without a pending reminder go last, in the order they were added
+    minute = store.due[row]
+    return minute == NO_REMINDER, minute, row
+
+
+def status_key(store, row):
+    return STATUS_RANK.get(store.status[row], 0), row
+
+
+# Key of a task row in each index; GROUP_DUE is the reminder order split into groups
+SORT_KEYS = {SORT_REMINDER: reminder_key, SORT_STATUS: status_key, SORT_TEXT: text_key}
+
+
+def sorted_by(sort):
+    """ Name of the TaskOrder a sort choice is shown from, None for the order tasks were added in """
+    if sort == GROUP_DUE:
+        return SORT_REMINDER
+    return sort if sort in SORT_KEYS else None
+
+
+def due_group(key, now=None):
+    """ Group of the GROUP_DUE view a reminder_key() falls in """
+    no_reminder, minute = key[0], key[1]
+    if no_reminder:
+        return NO_DUE
+    moment = datetime.now() if now is None else datetime.fromtimestamp(now)
+    if minute * 60 < moment.timestamp() // 60 * 60:
+        return OVERDUE
+    midnight = datetime.combine(moment.date() + timedelta(days=1), datetime.min.time())
+    return DUE_TODAY if minute * 60 < midnight.timestamp() else DUE_LATER
+
+
+class TaskOrder:
+    """ Rows of a TaskStore kept sorted by one of SORT_KEYS.
+
+    Each row's key is remembered, so a task whose text, reminder or status changed
+    is found by its old key and moved with one remove and one add. Rows are added
+    and removed one at a time as the list changes; only build() sorts.
+    """
+
+    def __init__(self, store, sort):
+        self.store = store
+        self.sort = sort
+        self.key = SORT_KEYS[sort]
+        self.keys = {}  # store row -> its key in items
+        self.items = SortedList()
+
+    def build(self, rows):
+        """ Index the live store rows among rows, replacing what was indexed """
+        store, key = self.store, self.key
+        texts = store.texts
+        self.keys = {row: key(store, row) for row in rows if texts[row] is not None}
+        self.items = SortedList(self.keys.values())
+
+    def __len__(self):
+        return len(self.items)
+
+    def __contains__(self, row):
+        return row in self.keys
+
+    def __iter__(self):
+        for key in self.items:
+            yield key[-1]
+
+    def __getitem__(self, position):
+        """ Store row at position """
+        return self.items[position][-1]
+
+    def position(self, row):
+        key = self.keys.get(row)
+        return self.items.index(key) if key is not None else None
+
+    def locate(self, row):
+        """ Position row would be added at, with what the store holds for it now """
+        return self.items.bisect_left(self.key(self.store, row))
+
+    def add(self, row):
+        key = self.keys[row] = self.key(self.store, row)
+        return self.items.add(key)
+
+    def remove(self, row):
+        """ Drop row, return the position it had or None if it was not indexed """
+        key = self.keys.pop(row, None)
+        return self.items.remove(key) if key is not None else None
+
+    def stale(self, row):
+        """ Whether row's key changed since it was indexed """
+        return row in self.keys and self.keys[row] != self.key(self.store, row)
+
+    def move(self, row):
+        """ Re-index a row whose key changed, return (old position, new position) """
+        return self.remove(row), self.add(row)
+
+    def group(self, row, now=None):
+        """ GROUP_DUE group of row, for an order by reminder """
+        return due_group(self.keys[row], now)
@@ -0,0 +1,172 @@
+import calendar
+import functools
+import re
+from datetime import datetime, timedelta
+
+# A task's reminder is a rule string, stored as is in tasks.json and the database:
+#   "2026-10-20 14:30"                once, at that date and time
+#   "14:30" or "daily 14:30"          every day, though the old Kivy app saved "14:30" for once
+#   "weekdays 09:00"                  Monday to Friday
+#   "every 3h from 2026-10-20 09:00"  every N hours, counted from the start
+#   "monthly 15 09:00"                on that day of every month, or its last day if shorter
+DATETIME_FORMAT = "%Y-%m-%d %H:%M"
+
+ONCE = "once"
+DAILY = "daily"
+WEEKDAYS = "weekdays"
+HOURLY = "every"
+MONTHLY = "monthly"
+
+_TIME = r"(\d{1,2}):(\d{2})"
+_DATETIME = r"(\d{4})-(\d{2})-(\d{2}) " + _TIME
+_PATTERNS = (
+    (ONCE, re.compile(_DATETIME)),
+    (DAILY, re.compile(r"(?:daily )?" + _TIME)),
+    (WEEKDAYS, re.compile(r"weekdays " + _TIME)),
+    (HOURLY, re.compile(r"every (\d+)h from " + _DATETIME)),
+    (MONTHLY, re.compile(r"monthly (\d{1,2}) " + _TIME)),
+)
+
+
+class Rule:
+    """ A parsed reminder rule; next_after() works out one occurrence at a time """
+
+    __slots__ = ("kind", "hour", "minute", "start", "hours", "day")
+
+    def __init__(self, kind, hour=0, minute=0, start=None, hours=0, day=0):
+        self.kind = kind
+        self.hour = hour
+        self.minute = minute
+        self.start = start  # Date and time of a once rule, first occurrence of an hourly one
+        self.hours = hours
+        self.day = day
+
+    def next_after(self, moment):
+        """ The first occurrence strictly after the datetime moment, None if there is none """
+        if self.kind == ONCE:
+            return self.start if self.start > moment else None
+        if self.kind == HOURLY:
+            if moment < self.start:
+                return self.start
+            step = timedelta(hours=self.hours)
+            return self.start + step * ((moment - self.start) // step + 1)
+        if self.kind == MONTHLY:
+            year, month = moment.year, moment.month
+            while True:
+                day = min(self.day, calendar.monthrange(year, month)[1])
+                candidate = datetime(year, month, day, self.hour, self.minute)
+                if candidate > moment:
+                    return candidate
+                year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+        candidate = moment.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if candidate <= moment:
+            candidate += timedelta(days=1)
+        if self.kind == WEEKDAYS:
+            while candidate.weekday() >= 5:
+                candidate += timedelta(days=1)
+        return candidate
+
+
+def _time(hour, minute):
+    hour, minute = int(hour), int(minute)
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        raise ValueError(f"Invalid time {hour}:{minute:02d}")
+    return hour, minute
+
+
+def _datetime(year, month, day, hour, minute):
+    return datetime(int(year), int(month), int(day), *_time(hour, minute))
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_rule(reminder):
+    """ Parse a reminder rule string, raise ValueError if it is malformed.
+
+    Cached, since many tasks tend to share the same few rules.
+    """
+    for kind, pattern in _PATTERNS:
+        match = pattern.fullmatch(reminder.strip())
+        if match is None:
+            continue
+        groups = match.groups()
+        if kind == ONCE:
+            return Rule(kind, start=_datetime(*groups))
+        if kind == HOURLY:
+            hours = int(groups[0])
+            if hours < 1:
+                raise ValueError(f"Invalid reminder: {reminder!r}")
+            return Rule(kind, start=_datetime(*groups[1:]), hours=hours)
+        if kind == MONTHLY:
+            day = int(groups[0])
+            if not 1 <= day <= 31:
+                raise ValueError(f"Invalid reminder: {reminder!r}")
+            return Rule(kind, *_time(*groups[1:]), day=day)
+        return Rule(kind, *_time(*groups))
+    raise ValueError(f"Invalid reminder: {reminder!r}")
+
+
+def first_due(reminder, now=None):
+    """ The datetime a newly set or loaded reminder should fire next, None if it never will.
+
+    A once rule keeps its own time even if that has passed, so a reminder missed
+    while the app was closed still fires. Raises ValueError for malformed rules.
+    """
+    rule = parse_rule(reminder)
+    if rule.kind == ONCE:
+        return rule.start
+    return rule.next_after(now or datetime.now())
+
+
+def next_due(reminder, after):
+    """ The next occurrence after the datetime after, None once a rule is used up """
+    return parse_rule(reminder).next_after(after)
+
+
+def make_rule(kind, moment, hours=1):
+    """ Rule string of the given kind, taking its time (and date, where needed) from moment """
+    time_of_day = moment.strftime("%H:%M")
+    if kind == ONCE:
+        return moment.strftime(DATETIME_FORMAT)
+    if kind == HOURLY:
+        return f"every {hours}h from {moment.strftime(DATETIME_FORMAT)}"
+    if kind == MONTHLY:
+        return f"monthly {moment.day} {time_of_day}"
+    return f"{kind} {time_of_day}"
+
+
+def rule_from_input(text, now=None):
+    """ Complete a rule typed by hand: a bare "HH:mm" means once, the next time the
+    clock shows it (today, or tomorrow if it has passed), and "every Nh" starts now.
+    Raises ValueError if the result is malformed.
+
+    The result always carries its date, a bare "HH:mm" stored by older versions is
+    still read as daily by parse_rule(), except in Kivy's layout (see legacy_once()).
+    """
+    text = " ".join(text.split())
+    now = (now or datetime.now()).replace(second=0, microsecond=0)
+    match = re.fullmatch(_TIME, text)
+    if match:
+        hour, minute = _time(*match.groups())
+        moment = now.replace(hour=hour, minute=minute)
+        if moment <= now:
+            # Already past today, a once rule for it would fire right away
+            moment += timedelta(days=1)
+        text = moment.strftime(DATETIME_FORMAT)
+    elif re.fullmatch(r"every \d+h", text):
+        text = f"{text} from {now.strftime(DATETIME_FORMAT)}"
+    parse_rule(text)
+    return text
+
+
+def legacy_once(reminder, now=None):
+    """ The once rule a bare "HH:mm" saved by the old Kivy app stands for, other rules as they are.
+
+    Kivy used to remind once at that time and then clear the reminder, so it
+    becomes its next occurrence, like the same time typed in now.
+    """
+    if re.fullmatch(_TIME, reminder.strip()) is None:
+        return reminder
+    try:
+        return rule_from_input(reminder, now)
+    except ValueError:
+        return reminder  # Reported as malformed where the reminder is armed
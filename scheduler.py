@@ -0,0 +1,70 @@
+import heapq
+import itertools
+import time
+
+# Longest single sleep between heap checks. Timers run on a monotonic clock that
+# may stop while the machine is suspended, so we wake up at least this often to
+# notice wall-clock jumps and fire the reminders we slept through.
+MAX_TIMER_SLEEP = 60
+
+
+class ReminderScheduler:
+    """ Reminders kept in a min-heap keyed by absolute due time (epoch seconds) """
+
+    def __init__(self):
+        self._heap = []
+        self._entries = {}  # key -> heap entry, for O(1) cancel
+        self._counter = itertools.count()  # Tie-breaker so keys are never compared
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def schedule(self, key, due):
+        """ Schedule (or reschedule) the reminder for key at epoch time due """
+        self.cancel(key)
+        entry = [due, next(self._counter), key, True]
+        self._entries[key] = entry
+        heapq.heappush(self._heap, entry)
+
+    def cancel(self, key):
+        """ Drop the reminder for key, if any """
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        entry[3] = False  # Lazy deletion, the entry is skipped when it reaches the top
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            # Too many dead entries, rebuild so the heap stays proportional to live reminders
+            self._heap = [e for e in self._heap if e[3]]
+            heapq.heapify(self._heap)
+
+    def next_due(self):
+        """ Return the earliest due time, or None if nothing is scheduled """
+        heap = self._heap
+        while heap and not heap[0][3]:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def pop_due(self, now=None):
+        """ Remove and return (key, due) for every reminder due at or before now """
+        if now is None:
+            now = time.time()
+        fired = []
+        heap = self._heap
+        while heap and (not heap[0][3] or heap[0][0] <= now):
+            due, _, key, alive = heapq.heappop(heap)
+            if alive:
+                del self._entries[key]
+                fired.append((key, due))
+        return fired
+
+    def seconds_until_next(self, now=None):
+        """ Delay before the next check, capped at MAX_TIMER_SLEEP; None if idle """
+        due = self.next_due()
+        if due is None:
+            return None
+        if now is None:
+            now = time.time()
+        return min(max(due - now, 0), MAX_TIMER_SLEEP)
@@ -0,0 +1,74 @@
+def trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """ Incremental trigram index for case-insensitive substring search over task text """
+
+    def __init__(self):
+        self.texts = {}  # key -> casefolded text
+        self.postings = {}  # trigram -> set of keys whose text contains it
+
+    def __len__(self):
+        return len(self.texts)
+
+    def __contains__(self, key):
+        return key in self.texts
+
+    def add(self, key, text):
+        """ Index text under key, replacing whatever key had before """
+        if key in self.texts:
+            self.remove(key)
+        text = text.casefold()
+        self.texts[key] = text
+        postings = self.postings
+        for gram in trigrams(text):
+            keys = postings.get(gram)
+            if keys is None:
+                postings[gram] = {key}
+            else:
+                keys.add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def clear(self):
+        self.texts = {}
+        self.postings = {}
+
+    def matches(self, key, query):
+        """ Whether the text indexed under key contains query """
+        text = self.texts.get(key)
+        return text is not None and query.casefold() in text
+
+    def search(self, query):
+        """ Return the set of keys whose text contains query """
+        query = query.casefold()
+        if not query:
+            return set(self.texts)
+        if len(query) < 3:
+            # Too short for a trigram, a scan of the folded texts is still only a few ms
+            return {key for key, text in self.texts.items() if query in text}
+        # Intersect the rarest posting lists first so the candidate set shrinks fast
+        postings = [self.postings.get(gram) for gram in trigrams(query)]
+        if not all(postings):
+            return set()
+        postings.sort(key=len)
+        result = set(postings[0])
+        for keys in postings[1:]:
+            result &= keys
+            if not result:
+                return result
+        if len(query) > 3:
+            # Sharing every trigram does not guarantee the trigrams are adjacent
+            texts = self.texts
+            result = {key for key in result if query in texts[key]}
+        return result
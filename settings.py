@@ -0,0 +1,34 @@
+import json
+
+from journal import write_json_atomic
+
+DEFAULT_SETTINGS_PATH = "settings.json"
+
+
+class Settings:
+    """ User preferences in settings.json next to the tasks, read once and written on save() """
+
+    def __init__(self, path=DEFAULT_SETTINGS_PATH):
+        self.path = path
+        self.dirty = False
+        try:
+            with open(path, encoding="utf-8") as file:
+                self.values = json.load(file)
+        except (OSError, ValueError):
+            self.values = {}
+        if not isinstance(self.values, dict):
+            self.values = {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        if self.values.get(key) != value:
+            self.values[key] = value
+            self.dirty = True
+
+    def save(self):
+        """ Write the preferences out if anything changed, atomically like tasks.json """
+        if self.dirty:
+            write_json_atomic(self.path, self.values)
+            self.dirty = False
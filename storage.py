@@ -0,0 +1,707 @@
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from journal import TaskJournal
+from recurrence import first_due, legacy_once, next_due
+from taskstore import TaskStore, due_minute, STATUS_NONE, STATUS_DONE
+
+# Tasks move through storage as (text, reminder, status) rows. reminder is a rule
+# string (see recurrence.py) or None, status is 0 (open), 1 (done) or 2 (wrong).
+# Next to each reminder the backends keep its next occurrence, so finding due
+# reminders is a range query that never looks at the rules. Done tasks also carry
+# when they were marked done: archive_done() moves the ones done long enough ago
+# into an archive, which is only read when it is opened.
+
+# tasks.json layouts: final.py maps text -> reminder, kivy.py maps text -> {task_text, reminder_time}
+LAYOUT_QT = "qt"
+LAYOUT_KIVY = "kivy"
+
+DEFAULT_JSON_PATH = "tasks.json"
+DEFAULT_SQLITE_PATH = "tasks.db"
+# Seconds SQLite keeps the log of changed tasks that other instances catch up from
+CHANGE_LOG_SECONDS = 24 * 60 * 60
+# Days after being marked done that a task moves to the archive, unless settings.json sets archive_days
+ARCHIVE_DAYS = 7
+
+
+def row_from_value(text, value):
+    """ Convert a tasks.json value in either layout to a (text, reminder, status) row """
+    if isinstance(value, dict):
+        reminder = value.get("reminder_time") or None
+        if reminder and "task_text" in value:
+            reminder = legacy_once(reminder)  # Kivy's bare times were one-offs
+        return text, reminder, value.get("status", 0)
+    return text, value or None, 0
+
+
+def done_time(value):
+    """ Epoch seconds a task in a tasks.json value was marked done, None if it is not done """
+    return value.get("done_at") if isinstance(value, dict) else None
+
+
+def archive_path(path):
+    """ Where the archive of the tasks in path is kept: tasks.json -> tasks.archive.json """
+    root, ext = os.path.splitext(path)
+    return root + ".archive" + ext
+
+
+def reminder_due(reminder):
+    """ Epoch seconds a newly stored reminder fires next, None if unset, used up or malformed """
+    if not reminder:
+        return None
+    try:
+        due = first_due(reminder)
+    except ValueError:
+        return None
+    return due.timestamp() if due is not None else None
+
+
+def reminder_next_due(reminder, after):
+    """ Epoch seconds of the reminder's occurrence after the epoch time after, or None """
+    if not reminder:
+        return None
+    try:
+        due = next_due(reminder, datetime.fromtimestamp(after))
+    except ValueError:
+        return None
+    return due.timestamp() if due is not None else None
+
+
+class JsonStorage:
+    """ Tasks in tasks.json plus its journal, kept in the front-end's own layout.
+
+    Other instances may share the files. refresh() has the journal's writer look for
+    their changes, which are then picked up on the UI thread with take_changes().
+    """
+
+    def __init__(self, path=DEFAULT_JSON_PATH, layout=LAYOUT_QT):
+        self.path = path
+        self.layout = layout
+        self.journal = TaskJournal(path)
+        self.journal.listener = self._received
+        self.tasks = TaskStore()  # In file order, page() walks its rows
+        self.done_at = {}  # text -> epoch seconds it was marked done, for done tasks
+        # Archived tasks have a snapshot and journal of their own, read on first use
+        self.archive = TaskJournal(archive_path(path), debounce=0)
+        self.archive_appending = False  # Archived tasks are appended to it without reading it
+        self.archived = None
+        self.loaded = False
+        self.stream = None  # Saved tasks still being read by load_step()
+        self.touched = set()  # Tasks edited while streaming, their saved rows are stale
+        self.listener = None  # Called from any thread when take_changes() has something
+        self.incoming = []  # Records from other instances, handed over by the writer thread
+        self.incoming_lock = threading.Lock()
+        self.file_stamp = None
+
+    @property
+    def pending_writes(self):
+        return self.journal.pending_writes
+
+    @property
+    def last_flush_latency(self):
+        return self.journal.last_flush_latency
+
+    def exists(self):
+        return os.path.exists(self.path) or os.path.exists(self.journal.journal_path)
+
+    @property
+    def loading(self):
+        return self.stream is not None
+
+    @property
+    def load_progress(self):
+        """ Fraction of tasks.json read so far """
+        if self.stream is None:
+            return 1.0
+        return self.journal.stream_read / self.journal.stream_size if self.journal.stream_size else 1.0
+
+    def _load(self):
+        if self.loaded:
+            return
+        self.loaded = True
+        for text, value in self.journal.load().items():
+            self._add_value(text, value)
+
+    def _add_value(self, text, value):
+        text, reminder, status = row_from_value(text, value)
+        self._add(text, reminder, status, done_time(value))
+        if isinstance(value, dict) and reminder != (value.get("reminder_time") or None):
+            # A legacy Kivy reminder, saved as the rule it was read as so it isn't moved on every load
+            self.journal.set(text, self._value(text, reminder, status))
+
+    def _add(self, text, reminder, status, done_at=None):
+        self.tasks.add(text, reminder, status, reminder_due(reminder))
+        if status == STATUS_DONE:
+            # A task already done keeps the time it was first marked
+            self.done_at[text] = done_at or self.done_at.get(text) or time.time()
+        else:
+            self.done_at.pop(text, None)
+
+    def start_loading(self):
+        """ Read tasks.json incrementally through load_step() instead of all at once.
+
+        Until loading finishes, lookups only see the tasks read so far.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        self.stream = self.journal.stream()
+
+    def load_step(self, limit):
+        """ Read up to limit more saved tasks, return how many were added """
+        if self.stream is None:
+            return 0
+        added = 0
+        for text, value in self.stream:
+            if text in self.touched:
+                continue  # Edited or removed before its saved row arrived
+            self._add_value(text, value)
+            added += 1
+            if added >= limit:
+                return added
+        self.stream = None
+        self.touched = set()
+        return added
+
+    def _value(self, text, reminder, status):
+        # An open task in the Qt layout stays a bare reminder, as before done state was saved
+        if self.layout == LAYOUT_KIVY:
+            value = {"task_text": text, "reminder_time": reminder or ""}
+        elif status == STATUS_NONE:
+            return reminder
+        else:
+            value = {"reminder_time": reminder}
+        if status != STATUS_NONE:
+            value["status"] = status
+        done_at = self.done_at.get(text)
+        if done_at is not None:
+            value["done_at"] = int(done_at)
+        return value
+
+    def count(self, status=None):
+        self._load()
+        return self.tasks.count(status)
+
+    def contains(self, text):
+        self._load()
+        return text in self.tasks
+
+    def get(self, text):
+        """ Return the (text, reminder, status) row for text, or None """
+        self._load()
+        return self.tasks.get(text)
+
+    def page(self, cursor=None, limit=None):
+        """ Return (rows, cursor) for up to limit tasks after cursor, in file order """
+        self._load()
+        return self.tasks.page(cursor, limit)
+
+    def due_between(self, start=None, end=None):
+        """ Return (text, reminder, due) for reminders next due in [start, end], epoch seconds """
+        self._load()
+        return self.tasks.due_between(start, end)
+
+    def advance(self, text, after):
+        """ Move text's reminder on to its first occurrence after the epoch time after.
+
+        Returns the new due time, or None once the reminder is used up. The next
+        occurrence is recomputed from the rule when tasks.json is loaded, so only
+        the rule itself is written to disk.
+        """
+        self._load()
+        row = self.tasks.row_of(text)
+        if row is None:
+            return None
+        due = reminder_next_due(self.tasks.reminder(row), after)
+        self.tasks.set_due(row, due)
+        return due
+
+    def put(self, text, reminder=None, status=0):
+        """ Insert or update one task """
+        self._load()
+        if self.stream is not None:
+            self.touched.add(text)
+        self._add(text, reminder, status)
+        self.journal.set(text, self._value(text, reminder, status))
+
+    def put_many(self, rows):
+        for text, reminder, status in rows:
+            self.put(text, reminder, status)
+
+    def add_many(self, rows):
+        """ Insert the rows whose text is not stored yet, return how many were added.
+
+        Duplicates are found with hash lookups in the store's text -> row dict, the
+        same check add_task makes, and in a dict of the batch's own new tasks.
+        """
+        self._load()
+        tasks = self.tasks
+        new = {}
+        for text, reminder, status in rows:
+            if text not in tasks and text not in new:
+                new[text] = (reminder, status)
+        tasks.extend((text, reminder, status, reminder_due(reminder)) for text, (reminder, status) in new.items())
+        now = time.time()
+        self.done_at.update((text, now) for text, (reminder, status) in new.items() if status == STATUS_DONE)
+        if self.stream is not None:
+            self.touched.update(new)
+        self.journal.set_many((text, self._value(text, reminder, status)) for text, (reminder, status) in new.items())
+        return len(new)
+
+    def delete(self, text):
+        self._load()
+        self.done_at.pop(text, None)
+        if self.stream is not None:
+            self.touched.add(text)
+            self.journal.delete(text)  # It may not have been read yet
+            self.tasks.remove(text)
+        elif self.tasks.remove(text) is not None:
+            self.journal.delete(text)
+
+    def delete_many(self, texts):
+        for text in texts:
+            self.delete(text)
+
+    def rename(self, old_text, text, reminder=None, status=0):
+        """ Replace old_text with a new task, keeping its position """
+        self._load()
+        if self.stream is not None:
+            self.touched.update((old_text, text))
+        row = self.tasks.row_of(old_text)
+        if row is not None:
+            self.tasks.rename(row, text)
+        done_at = self.done_at.pop(old_text, None)
+        self._add(text, reminder, status, done_at)
+        self.journal.rename(old_text, text, self._value(text, reminder, status))
+
+    def save(self):
+        """ Fold the journal into a fresh tasks.json and wait for it """
+        self.journal.compact()
+        self.journal.flush()
+
+    def archive_done(self, before):
+        """ Move the tasks marked done before the epoch time before to the archive, return their texts.
+
+        They are written to the archive's journal before they leave tasks.json, so a
+        crash in between leaves a task in both rather than in neither. The archive
+        itself is not read until it is opened.
+        """
+        self._load()
+        texts = [text for text, done_at in self.done_at.items() if done_at < before]
+        if not texts:
+            return texts
+        values = [(text, self._value(*self.tasks.get(text))) for text in texts]
+        if self.archived is None and not self.archive_appending:
+            self.archive.append_only()
+            self.archive_appending = True
+        self.archive.set_many(values)
+        self.archive.flush()
+        if self.archived is not None:
+            for text, value in values:
+                self.archived.add(*row_from_value(text, value))
+        self.delete_many(texts)
+        return texts
+
+    def _load_archive(self):
+        if self.archived is None:
+            self._load()
+            self.archived = TaskStore()
+            for text, value in self.archive.load().items():
+                if text not in self.tasks:  # Left in both by a crash, the list wins
+                    self.archived.add(*row_from_value(text, value))
+        return self.archived
+
+    def archive_page(self, cursor=None, limit=None):
+        """ Return (rows, cursor) for up to limit archived tasks after cursor, reading the archive on first use """
+        return self._load_archive().page(cursor, limit)
+
+    def restore(self, texts):
+        """ Move archived tasks back into the list, return their rows """
+        archived = self._load_archive()
+        rows = [archived.get(text) for text in texts if text in archived]
+        self.put_many(rows)
+        self.journal.flush()  # Back in tasks.json before they leave the archive
+        for text, reminder, status in rows:
+            archived.remove(text)
+            self.archive.delete(text)
+        return rows
+
+    def watch_paths(self):
+        """ Files other instances write to, for a file watcher """
+        return [self.path, self.journal.journal_path]
+
+    def refresh(self):
+        """ Look for changes made by other instances if the files changed since the last look.
+
+        Cheap enough to poll: two stat() calls, the reading happens on the journal's thread.
+        """
+        stamp = []
+        for path in self.watch_paths():
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                stamp.append(None)
+            else:
+                stamp.append((stat.st_size, stat.st_mtime_ns))
+        if stamp != self.file_stamp:
+            self.file_stamp = stamp
+            self.journal.refresh()
+
+    def _received(self, records):
+        # On the writer thread, the store is only touched by take_changes()
+        with self.incoming_lock:
+            self.incoming.extend(records)
+        if self.listener is not None:
+            self.listener()
+
+    def take_changes(self):
+        """ Apply what other instances changed, return [(text, row)] with row None for removed tasks """
+        with self.incoming_lock:
+            records, self.incoming = self.incoming, []
+        changes = []
+        for record in records:
+            text = record[1]
+            if self.stream is not None:
+                self.touched.add(text)
+            if record[0] == "d":
+                self.tasks.remove(text)
+                self.done_at.pop(text, None)
+                changes.append((text, None))
+            else:
+                row = row_from_value(text, record[2])
+                self._add(*row, done_time(record[2]))
+                changes.append((text, row))
+        return changes
+
+    def close(self):
+        if self.stream is not None:
+            self.stream.close()
+            self.stream = None
+        self.journal.close()
+        self.archive.close()
+
+
+class SqliteStorage:
+    """ Tasks in an SQLite database in WAL mode, indexed by next reminder and status.
+
+    Triggers log the text of every added, changed or removed task, so an instance
+    sharing the database only reads the tasks others changed since it last looked.
+    """
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH):
+        self.path = path
+        self.created = not os.path.exists(path)
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps commits atomic, NORMAL only skips the fsync on every commit
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL UNIQUE,
+                reminder TEXT,
+                next_due INTEGER,
+                status INTEGER NOT NULL DEFAULT 0,
+                done_at INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status);
+        """)
+        self._migrate()
+        self.conn.executescript("""
+            CREATE INDEX IF NOT EXISTS tasks_next_due ON tasks (next_due) WHERE next_due IS NOT NULL;
+            CREATE INDEX IF NOT EXISTS tasks_done_at ON tasks (done_at) WHERE done_at IS NOT NULL;
+            CREATE TABLE IF NOT EXISTS archive (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL UNIQUE,
+                reminder TEXT,
+                status INTEGER NOT NULL DEFAULT 0,
+                done_at INTEGER
+            );
+            CREATE TABLE IF NOT EXISTS changes (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                text TEXT NOT NULL,
+                at INTEGER NOT NULL DEFAULT (strftime('%s', 'now'))
+            );
+            CREATE TRIGGER IF NOT EXISTS tasks_inserted AFTER INSERT ON tasks BEGIN
+                INSERT INTO changes (text) VALUES (NEW.text);
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_updated AFTER UPDATE OF text, reminder, status ON tasks BEGIN
+                INSERT INTO changes (text) VALUES (OLD.text);
+                INSERT INTO changes (text) SELECT NEW.text WHERE NEW.text != OLD.text;
+            END;
+            CREATE TRIGGER IF NOT EXISTS tasks_deleted AFTER DELETE ON tasks BEGIN
+                INSERT INTO changes (text) VALUES (OLD.text);
+            END;
+        """)
+        self.conn.execute(
+            "DELETE FROM changes WHERE at < CAST(strftime('%s', 'now') AS INTEGER) - ?", (CHANGE_LOG_SECONDS,)
+        )
+        self.conn.commit()
+        self.last_flush_latency = None
+        self.listener = None  # Called when take_changes() has something
+        self.seen = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    # Rows are read on demand, there is nothing to stream at startup
+    loading = False
+    load_progress = 1.0
+
+    @property
+    def pending_writes(self):
+        return 0  # Every write is committed before it returns
+
+    def start_loading(self):
+        pass
+
+    def load_step(self, limit):
+        return 0
+
+    def exists(self):
+        """ Whether there are tasks to load, a new database may hold an imported tasks.json """
+        return self.count() > 0
+
+    def _migrate(self):
+        """ Give databases from before recurring reminders and saved done state their new columns """
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(tasks)")}
+        if "next_due" not in columns:
+            self.conn.execute("ALTER TABLE tasks ADD COLUMN next_due INTEGER")
+            self.conn.execute("DROP INDEX IF EXISTS tasks_reminder_minute")
+            rows = self.conn.execute("SELECT id, reminder FROM tasks WHERE reminder IS NOT NULL").fetchall()
+            self.conn.executemany(
+                "UPDATE tasks SET next_due = ? WHERE id = ?",
+                ((self._next_due(reminder_due(reminder)), row_id) for row_id, reminder in rows),
+            )
+        if "done_at" not in columns:
+            self.conn.execute("ALTER TABLE tasks ADD COLUMN done_at INTEGER")
+
+    @staticmethod
+    def _next_due(due):
+        # Stored in epoch minutes like TaskStore.due, NULL rather than NO_REMINDER for the index
+        return due_minute(due) if due is not None else None
+
+    @staticmethod
+    def _done_at(status):
+        # Only used for tasks not done yet, one already done keeps its time
+        return int(time.time()) if status == STATUS_DONE else None
+
+    def _commit(self):
+        start = time.perf_counter()
+        self.conn.commit()
+        self.last_flush_latency = time.perf_counter() - start
+
+    def count(self, status=None):
+        if status is None:
+            return self.conn.execute("SELECT COUNT(*) FROM tasks").fetchone()[0]
+        return self.conn.execute("SELECT COUNT(*) FROM tasks WHERE status = ?", (status,)).fetchone()[0]
+
+    def contains(self, text):
+        return self.conn.execute("SELECT 1 FROM tasks WHERE text = ?", (text,)).fetchone() is not None
+
+    def get(self, text):
+        """ Return the (text, reminder, status) row for text, or None """
+        return self.conn.execute("SELECT text, reminder, status FROM tasks WHERE text = ?", (text,)).fetchone()
+
+    def page(self, cursor=None, limit=None):
+        """ Return (rows, cursor) for up to limit tasks after cursor, in insertion order """
+        rows = self.conn.execute(
+            "SELECT id, text, reminder, status FROM tasks WHERE id > ? ORDER BY id LIMIT ?",
+            (cursor or 0, -1 if limit is None else limit),
+        ).fetchall()
+        if rows:
+            cursor = rows[-1][0]
+        return [row[1:] for row in rows], cursor
+
+    def due_between(self, start=None, end=None):
+        """ Return (text, reminder, due) for reminders next due in [start, end], epoch seconds """
+        return self.conn.execute(
+            "SELECT text, reminder, next_due * 60 FROM tasks WHERE next_due BETWEEN ? AND ?",
+            (0 if start is None else due_minute(start), 2 ** 31 - 1 if end is None else due_minute(end)),
+        ).fetchall()
+
+    def advance(self, text, after):
+        """ Move text's reminder on to its first occurrence after the epoch time after.
+
+        Returns the new due time, or None once the reminder is used up.
+        """
+        row = self.conn.execute("SELECT reminder FROM tasks WHERE text = ?", (text,)).fetchone()
+        if row is None:
+            return None
+        due = reminder_next_due(row[0], after)
+        self.conn.execute("UPDATE tasks SET next_due = ? WHERE text = ?", (self._next_due(due), text))
+        self._commit()
+        return due
+
+    def put(self, text, reminder=None, status=0):
+        """ Insert or update one task """
+        self._put(text, reminder, status)
+        self._commit()
+
+    def _put(self, text, reminder, status):
+        self.conn.execute(
+            "INSERT INTO tasks (text, reminder, next_due, status, done_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (text) DO UPDATE SET reminder = excluded.reminder, "
+            "next_due = excluded.next_due, status = excluded.status, "
+            "done_at = CASE WHEN excluded.done_at IS NOT NULL THEN COALESCE(tasks.done_at, excluded.done_at) END",
+            (text, reminder, self._next_due(reminder_due(reminder)), status, self._done_at(status)),
+        )
+
+    def put_many(self, rows):
+        """ Insert or update many tasks in one transaction """
+        for text, reminder, status in rows:
+            self._put(text, reminder, status)
+        self._commit()
+
+    def add_many(self, rows):
+        """ Insert the rows whose text is not stored yet in one transaction, return how many were added.
+
+        The unique index on text is the duplicate check.
+        """
+        # rowcount leaves out the rows the change log triggers insert, total_changes does not
+        added = self.conn.executemany(
+            "INSERT INTO tasks (text, reminder, next_due, status, done_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (text) DO NOTHING",
+            ((text, reminder, self._next_due(reminder_due(reminder)), status, self._done_at(status))
+             for text, reminder, status in rows),
+        ).rowcount
+        self._commit()
+        return added
+
+    def delete(self, text):
+        self.conn.execute("DELETE FROM tasks WHERE text = ?", (text,))
+        self._commit()
+
+    def delete_many(self, texts):
+        """ Delete many tasks in one transaction """
+        self.conn.executemany("DELETE FROM tasks WHERE text = ?", ((text,) for text in texts))
+        self._commit()
+
+    def rename(self, old_text, text, reminder=None, status=0):
+        """ Replace old_text with a new task, keeping its position """
+        done_at = self._done_at(status)
+        self.conn.execute(
+            "UPDATE tasks SET text = ?, reminder = ?, next_due = ?, status = ?, "
+            "done_at = CASE WHEN ? IS NOT NULL THEN COALESCE(done_at, ?) END WHERE text = ?",
+            (text, reminder, self._next_due(reminder_due(reminder)), status, done_at, done_at, old_text),
+        )
+        self._commit()
+
+    def save(self):
+        """ Commit and fold the WAL back into the database file """
+        self._commit()
+        self.conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def archive_done(self, before):
+        """ Move the tasks marked done before the epoch time before to the archive table, return their texts """
+        cutoff = int(before)
+        texts = [row[0] for row in self.conn.execute("SELECT text FROM tasks WHERE done_at < ?", (cutoff,))]
+        if texts:
+            self.conn.execute(
+                "INSERT INTO archive (text, reminder, status, done_at) "
+                "SELECT text, reminder, status, done_at FROM tasks WHERE done_at < ? "
+                "ON CONFLICT (text) DO UPDATE SET reminder = excluded.reminder, "
+                "status = excluded.status, done_at = excluded.done_at",
+                (cutoff,),
+            )
+            self.conn.execute("DELETE FROM tasks WHERE done_at < ?", (cutoff,))
+            self._commit()
+        return texts
+
+    def archive_page(self, cursor=None, limit=None):
+        """ Return (rows, cursor) for up to limit archived tasks after cursor, in the order they were archived """
+        rows = self.conn.execute(
+            "SELECT id, text, reminder, status FROM archive WHERE id > ? ORDER BY id LIMIT ?",
+            (cursor or 0, -1 if limit is None else limit),
+        ).fetchall()
+        if rows:
+            cursor = rows[-1][0]
+        return [row[1:] for row in rows], cursor
+
+    def restore(self, texts):
+        """ Move archived tasks back into the list in one transaction, return their rows """
+        rows = []
+        for text in texts:
+            row = self.conn.execute("SELECT text, reminder, status FROM archive WHERE text = ?", (text,)).fetchone()
+            if row is not None:
+                self._put(*row)
+                self.conn.execute("DELETE FROM archive WHERE text = ?", (text,))
+                rows.append(row)
+        self._commit()
+        return rows
+
+    def watch_paths(self):
+        return [self.path, self.path + "-wal"]
+
+    def refresh(self):
+        """ Tell the listener if another connection committed since the last look """
+        version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.data_version:
+            self.data_version = version
+            if self.listener is not None:
+                self.listener()
+
+    def take_changes(self):
+        """ Return [(text, row)] for tasks changed since the last call, row None for removed tasks.
+
+        This instance's own changes come back too, as rows it already has.
+        """
+        last = self.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+        rows = self.conn.execute(
+            "SELECT changed.text, tasks.reminder, tasks.status, tasks.id FROM "
+            "(SELECT DISTINCT text FROM changes WHERE seq > ? AND seq <= ?) AS changed "
+            "LEFT JOIN tasks ON tasks.text = changed.text",
+            (self.seen, last),
+        ).fetchall()
+        self.seen = last
+        return [(text, (text, reminder, status) if row_id is not None else None)
+                for text, reminder, status, row_id in rows]
+
+    def close(self):
+        if self.conn is None:
+            return  # Already closed
+        self.conn.commit()
+        self.conn.close()
+        self.conn = None
+
+
+def import_tasks_json(json_path, storage):
+    """ Copy every task from a tasks.json in either layout into storage, return the count """
+    journal = TaskJournal(json_path)
+    rows = [row_from_value(text, value) for text, value in journal.load().items()]
+    storage.put_many(rows)
+    return len(rows)
+
+
+def open_storage(layout=LAYOUT_QT, kind=None):
+    """ Open the configured backend, TODO_STORAGE=sqlite selects SQLite over tasks.json.
+
+    A new SQLite database is filled from an existing tasks.json the first time.
+    """
+    kind = kind or os.environ.get("TODO_STORAGE", "json")
+    if kind == "sqlite":
+        storage = SqliteStorage(DEFAULT_SQLITE_PATH)
+        # Tasks never compacted into tasks.json are only in its journal
+        saved = os.path.exists(DEFAULT_JSON_PATH) or os.path.exists(DEFAULT_JSON_PATH + ".journal")
+        if storage.created and saved:
+            count = import_tasks_json(DEFAULT_JSON_PATH, storage)
+            print(f"Imported {count} tasks from {DEFAULT_JSON_PATH} into {DEFAULT_SQLITE_PATH}")
+        return storage
+    return JsonStorage(DEFAULT_JSON_PATH, layout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import a tasks.json into an SQLite task database")
+    parser.add_argument("source", nargs="?", default=DEFAULT_JSON_PATH)
+    parser.add_argument("database", nargs="?", default=DEFAULT_SQLITE_PATH)
+    args = parser.parse_args()
+    storage = SqliteStorage(args.database)
+    count = import_tasks_json(args.source, storage)
+    storage.close()
+    print(f"Imported {count} tasks from {args.source} into {args.database}")
+
+
+if __name__ == "__main__":
+    main()
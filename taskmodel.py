@@ -0,0 +1,591 @@
+from array import array
+from bisect import bisect_left, bisect_right
+
+from PyQt5.QtWidgets import QStyle, QStyledItemDelegate, QStyleOptionButton, QApplication
+from PyQt5.QtCore import Qt, QAbstractListModel, QModelIndex, QRect, QSize, QEvent, pyqtSignal
+from PyQt5.QtGui import QPalette
+
+from instrument import timed
+from order import TaskOrder, SORT_ADDED, GROUP_DUE, sorted_by
+from storage import reminder_due
+from taskstore import TaskStore, STATUS_NONE, STATUS_DONE, STATUS_WRONG
+
+StatusRole = Qt.UserRole + 1
+ReminderRole = Qt.UserRole + 2
+GroupRole = Qt.UserRole + 3  # Overdue / due today / later / no reminder, in the GROUP_DUE view
+
+# Rows pulled from storage each time the view scrolls to the end of what is loaded
+PAGE_SIZE = 500
+
+
+class TaskListModel(QAbstractListModel):
+    """ List model over a TaskStore, each model row maps to a store row holding the task.
+
+    Rows are shown in the order they were added, or sorted by a TaskOrder (order.py).
+    A TaskOrder is built the first time its order is chosen, and from then on every
+    change to the model adds, removes or moves single rows in it, so switching back
+    to it or changing a task in a long sorted list never sorts the list again.
+    """
+    reminder_off = pyqtSignal(str)  # Signal to indicate reminder should be turned off
+    status_changed = pyqtSignal(str)  # A checkbox click changed the task's status
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.store = TaskStore()
+        self.order = array("i")  # model row -> store row
+        self.positions = {}  # text -> model row
+        # positions is only trusted below this row, removals push it down and the
+        # next lookup past it re-indexes the tail once
+        self.valid_upto = 0
+        self.storage = None
+        self.cursor = None  # Storage page cursor of the last fetched row
+        self.exhausted = True
+        self.sort = SORT_ADDED
+        self.orders = {}  # TaskOrder name -> TaskOrder, kept up to date once built
+        self.shown = None  # TaskOrder the rows are shown in, None for the order they were added in
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.shown_rows())
+
+    def shown_rows(self):
+        """ Store rows in the order they are shown """
+        return self.order if self.shown is None else self.shown
+
+    def store_row(self, row):
+        return self.order[row] if self.shown is None else self.shown[row]
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        row = self.store_row(index.row())
+        if role == Qt.DisplayRole or role == Qt.EditRole:
+            return self.store.texts[row]
+        if role == StatusRole:
+            return self.store.status[row]
+        if role == ReminderRole:
+            return self.store.reminder(row)
+        if role == GroupRole:
+            return self.shown.group(row) if self.sort == GROUP_DUE else None
+        return None
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != StatusRole:
+            return False
+        row = self.store_row(index.row())
+        self.store.status[row] = value
+        self._resort([row])
+        index = self.index(self.row_of(self.store.texts[row]))
+        self.dataChanged.emit(index, index, [StatusRole])
+        if value == STATUS_DONE:
+            self.reminder_off.emit(self.store.texts[row])  # Emit signal to turn off reminder
+        self.status_changed.emit(self.store.texts[row])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return Qt.ItemIsEnabled | Qt.ItemIsSelectable
+
+    def __contains__(self, text):
+        return text in self.store
+
+    def task(self, text):
+        """ Return the (text, reminder, status) record for text, or None """
+        return self.store.get(text)
+
+    def text_at(self, row):
+        return self.store.texts[self.store_row(row)]
+
+    def row_of(self, text):
+        if text not in self.store:
+            return -1
+        if self.shown is not None:
+            return self.shown.position(self.store.row_of(text))
+        return self._added_row(text)
+
+    def _added_row(self, text):
+        """ Position of text in the order tasks were added """
+        row = self.positions.get(text)
+        if row is not None and row < self.valid_upto:
+            return row
+        texts = self.store.texts
+        for row in range(self.valid_upto, len(self.order)):
+            self.positions[texts[self.order[row]]] = row
+        self.valid_upto = len(self.order)
+        return self.positions[text]
+
+    def _append(self, store_rows):
+        """ Show store rows after the last row, between begin/endInsertRows """
+        first = len(self.order)
+        self.order.extend(store_rows)
+        texts = self.store.texts
+        for row, store_row in enumerate(store_rows, first):
+            self.positions[texts[store_row]] = row
+        if self.valid_upto == first:
+            self.valid_upto = len(self.order)
+
+    def _insert(self, store_rows):
+        """ Show newly stored rows, after the last row or at their place in the sorted order """
+        if self.shown is None:
+            first = len(self.order)
+            self.beginInsertRows(QModelIndex(), first, first + len(store_rows) - 1)
+            self._append(store_rows)
+            self._index(store_rows)
+            self.endInsertRows()
+        elif len(store_rows) == 1:
+            position = self.shown.locate(store_rows[0])
+            self.beginInsertRows(QModelIndex(), position, position)
+            self._append(store_rows)
+            self._index(store_rows)
+            self.endInsertRows()
+        else:
+            # Rows land all over a sorted list, one reset costs less than a signal per row
+            self.beginResetModel()
+            self._append(store_rows)
+            self._index(store_rows)
+            self.endResetModel()
+
+    def _index(self, store_rows):
+        for order in self.orders.values():
+            for store_row in store_rows:
+                order.add(store_row)
+
+    def _resort(self, store_rows):
+        """ Move rows whose text, reminder or status changed to their new place in every order """
+        for order in self.orders.values():
+            moved = [store_row for store_row in store_rows if order.stale(store_row)]
+            if not moved:
+                continue
+            if order is not self.shown:
+                for store_row in moved:
+                    order.move(store_row)
+            elif len(moved) == 1:
+                # Removed and inserted rather than moved, so the filter model follows along
+                position = order.position(moved[0])
+                self.beginRemoveRows(QModelIndex(), position, position)
+                order.remove(moved[0])
+                self.endRemoveRows()
+                position = order.locate(moved[0])
+                self.beginInsertRows(QModelIndex(), position, position)
+                order.add(moved[0])
+                self.endInsertRows()
+            else:
+                self.beginResetModel()
+                for store_row in moved:
+                    order.move(store_row)
+                self.endResetModel()
+
+    def add_task(self, text, reminder=None, status=STATUS_NONE):
+        """ Add a task as a new row """
+        self._insert([self.store.add(text, reminder, status, reminder_due(reminder))])
+
+    def remove_task(self, text):
+        row = self.row_of(text)
+        if row < 0:
+            return False
+        added_row = self._added_row(text)
+        self.beginRemoveRows(QModelIndex(), row, row)
+        store_row = self.store.row_of(text)
+        for order in self.orders.values():
+            order.remove(store_row)
+        del self.order[added_row]
+        self.store.remove(text)
+        del self.positions[text]
+        self.valid_upto = min(self.valid_upto, added_row)
+        self.endRemoveRows()
+        return True
+
+    def remove_tasks(self, texts):
+        """ Remove every task in texts in one pass and one model reset, return the texts removed """
+        texts = {text for text in texts if text in self.store}
+        if len(texts) <= 1:
+            # A single row is cheaper to remove in place, and keeps the view's scroll position
+            return [text for text in texts if self.remove_task(text)]
+        self.beginResetModel()
+        store = self.store
+        for text in texts:
+            store_row = store.row_of(text)
+            for order in self.orders.values():
+                order.remove(store_row)
+            store.remove(text)
+        # Removed store rows have no text left
+        self.order = array("i", [row for row in self.order if store.texts[row] is not None])
+        self.positions = {}
+        self.valid_upto = 0
+        self.endResetModel()
+        return list(texts)
+
+    def replace_task(self, old_text, text, reminder=None, status=STATUS_NONE):
+        """ Put a new task in the row of old_text """
+        row = self.row_of(old_text)
+        if row < 0:
+            return False
+        # Looked up by the old text, so before the store knows the task by its new one
+        added_row = self._added_row(old_text)
+        store_row = self.store.row_of(old_text)
+        self.store.rename(store_row, text)
+        self.store.add(text, reminder, status, reminder_due(reminder))
+        del self.positions[old_text]
+        self.positions[text] = added_row
+        self._resort([store_row])
+        index = self.index(self.row_of(text))
+        self.dataChanged.emit(index, index)
+        return True
+
+    def update_task(self, text, reminder, status):
+        """ Give a shown task a new reminder and status and redraw its row """
+        row = self.store.row_of(text)
+        if row is None:
+            return False
+        self.store.set_reminder(row, reminder, reminder_due(reminder))
+        self.store.status[row] = status
+        self._resort([row])
+        index = self.index(self.row_of(text))
+        self.dataChanged.emit(index, index)
+        return True
+
+    def set_reminder(self, text, reminder):
+        row = self.store.row_of(text)
+        if row is None:
+            return False
+        self.store.set_reminder(row, reminder, reminder_due(reminder))
+        self._resort([row])
+        return True
+
+    def set_due(self, text, due):
+        """ Note when a task's reminder fires next, after a repeating one fired """
+        row = self.store.row_of(text)
+        if row is not None:
+            self.store.set_due(row, due)
+            self._resort([row])
+
+    def set_status(self, texts, status):
+        """ Give every task in texts the same status, with one dataChanged for the rows spanned.
+
+        Unlike setData this emits neither reminder_off nor status_changed, the caller handles the batch.
+        Returns the texts changed.
+        """
+        texts = [text for text in texts if text in self.store]
+        store_rows = [self.store.row_of(text) for text in texts]
+        for store_row in store_rows:
+            self.store.status[store_row] = status
+        self._resort(store_rows)
+        rows = [self.row_of(text) for text in texts]
+        if rows:
+            self.dataChanged.emit(self.index(min(rows)), self.index(max(rows)), [StatusRole])
+        return texts
+
+    def set_reminders(self, texts, reminder):
+        """ Set the same reminder on every task in texts, return the texts changed """
+        texts = [text for text in texts if text in self.store]
+        store_rows = [self.store.row_of(text) for text in texts]
+        due = reminder_due(reminder)
+        for store_row in store_rows:
+            self.store.set_reminder(store_row, reminder, due)
+        self._resort(store_rows)
+        return texts
+
+    @timed()
+    def set_sort(self, sort):
+        """ Show the tasks in one of order.SORT_CHOICES """
+        self.beginResetModel()
+        self.sort = sort
+        name = sorted_by(sort)
+        if name is None:
+            self.shown = None
+        else:
+            # A sorted list needs every task, not only the pages scrolled to so far
+            rows = self._fetch(None)
+            self._append(rows)
+            self._index(rows)
+            self.shown = self.orders.get(name)
+            if self.shown is None:
+                # Sorted once, kept in order from here on
+                self.shown = self.orders[name] = TaskOrder(self.store, name)
+                self.shown.build(self.order)
+        self.endResetModel()
+
+    def set_storage(self, storage):
+        """ Show the tasks in storage, fetched a page at a time as the view scrolls """
+        self.beginResetModel()
+        self.store = TaskStore()
+        self.order = array("i")
+        self.positions = {}
+        self.valid_upto = 0
+        self.storage = storage
+        self.cursor = None
+        self.exhausted = False
+        # The orders index the new store from empty, as rows are fetched
+        self.orders = {name: TaskOrder(self.store, name) for name in self.orders}
+        name = sorted_by(self.sort)
+        self.shown = self.orders.setdefault(name, TaskOrder(self.store, name)) if name is not None else None
+        self.endResetModel()
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and not self.exhausted
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or self.exhausted:
+            return
+        # A sorted list takes everything storage has read so far
+        rows = self._fetch(PAGE_SIZE if self.shown is None else None)
+        if rows:
+            self._insert(rows)
+
+    def _fetch(self, limit):
+        """ Add the next limit stored tasks (all of them if None) to the store, return their rows """
+        if self.exhausted:
+            return []
+        records, self.cursor = self.storage.page(self.cursor, limit)
+        if (limit is None or len(records) < limit) and not self.storage.loading:
+            self.exhausted = True
+        # Tasks added in this session are already shown, they only come back from storage once
+        store = self.store
+        return [store.add(text, reminder, status, reminder_due(reminder))
+                for text, reminder, status in records if text not in store]
+
+
+class TaskFilterModel(QAbstractListModel):
+    """ The rows of a TaskListModel whose text contains a query, in the same order.
+
+    Matching tasks come from a TrigramIndex over every stored task, so a new query
+    costs a lookup per match rather than a pass over all rows. Changes to the source
+    model are mapped through incrementally.
+    """
+
+    def __init__(self, source, search_index, parent=None):
+        super().__init__(parent)
+        self.source = source
+        self.search_index = search_index
+        self.query = ""
+        self.folded = ""
+        self.rows = None  # Sorted source rows shown, None while there is no query
+        self.missing = set()  # Matching texts the source has not fetched from storage yet
+        self.removed = 0  # Source rows being removed, set between the remove signals
+        source.rowsAboutToBeInserted.connect(self._source_about_to_insert)
+        source.rowsInserted.connect(self._source_inserted)
+        source.rowsAboutToBeRemoved.connect(self._source_about_to_remove)
+        source.rowsRemoved.connect(self._source_removed)
+        source.dataChanged.connect(self._source_data_changed)
+        source.modelAboutToBeReset.connect(self.beginResetModel)
+        source.modelReset.connect(self._source_reset)
+
+    @timed()
+    def set_query(self, query):
+        """ Show only the tasks containing query, case-insensitively; "" shows all """
+        self.beginResetModel()
+        self.query = query
+        self.folded = query.casefold()
+        self._match()
+        self.endResetModel()
+        if self.canFetchMore():
+            self.fetchMore()
+
+    def _match(self):
+        if not self.query:
+            self.rows = None
+            self.missing = set()
+            return
+        matches = self.search_index.search(self.query)
+        source = self.source
+        if len(matches) * 4 > source.rowCount():
+            texts = source.store.texts
+            rows = [row for row, store_row in enumerate(source.shown_rows()) if texts[store_row] in matches]
+        else:
+            rows = sorted(source.row_of(text) for text in matches if text in source)
+        self.rows = rows
+        self.missing = {text for text in matches if text not in source}
+
+    def accepts(self, text):
+        return self.folded in text.casefold()
+
+    def tasks_indexed(self, texts):
+        """ Note stored tasks indexed after the query was set, so they get fetched too """
+        if self.rows is not None:
+            self.missing.update(text for text in texts if text not in self.source and self.accepts(text))
+
+    def source_row(self, row):
+        return self.rows[row] if self.rows is not None else row
+
+    def text_at(self, row):
+        """ Return the text of the task shown in row """
+        return self.source.text_at(self.source_row(row))
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.rows) if self.rows is not None else self.source.rowCount()
+
+    def index(self, row, column=0, parent=QModelIndex()):
+        # The view asks for an index per row when laying out, skip the hasIndex() round trip
+        if column == 0 and not parent.isValid() and 0 <= row < len(self.rows if self.rows is not None else self.source.shown_rows()):
+            return self.createIndex(row, 0)
+        return QModelIndex()
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        return self.source.data(self.source.index(self.source_row(index.row())), role)
+
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid():
+            return False
+        return self.source.setData(self.source.index(self.source_row(index.row())), value, role)
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        return self.source.flags(self.source.index(self.source_row(index.row())))
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid() or not self.source.canFetchMore():
+            return False
+        return self.rows is None or bool(self.missing)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.rows is None:
+            self.source.fetchMore(parent)
+            return
+        # Matches can be sparse, keep paging until a screenful turns up or all are in
+        start = len(self.rows)
+        while self.canFetchMore(parent) and len(self.rows) - start < PAGE_SIZE:
+            cursor = self.source.cursor
+            self.source.fetchMore(parent)
+            if self.source.cursor == cursor:
+                break  # Storage has nothing more yet
+
+    def _source_about_to_insert(self, parent, first, last):
+        if self.rows is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def _source_inserted(self, parent, first, last):
+        if self.rows is None:
+            self.endInsertRows()
+            return
+        count = last - first + 1
+        at = bisect_left(self.rows, first)
+        for i in range(at, len(self.rows)):
+            self.rows[i] += count
+        added = []
+        for row in range(first, last + 1):
+            text = self.source.text_at(row)
+            self.missing.discard(text)
+            if self.accepts(text):
+                added.append(row)
+        if added:
+            self.beginInsertRows(QModelIndex(), at, at + len(added) - 1)
+            self.rows[at:at] = added
+            self.endInsertRows()
+
+    def _source_about_to_remove(self, parent, first, last):
+        if self.rows is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+        start = bisect_left(self.rows, first)
+        end = bisect_right(self.rows, last)
+        if start < end:
+            self.beginRemoveRows(QModelIndex(), start, end - 1)
+            del self.rows[start:end]
+            self.endRemoveRows()
+        self.removed = last - first + 1
+
+    def _source_removed(self, parent, first, last):
+        if self.rows is None:
+            self.endRemoveRows()
+            return
+        # Rows after the removed range move up once the source has dropped it
+        for i in range(bisect_left(self.rows, first), len(self.rows)):
+            self.rows[i] -= self.removed
+        self.removed = 0
+
+    def _source_data_changed(self, top_left, bottom_right, roles=()):
+        if self.rows is None:
+            self.dataChanged.emit(self.index(top_left.row()), self.index(bottom_right.row()), roles)
+            return
+        start = bisect_left(self.rows, top_left.row())
+        end = bisect_right(self.rows, bottom_right.row())
+        if start < end:
+            self.dataChanged.emit(self.index(start), self.index(end - 1), roles)
+
+    def _source_reset(self):
+        self._match()
+        self.endResetModel()
+
+
+class TaskDelegate(QStyledItemDelegate):
+    """ Paints a task row as ✅/❌ checkboxes plus its text and handles checkbox clicks """
+
+    MARGIN_X = 10
+    MARGIN_Y = 5
+    SPACING = 10  # Wide spacing for better touch interaction
+    LABELS = ((STATUS_DONE, "✅"), (STATUS_WRONG, "❌"))
+
+    def _style(self, option):
+        return option.widget.style() if option.widget is not None else QApplication.style()
+
+    def _checkbox_rects(self, option):
+        """ Return [(status, label, rect covering indicator and label)] and the text x offset """
+        style = self._style(option)
+        indicator = style.pixelMetric(QStyle.PM_IndicatorWidth, option, option.widget)
+        label_spacing = style.pixelMetric(QStyle.PM_CheckBoxLabelSpacing, option, option.widget)
+        metrics = option.fontMetrics
+        rect = option.rect
+        x = rect.x() + self.MARGIN_X
+        rects = []
+        for status, label in self.LABELS:
+            width = indicator + label_spacing + metrics.horizontalAdvance(label)
+            rects.append((status, label, QRect(x, rect.y(), width, rect.height())))
+            x += width + self.SPACING
+        return rects, x
+
+    def paint(self, painter, option, index):
+        self.initStyleOption(option, index)
+        style = self._style(option)
+        text = option.text
+        option.text = ""
+        # Background and selection highlight only, the text is drawn after the checkboxes
+        style.drawControl(QStyle.CE_ItemViewItem, option, painter, option.widget)
+
+        status = index.data(StatusRole)
+        rects, text_x = self._checkbox_rects(option)
+        for box_status, label, box_rect in rects:
+            button = QStyleOptionButton()
+            button.rect = box_rect
+            button.text = label
+            button.palette = option.palette
+            button.fontMetrics = option.fontMetrics
+            button.state = QStyle.State_Enabled | (QStyle.State_On if status == box_status else QStyle.State_Off)
+            # No widget here, or the view's stylesheet box rules would be painted around each checkbox
+            style.drawControl(QStyle.CE_CheckBox, button, painter, None)
+
+        text_rect = QRect(text_x, option.rect.y(), option.rect.right() - text_x - self.MARGIN_X, option.rect.height())
+        color_role = QPalette.HighlightedText if option.state & QStyle.State_Selected else QPalette.Text
+        painter.save()
+        group = index.data(GroupRole)
+        if group is not None and (index.row() == 0 or index.sibling(index.row() - 1, 0).data(GroupRole) != group):
+            # First row of a group in the GROUP_DUE view: a rule above it and the group's name on the right
+            painter.setPen(option.palette.color(QPalette.Mid))
+            painter.drawLine(option.rect.topLeft(), option.rect.topRight())
+            painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignRight, group)
+            text_rect.setRight(text_rect.right() - option.fontMetrics.horizontalAdvance(group) - self.SPACING)
+        painter.setPen(option.palette.color(color_role))
+        painter.drawText(text_rect, Qt.AlignVCenter | Qt.AlignLeft, text)
+        painter.restore()
+
+    def sizeHint(self, option, index):
+        style = self._style(option)
+        indicator = style.pixelMetric(QStyle.PM_IndicatorHeight, option, option.widget)
+        height = max(indicator, option.fontMetrics.height()) + 2 * self.MARGIN_Y
+        return QSize(option.rect.width(), height)
+
+    def editorEvent(self, event, model, option, index):
+        if event.type() not in (QEvent.MouseButtonPress, QEvent.MouseButtonRelease, QEvent.MouseButtonDblClick):
+            return False
+        rects, _ = self._checkbox_rects(option)
+        for status, label, box_rect in rects:
+            if box_rect.contains(event.pos()):
+                # Like an exclusive button group: the clicked box is checked and the other cleared
+                if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+                    model.setData(index, status, StatusRole)
+                return True
+        return False
@@ -0,0 +1,168 @@
+import sys
+from array import array
+
+# numpy once imported, False if it is not installed. It is imported on the first reminder
+# query instead of at startup, importing it takes longer than opening either window
+_numpy = None
+
+# Done/wrong state of a task, shown as the ✅/❌ checkboxes
+STATUS_NONE = 0
+STATUS_DONE = 1
+STATUS_WRONG = 2
+STATUS_REMOVED = -1  # Status of a row whose task was removed
+
+NO_REMINDER = -1  # Next occurrence of a task without a pending reminder
+
+
+def load_numpy():
+    """ Return numpy, or None if it is not installed """
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+        except ImportError:
+            numpy = False
+        _numpy = numpy
+    return _numpy or None
+
+
+def due_minute(due):
+    """ Epoch seconds (or None) to the minute stored in the due column """
+    return NO_REMINDER if due is None else int(due // 60)
+
+
+class TaskStore:
+    """ Tasks in parallel columns indexed by row: interned text, status byte, reminder rule
+    and the reminder's next occurrence.
+
+    Rows are appended and never renumbered, so a row is a stable task id. Removing a
+    task leaves a hole (text None, status STATUS_REMOVED). The next occurrence is kept
+    in minutes since the epoch, worked out by whoever sets the reminder, so due and
+    count questions are answered over whole columns without looking at the rules,
+    with NumPy when it is installed.
+    """
+
+    def __init__(self):
+        self.texts = []  # row -> text, None once removed
+        self.status = array("b")
+        self.reminders = []  # row -> interned reminder rule, None if unset
+        self.due = array("i")  # row -> next occurrence in epoch minutes, NO_REMINDER if none
+        self.rows = {}  # text -> row
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __contains__(self, text):
+        return text in self.rows
+
+    def row_of(self, text):
+        return self.rows.get(text)
+
+    def add(self, text, reminder=None, status=STATUS_NONE, due=None):
+        """ Insert a task, or update it if text is already stored; return its row.
+
+        due is the reminder's next occurrence in epoch seconds, if the caller tracks it.
+        """
+        row = self.rows.get(text)
+        reminder = sys.intern(reminder) if reminder else None
+        if row is None:
+            text = sys.intern(text)
+            row = len(self.texts)
+            self.texts.append(text)
+            self.status.append(status)
+            self.reminders.append(reminder)
+            self.due.append(due_minute(due))
+            self.rows[text] = row
+        else:
+            self.status[row] = status
+            self.reminders[row] = reminder
+            self.due[row] = due_minute(due)
+        return row
+
+    def extend(self, records):
+        """ Append (text, reminder, status, due) tasks known not to be stored yet.
+
+        The bulk version of add(), with the per-call overhead taken out of the loop.
+        """
+        intern = sys.intern
+        texts, status, reminders, due, rows = self.texts, self.status, self.reminders, self.due, self.rows
+        for text, reminder, state, when in records:
+            text = intern(text)
+            rows[text] = len(texts)
+            texts.append(text)
+            status.append(state)
+            reminders.append(intern(reminder) if reminder else None)
+            due.append(NO_REMINDER if when is None else int(when // 60))
+
+    def remove(self, text):
+        """ Drop a task, return the row it had or None """
+        row = self.rows.pop(text, None)
+        if row is not None:
+            self.texts[row] = None
+            self.status[row] = STATUS_REMOVED
+            self.reminders[row] = None
+            self.due[row] = NO_REMINDER
+        return row
+
+    def rename(self, row, text):
+        """ Give the task in row a new text, keeping its row """
+        del self.rows[self.texts[row]]
+        text = sys.intern(text)
+        self.texts[row] = text
+        self.rows[text] = row
+
+    def reminder(self, row):
+        return self.reminders[row]
+
+    def set_reminder(self, row, reminder, due=None):
+        self.reminders[row] = sys.intern(reminder) if reminder else None
+        self.due[row] = due_minute(due)
+
+    def due_at(self, row):
+        """ Next occurrence of the task's reminder in epoch seconds, None if none is pending """
+        minute = self.due[row]
+        return minute * 60 if minute != NO_REMINDER else None
+
+    def set_due(self, row, due):
+        self.due[row] = due_minute(due)
+
+    def record(self, row):
+        """ The (text, reminder, status) row of a stored task """
+        return self.texts[row], self.reminders[row], self.status[row]
+
+    def get(self, text):
+        row = self.rows.get(text)
+        return self.record(row) if row is not None else None
+
+    def page(self, cursor=None, limit=None):
+        """ Return (records, cursor) for up to limit tasks from row cursor on, skipping holes """
+        row = cursor or 0
+        texts = self.texts
+        records = []
+        while row < len(texts) and (limit is None or len(records) < limit):
+            if texts[row] is not None:
+                records.append(self.record(row))
+            row += 1
+        return records, row
+
+    def count(self, status=None):
+        """ Number of tasks, or of tasks with the given status """
+        if status is None:
+            return len(self.rows)
+        return self.status.count(status)
+
+    def due_rows(self, start=None, end=None):
+        """ Rows whose next occurrence falls in [start, end], epoch seconds, open ended if None """
+        if not self.due:
+            return []
+        first = 0 if start is None else due_minute(start)
+        last = 2 ** 31 - 1 if end is None else due_minute(end)
+        numpy = load_numpy()
+        if numpy is not None:
+            minutes = numpy.frombuffer(self.due, dtype=numpy.int32)
+            return numpy.flatnonzero((minutes >= first) & (minutes <= last)).tolist()
+        return [row for row, minute in enumerate(self.due) if first <= minute <= last]
+
+    def due_between(self, start=None, end=None):
+        """ Return (text, reminder, due) for reminders next due in [start, end], epoch seconds """
+        return [(self.texts[row], self.reminders[row], self.due[row] * 60) for row in self.due_rows(start, end)]
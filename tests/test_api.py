@@ -0,0 +1,142 @@
+import threading
+
+import pytest
+
+from api import ApiClient, ApiError, ApiServer, TaskCalls, INTERNAL_ERROR, INVALID_PARAMS, METHOD_NOT_FOUND, TASK_ERROR
+from storage import JsonStorage, SqliteStorage
+from taskstore import STATUS_NONE
+
+
+class BrokenStorage(JsonStorage):
+    """ Storage whose lookups fail, as a bug or a damaged file would """
+
+    def get(self, text):
+        raise RuntimeError("storage is broken")
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = JsonStorage(str(tmp_path / "tasks.json"))
+    yield storage
+    storage.close()
+
+
+def call(method, params, call_id=1):
+    return {"jsonrpc": "2.0", "id": call_id, "method": method, "params": params}
+
+
+def error_code(response):
+    return response["error"]["code"]
+
+
+def test_calls_are_gathered_until_flush(storage):
+    calls = TaskCalls(storage)
+    assert calls.run(call("add", ["a"]))["result"]["text"] == "a"
+    assert calls.run(call("update", {"text": "a", "new_text": "b"}))["result"]["text"] == "b"
+    assert storage.count() == 0
+    calls.flush()
+    assert storage.get("b") == ("b", None, STATUS_NONE)
+    assert calls.changes == {"a": None, "b": ("b", None, STATUS_NONE)}
+
+
+def texts(storage):
+    return [row[0] for row in storage.page()[0]]
+
+
+@pytest.mark.parametrize("updates, expected, renamed", [
+    ([("b", "B")], ["a", "B", "c"], [("b", "B")]),
+    ([("b", "x"), ("x", "y")], ["a", "y", "c"], [("b", "y")]),
+    ([("b", "x"), ("x", "b")], ["a", "b", "c"], []),
+])
+def test_rename_keeps_position(tmp_path, updates, expected, renamed):
+    for storage in (JsonStorage(str(tmp_path / "tasks.json")), SqliteStorage(str(tmp_path / "tasks.db"))):
+        try:
+            storage.put_many((text, None, STATUS_NONE) for text in "abc")
+            calls = TaskCalls(storage)
+            for text, new_text in updates:
+                assert "result" in calls.run(call("update", {"text": text, "new_text": new_text, "status": 1}))
+            calls.flush()
+            assert texts(storage) == expected
+            assert storage.get(expected[1])[2] == 1
+            assert calls.renamed == renamed
+        finally:
+            storage.close()
+
+
+def test_rename_then_remove(storage):
+    storage.put_many((text, None, STATUS_NONE) for text in "abc")
+    calls = TaskCalls(storage)
+    calls.run(call("update", {"text": "b", "new_text": "x"}))
+    calls.run(call("remove", ["x"]))
+    calls.flush()
+    assert texts(storage) == ["a", "c"]
+    assert calls.renamed == []
+
+
+def test_rename_task_added_in_the_batch(storage):
+    storage.put("a", None, STATUS_NONE)
+    calls = TaskCalls(storage)
+    calls.run(call("add", ["new"]))
+    calls.run(call("update", {"text": "new", "new_text": "newer"}))
+    calls.flush()
+    assert texts(storage) == ["a", "newer"]
+
+
+@pytest.mark.parametrize("message, code", [
+    (call("nope", []), METHOD_NOT_FOUND),
+    (call("add", {"text": ""}), INVALID_PARAMS),
+    (call("add", {"wrong": "a"}), INVALID_PARAMS),
+    (call("add", ["a", "not a reminder"]), INVALID_PARAMS),
+    (call("remove", ["missing"]), TASK_ERROR),
+])
+def test_call_errors(storage, message, code):
+    assert error_code(TaskCalls(storage).run(message)) == code
+
+
+def test_notification_has_no_response(storage):
+    assert TaskCalls(storage).run({"jsonrpc": "2.0", "method": "add", "params": ["a"]}) is None
+
+
+def test_unexpected_error_fails_only_that_call(tmp_path, capsys):
+    storage = BrokenStorage(str(tmp_path / "tasks.json"))
+    try:
+        calls = TaskCalls(storage)
+        response = calls.run(call("add", ["a"], 7))
+        assert response["id"] == 7 and error_code(response) == INTERNAL_ERROR
+        assert "storage is broken" in capsys.readouterr().out
+        assert calls.run(call("list", {}))["result"]["tasks"] == []
+    finally:
+        storage.close()
+
+
+def test_server_answers_through_process(tmp_path):
+    storage = BrokenStorage(str(tmp_path / "tasks.json"))
+    server = ApiServer("127.0.0.1:0")
+    wake = threading.Event()
+    server.listener = wake.set
+    server.start()
+    done = threading.Event()
+
+    def app():
+        # Stands in for the app's thread, woken by the listener
+        while not done.is_set():
+            if wake.wait(0.05):
+                wake.clear()
+                more = True
+                while more:
+                    changes, renamed, more = server.process(storage)
+
+    thread = threading.Thread(target=app)
+    thread.start()
+    client = ApiClient(server.address)
+    try:
+        with pytest.raises(ApiError) as error:
+            client.call("add", "a")
+        assert error.value.code == INTERNAL_ERROR
+        assert client.call("list")["tasks"] == []
+    finally:
+        client.close()
+        done.set()
+        thread.join()
+        server.close()
+        storage.close()
@@ -0,0 +1,50 @@
+import wave
+
+import pytest
+
+from audio import AudioService
+
+
+def failing_init(self):
+    raise RuntimeError("No audio device")
+
+
+def test_failed_start_is_logged_once_and_reported_on_play(monkeypatch, capsys):
+    monkeypatch.setattr(AudioService, "_init", failing_init)
+    audio = AudioService()
+    try:
+        assert audio.preload("ring.wav").result() is None
+        assert audio.preload("other.wav").result() is None
+        assert capsys.readouterr().out.count("No audio device") == 1
+        error = audio.play_later("ring.wav").exception()
+        assert isinstance(error, RuntimeError) and str(error) == "No audio device"
+    finally:
+        audio.close()
+
+
+def write_wav(path, seconds=0.1, rate=22050):
+    with wave.open(str(path), "wb") as file:
+        file.setnchannels(1)
+        file.setsampwidth(2)
+        file.setframerate(rate)
+        file.writeframes(b"\0\0" * int(rate * seconds))
+
+
+def test_preload_caches_and_evicts(tmp_path, monkeypatch):
+    pytest.importorskip("pygame")
+    monkeypatch.setenv("SDL_AUDIODRIVER", "dummy")
+    paths = [tmp_path / f"{i}.wav" for i in range(3)]
+    for path in paths:
+        write_wav(path)
+    audio = AudioService()
+    try:
+        sound = audio.preload(str(paths[0])).result()
+        assert sound is not None
+        assert audio.preload(str(paths[0])).result() is sound
+        audio.cache_bytes = audio.cache_size * 2
+        for path in paths[1:]:
+            audio.preload(str(path)).result()
+        assert list(audio.sounds) == [str(path) for path in paths[1:]]
+        audio.play(str(paths[2]))
+    finally:
+        audio.close()
@@ -0,0 +1,94 @@
+import io
+
+import pytest
+
+from bulk import export_tasks, guess_format, import_tasks, FORMATS
+from storage import JsonStorage, SqliteStorage
+from taskstore import STATUS_DONE, STATUS_NONE, STATUS_WRONG
+
+ROWS = [
+    ("Buy milk", None, STATUS_NONE),
+    ('Call "mum", later', "daily 09:00", STATUS_DONE),
+    ("ünïcødé ✓", "2026-10-20 14:30", STATUS_WRONG),
+]
+
+
+@pytest.fixture(params=["json", "sqlite"])
+def storage(request, tmp_path):
+    if request.param == "json":
+        storage = JsonStorage(str(tmp_path / "tasks.json"))
+    else:
+        storage = SqliteStorage(str(tmp_path / "tasks.db"))
+    yield storage
+    storage.close()
+
+
+def stored(storage):
+    return storage.page()[0]
+
+
+@pytest.mark.parametrize("file_format", FORMATS)
+def test_round_trip(storage, tmp_path, file_format):
+    storage.put_many(ROWS)
+    out = io.StringIO(newline="")
+    assert export_tasks(out, file_format, storage, batch_size=2) == len(ROWS)
+    other = JsonStorage(str(tmp_path / "other.json"))
+    try:
+        stats = import_tasks(io.StringIO(out.getvalue(), newline=""), file_format, other, batch_size=2)
+        assert (stats.read, stats.added, stats.skipped, stats.bad_reminders) == (3, 3, 0, 0)
+        if file_format == "text":
+            # Plain text carries no status
+            assert stored(other) == [(text, reminder, STATUS_NONE) for text, reminder, status in ROWS]
+        else:
+            assert stored(other) == ROWS
+    finally:
+        other.close()
+
+
+def test_csv_duplicates_and_invalid_rows(storage):
+    storage.put("Existing", None, STATUS_NONE)
+    data = (
+        "status,text,reminder\n"
+        "1,Existing,\n"
+        "0,a,daily 09:00\n"
+        "2,b,not a rule\n"
+        "7,c\n"
+        "x,a,\n"
+        ",,\n"
+        "1,d,25:00\n"
+    )
+    stats = import_tasks(io.StringIO(data), "csv", storage, batch_size=2)
+    assert (stats.read, stats.added, stats.skipped, stats.bad_reminders) == (7, 4, 1, 2)
+    assert stored(storage) == [
+        ("Existing", None, STATUS_NONE),
+        ("a", "daily 09:00", STATUS_NONE),
+        ("b", None, STATUS_WRONG),
+        ("c", None, STATUS_NONE),  # Unknown status
+        ("d", None, STATUS_DONE),
+    ]
+
+
+def test_csv_without_header(storage):
+    stats = import_tasks(io.StringIO("a,daily 09:00,1\nb\n"), "csv", storage)
+    assert stats.added == 2
+    assert stored(storage) == [("a", "daily 09:00", STATUS_DONE), ("b", None, STATUS_NONE)]
+
+
+def test_jsonl_strings_objects_and_duplicates(storage):
+    data = '"a"\n\n{"task_text": "b", "reminder_time": "weekdays 08:00", "status": 2}\n"a"\n{"text": ""}\n'
+    stats = import_tasks(io.StringIO(data), "jsonl", storage, batch_size=1)
+    assert (stats.read, stats.added, stats.skipped) == (4, 2, 1)
+    assert stored(storage) == [("a", None, STATUS_NONE), ("b", "weekdays 08:00", STATUS_WRONG)]
+
+
+def test_text_with_reminders(storage):
+    stats = import_tasks(io.StringIO("a\tdaily 09:00\n  \nb\tbad\n"), "text", storage)
+    assert (stats.added, stats.skipped, stats.bad_reminders) == (2, 1, 1)
+    assert stored(storage) == [("a", "daily 09:00", STATUS_NONE), ("b", None, STATUS_NONE)]
+
+
+@pytest.mark.parametrize("path, file_format", [
+    ("t.csv", "csv"), ("t.JSONL", "jsonl"), ("t.ndjson", "jsonl"), ("todo.txt", "text"), ("-", "text"),
+])
+def test_guess_format(path, file_format):
+    assert guess_format(path) == file_format
@@ -0,0 +1,98 @@
+import pytest
+
+from history import changes_size, UndoHistory
+from storage import JsonStorage
+from taskstore import STATUS_DONE, STATUS_NONE
+
+
+def apply(storage, changes):
+    """ What the apps do with undo() and redo() results """
+    storage.delete_many([text for text, row in changes if row is None])
+    storage.put_many([row for text, row in changes if row is not None])
+
+
+def snapshot(storage):
+    return storage.page()[0]
+
+
+@pytest.fixture
+def storage(tmp_path):
+    storage = JsonStorage(str(tmp_path / "tasks.json"))
+    storage.put_many((f"task {i}", "daily 09:00" if i % 2 else None, STATUS_NONE) for i in range(10))
+    yield storage
+    storage.close()
+
+
+def test_undo_redo_batched_delete(storage):
+    history = UndoHistory()
+    original = snapshot(storage)
+    texts = ["task 1", "task 4", "task 7"]
+    before = [(text, storage.get(text)) for text in texts]
+    storage.delete_many(texts)
+    history.record(before, [(text, None) for text in texts])
+    deleted = snapshot(storage)
+
+    apply(storage, history.undo())
+    assert sorted(snapshot(storage)) == sorted(original)
+    assert not history.can_undo and history.can_redo
+    apply(storage, history.redo())
+    assert snapshot(storage) == deleted
+    assert history.can_undo and not history.can_redo
+
+
+def test_undo_several_actions_in_turn(storage):
+    history = UndoHistory()
+    states = [snapshot(storage)]
+    edits = [
+        [("task 0", ("task 0", None, STATUS_DONE))],
+        [("task 2", None), ("task 3", None)],
+        [("new", ("new", "daily 10:00", STATUS_NONE))],
+    ]
+    for after in edits:
+        history.record([(text, storage.get(text)) for text, row in after], after)
+        apply(storage, after)
+        states.append(snapshot(storage))
+    for state in reversed(states[:-1]):
+        apply(storage, history.undo())
+        assert sorted(snapshot(storage)) == sorted(state)
+    assert history.undo() is None
+    apply(storage, history.redo())
+    assert sorted(snapshot(storage)) == sorted(states[1])
+
+
+def test_record_drops_redo():
+    history = UndoHistory()
+    history.record([("a", None)], [("a", ("a", None, 0))])
+    history.undo()
+    history.record([("b", None)], [("b", ("b", None, 0))])
+    assert not history.can_redo
+    assert history.bytes == changes_size([("b", None)]) + changes_size([("b", ("b", None, 0))])
+
+
+def test_empty_action_is_not_kept():
+    history = UndoHistory()
+    history.record([], [])
+    assert not history.can_undo
+
+
+def test_depth_limit():
+    history = UndoHistory(max_depth=3)
+    for i in range(5):
+        history.record([(str(i), None)], [(str(i), (str(i), None, 0))])
+    assert len(history) == 3
+    assert [history.undo()[0][0] for _ in range(3)] == ["4", "3", "2"]
+    assert history.undo() is None
+
+
+def test_byte_limit():
+    action = ([("a" * 1000, None)], [("a" * 1000, ("a" * 1000, None, 0))])
+    size = changes_size(action[0]) + changes_size(action[1])
+    history = UndoHistory(max_bytes=size * 2)
+    for _ in range(5):
+        history.record(*action)
+    assert len(history) == 2 and history.bytes == size * 2
+    # An action bigger than the limit clears the history, older ones can't be replayed without it
+    history = UndoHistory(max_bytes=size - 1)
+    history.record([("b", None)], [("b", ("b", None, 0))])
+    history.record(*action)
+    assert len(history) == 0 and history.bytes == 0
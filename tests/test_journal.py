@@ -0,0 +1,115 @@
+import io
+import json
+
+import pytest
+
+from journal import JsonObjectStream, TaskJournal
+
+SAMPLE = {
+    "buy milk": None,
+    "pay rent": {"reminder_time": "2026-10-17 14:30", "status": 1, "done_at": 1792225800},
+    "ünïcødé ✓": {"task_text": "ünïcødé ✓", "reminder_time": ""},
+    "numbers": [12.25, -1.5e10, 1E-7, 0, -0.5, 123456789, True, False, None],
+    "nested": {"a": [], "b": {}, "c": 'say "hi" \\ \u00e9'},
+    "last": 42,
+}
+
+
+def stream(data, chunk_size):
+    return list(JsonObjectStream(io.BytesIO(data), chunk_size))
+
+
+@pytest.mark.parametrize("indent", [None, 1])
+def test_stream_every_chunk_size(indent):
+    data = json.dumps(SAMPLE, ensure_ascii=False, indent=indent).encode("utf-8")
+    for chunk_size in range(1, len(data) + 2):
+        assert stream(data, chunk_size) == list(SAMPLE.items()), chunk_size
+
+
+@pytest.mark.parametrize("text", ['{"a":12.25}', '{"a":1.5e10}', '{"a":-3e+2}', '{"a":7}'])
+def test_stream_number_at_every_split(text):
+    data = text.encode("utf-8")
+    for chunk_size in range(1, len(data) + 1):
+        assert stream(data, chunk_size) == list(json.loads(text).items()), chunk_size
+
+
+@pytest.mark.parametrize("text", ["{}", " { } "])
+def test_stream_empty(text):
+    assert stream(text.encode("utf-8"), 1) == []
+
+
+@pytest.mark.parametrize("text", ['{"a" 1}', '{"a":1 "b":2}', '{"a":1', '{"a":12.}'])
+def test_stream_malformed(text):
+    with pytest.raises(ValueError):
+        stream(text.encode("utf-8"), 2)
+
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = TaskJournal(str(tmp_path / "tasks.json"), debounce=0)
+    yield journal
+    journal.close()
+
+
+def reopened(journal):
+    journal.close()
+    return TaskJournal(journal.path, debounce=0)
+
+
+def replayed(journal):
+    """ What load() and stream() both read back, in order """
+    other = reopened(journal)
+    try:
+        loaded = list(other.load().items())
+        assert list(other.stream()) == loaded
+        return loaded
+    finally:
+        other.close()
+
+
+def write_sample(journal):
+    for key, value in SAMPLE.items():
+        journal.set(key, value)
+    journal.flush()
+
+
+def test_journal_replays_over_snapshot(journal):
+    write_sample(journal)
+    journal.compact()
+    journal.delete("buy milk")
+    journal.set("pay rent", None)
+    journal.set("new", 1.5)
+    journal.flush()
+    expected = dict(SAMPLE)
+    del expected["buy milk"]
+    expected["pay rent"] = None
+    expected["new"] = 1.5
+    assert replayed(journal) == list(expected.items())
+
+
+def test_compaction_truncates_journal(journal):
+    write_sample(journal)
+    journal.compact()
+    journal.flush()
+    assert journal.journal_size == 0
+    with open(journal.path, encoding="utf-8") as file:
+        assert json.load(file) == SAMPLE
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_rename_keeps_position(journal, compact):
+    write_sample(journal)
+    journal.compact()
+    journal.rename("pay rent", "pay bills", None)
+    if compact:
+        journal.compact()
+    journal.flush()
+    keys = [key for key, value in replayed(journal)]
+    assert keys == ["buy milk", "pay bills", "ünïcødé ✓", "numbers", "nested", "last"]
+
+
+def test_damaged_last_record_is_skipped(journal):
+    write_sample(journal)
+    with open(journal.journal_path, "ab") as file:
+        file.write(b'["s","torn",')
+    assert dict(replayed(journal)) == SAMPLE
@@ -0,0 +1,128 @@
+import random
+from bisect import bisect_left
+from datetime import datetime
+
+import pytest
+
+from order import (SortedList, TaskOrder, due_group, reminder_key, sorted_by, GROUP_DUE, SORT_ADDED, SORT_REMINDER,
+                   SORT_STATUS, SORT_TEXT, DUE_LATER, DUE_TODAY, NO_DUE, OVERDUE)
+from taskstore import TaskStore, STATUS_DONE, STATUS_NONE, STATUS_WRONG
+
+NOW = datetime(2026, 10, 17, 12, 0).timestamp()
+
+
+def check(items, reference):
+    assert len(items) == len(reference)
+    assert list(items) == reference
+    assert items.maxes == [chunk[-1] for chunk in items.chunks]
+    assert all(items.chunks)
+    for chunk in range(len(items.chunks)):
+        assert items._start(chunk) == sum(map(len, items.chunks[:chunk]))
+
+
+@pytest.mark.parametrize("load", [1, 2, 5, 1000])
+def test_sorted_list_matches_a_list(load):
+    rng = random.Random(load)
+    reference = sorted(rng.sample(range(10000), 300))
+    items = SortedList(reversed(reference), load)
+    check(items, reference)
+    for step in range(2000):
+        item = rng.randrange(10000)
+        if item in reference:
+            position = reference.index(item)
+            assert items.index(item) == position
+            assert items.remove(item) == position
+            reference.remove(item)
+        else:
+            position = bisect_left(reference, item)
+            assert items.bisect_left(item) == position
+            assert items.add(item) == position
+            reference.insert(position, item)
+        if step % 100 == 0:
+            check(items, reference)
+            for position in rng.sample(range(len(reference)), 20):
+                assert items[position] == reference[position]
+    check(items, reference)
+
+
+def test_sorted_list_empties_and_refills():
+    items = SortedList(load=2)
+    assert items.bisect_left(5) == 0
+    for item in range(10):
+        items.add(item)
+    for item in range(10):
+        assert items.remove(item) == 0
+    check(items, [])
+    assert items.add(3) == 0
+    check(items, [3])
+
+
+def test_sorted_list_errors():
+    items = SortedList([1, 3], load=1)
+    with pytest.raises(ValueError):
+        items.index(2)
+    with pytest.raises(ValueError):
+        items.remove(4)
+    with pytest.raises(IndexError):
+        items[2]
+
+
+@pytest.fixture
+def store():
+    store = TaskStore()
+    for text, minutes, status in [("b", 30, STATUS_NONE), ("A", None, STATUS_DONE), ("c", -30, STATUS_WRONG),
+                                  ("gone", None, STATUS_NONE), ("D", 24 * 60, STATUS_NONE)]:
+        due = None if minutes is None else NOW + minutes * 60
+        store.add(text, "rule" if due else None, status, due)
+    store.remove("gone")
+    return store
+
+
+def texts(store, order):
+    return [store.texts[row] for row in order]
+
+
+@pytest.mark.parametrize("sort, expected", [
+    (SORT_TEXT, ["A", "b", "c", "D"]),
+    (SORT_REMINDER, ["c", "b", "D", "A"]),
+    (SORT_STATUS, ["b", "D", "c", "A"]),
+])
+def test_build_skips_removed_rows(store, sort, expected):
+    order = TaskOrder(store, sort)
+    order.build(range(len(store.texts)))
+    assert texts(store, order) == expected
+    assert [order.position(row) for row in order] == list(range(len(expected)))
+    assert order.position(store.rows["A"]) == expected.index("A")
+    assert 3 not in order  # The row of "gone", removed
+
+
+def test_add_remove_and_move(store):
+    order = TaskOrder(store, SORT_TEXT)
+    order.build(range(len(store.texts)))
+    row = store.add("B")
+    # Equal when folded, so the text itself breaks the tie
+    assert order.locate(row) == 1
+    assert order.add(row) == 1
+    assert texts(store, order) == ["A", "B", "b", "c", "D"]
+    assert order.remove(store.rows["A"]) == 0
+    assert order.remove(store.rows["A"]) is None
+    row = store.rows["c"]
+    store.rename(row, "a")
+    assert order.stale(row)
+    assert order.move(row) == (2, 0)
+    assert not order.stale(row)
+    assert texts(store, order) == ["a", "B", "b", "D"]
+
+
+def test_groups(store):
+    order = TaskOrder(store, sorted_by(GROUP_DUE))
+    order.build(range(len(store.texts)))
+    groups = [order.group(row, NOW) for row in order]
+    assert groups == [OVERDUE, DUE_TODAY, DUE_LATER, NO_DUE]
+    assert due_group(reminder_key(store, store.rows["b"]), NOW + 3600) == OVERDUE
+
+
+def test_sorted_by():
+    assert sorted_by(SORT_ADDED) is None
+    assert sorted_by(GROUP_DUE) == SORT_REMINDER
+    assert sorted_by(SORT_TEXT) == SORT_TEXT
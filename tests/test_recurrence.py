@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pytest
+
+from recurrence import first_due, legacy_once, parse_rule, rule_from_input, DAILY, ONCE
+
+NOW = datetime(2026, 10, 17, 12, 0)
+
+
+def test_bare_time_later_today_is_today():
+    assert rule_from_input("14:30", NOW) == "2026-10-17 14:30"
+
+
+@pytest.mark.parametrize("text", ["9:15", "12:00", "00:00"])
+def test_bare_time_already_passed_is_tomorrow(text):
+    rule = rule_from_input(text, NOW)
+    assert parse_rule(rule).kind == ONCE
+    assert first_due(rule, NOW) > NOW
+
+
+def test_stored_bare_time_is_daily():
+    assert parse_rule("14:30").kind == DAILY
+
+
+def test_every_starts_now():
+    assert rule_from_input("every  3h", NOW) == "every 3h from 2026-10-17 12:00"
+
+
+def test_malformed_input():
+    with pytest.raises(ValueError):
+        rule_from_input("25:00", NOW)
+
+
+@pytest.mark.parametrize("reminder, expected", [
+    ("14:30", "2026-10-17 14:30"),
+    (" 9:15 ", "2026-10-18 09:15"),
+    ("daily 09:00", "daily 09:00"),
+    ("2026-10-01 08:00", "2026-10-01 08:00"),
+    ("25:00", "25:00"),
+])
+def test_legacy_once(reminder, expected):
+    assert legacy_once(reminder, NOW) == expected
@@ -0,0 +1,44 @@
+from scheduler import ReminderScheduler, MAX_TIMER_SLEEP
+
+
+def test_pop_due_in_order():
+    scheduler = ReminderScheduler()
+    scheduler.schedule("later", 300)
+    scheduler.schedule("first", 100)
+    scheduler.schedule("second", 200)
+    assert scheduler.next_due() == 100
+    assert scheduler.pop_due(200) == [("first", 100), ("second", 200)]
+    assert list(scheduler._entries) == ["later"]
+    assert scheduler.pop_due(299) == []
+
+
+def test_reschedule_and_cancel():
+    scheduler = ReminderScheduler()
+    scheduler.schedule("a", 100)
+    scheduler.schedule("a", 500)
+    scheduler.schedule("b", 200)
+    scheduler.cancel("b")
+    scheduler.cancel("missing")
+    assert len(scheduler) == 1 and "a" in scheduler and "b" not in scheduler
+    assert scheduler.pop_due(1000) == [("a", 500)]
+    assert scheduler.next_due() is None
+
+
+def test_dead_entries_are_dropped():
+    scheduler = ReminderScheduler()
+    for i in range(1000):
+        scheduler.schedule(i, i)
+    for i in range(999):
+        scheduler.cancel(i)
+    assert len(scheduler._heap) <= 2 * len(scheduler) + 64
+    assert scheduler.pop_due(10 ** 6) == [(999, 999)]
+
+
+def test_seconds_until_next():
+    scheduler = ReminderScheduler()
+    assert scheduler.seconds_until_next(0) is None
+    scheduler.schedule("a", 30)
+    assert scheduler.seconds_until_next(0) == 30
+    assert scheduler.seconds_until_next(100) == 0
+    scheduler.schedule("a", 10 ** 6)
+    assert scheduler.seconds_until_next(0) == MAX_TIMER_SLEEP
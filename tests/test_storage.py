@@ -0,0 +1,207 @@
+import json
+import time
+
+import pytest
+
+from recurrence import first_due, parse_rule, DAILY, ONCE
+from storage import JsonStorage, SqliteStorage, open_storage, DEFAULT_JSON_PATH, LAYOUT_KIVY, LAYOUT_QT
+from taskstore import STATUS_DONE, STATUS_NONE
+
+TEXTS = ["a", "b", "c", "d"]
+
+
+def texts(storage):
+    rows, cursor = storage.page()
+    return [row[0] for row in rows]
+
+
+@pytest.fixture(params=[LAYOUT_QT, LAYOUT_KIVY])
+def json_storage(request, tmp_path):
+    storage = JsonStorage(str(tmp_path / "tasks.json"), request.param)
+    storage.put_many((text, None, STATUS_NONE) for text in TEXTS)
+    yield storage
+    storage.close()
+
+
+def reopen(storage, stream=False):
+    storage.close()
+    storage = JsonStorage(storage.path, storage.layout)
+    if stream:
+        storage.start_loading()
+        while storage.load_step(1):
+            pass
+    return storage
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_rename_keeps_position_in_journal(json_storage, stream):
+    json_storage.save()
+    json_storage.rename("b", "B", "2026-10-17 14:30", STATUS_NONE)
+    assert texts(json_storage) == ["a", "B", "c", "d"]
+    storage = reopen(json_storage, stream)
+    try:
+        assert texts(storage) == ["a", "B", "c", "d"]
+        assert storage.get("B") == ("B", "2026-10-17 14:30", STATUS_NONE)
+    finally:
+        storage.close()
+
+
+def test_rename_keeps_position_in_snapshot(json_storage):
+    json_storage.rename("c", "C")
+    json_storage.save()
+    with open(json_storage.path, encoding="utf-8") as file:
+        assert list(json.load(file)) == ["a", "b", "C", "d"]
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_rename_twice(json_storage, stream):
+    json_storage.save()
+    json_storage.rename("a", "x")
+    json_storage.rename("x", "y")
+    json_storage.put("a", None, STATUS_NONE)
+    storage = reopen(json_storage, stream)
+    try:
+        assert sorted(texts(storage)) == ["a", "b", "c", "d", "y"]
+        assert texts(storage).index("y") < texts(storage).index("b")
+    finally:
+        storage.close()
+
+
+def test_rename_keeps_done_time(json_storage):
+    json_storage.put("a", None, STATUS_DONE)
+    done_at = json_storage.done_at["a"]
+    json_storage.rename("a", "A", None, STATUS_DONE)
+    assert json_storage.done_at == {"A": done_at}
+
+
+def test_sqlite_rename_keeps_position(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "tasks.db"))
+    try:
+        storage.put_many((text, None, STATUS_NONE) for text in TEXTS)
+        storage.rename("b", "B")
+        assert texts(storage) == ["a", "B", "c", "d"]
+    finally:
+        storage.close()
+
+
+def test_other_instance_hears_of_rename(json_storage):
+    json_storage.save()
+    other = JsonStorage(json_storage.path, json_storage.layout)
+    try:
+        assert other.count() == len(TEXTS)
+        json_storage.rename("b", "B")
+        json_storage.journal.flush()
+        other.journal.refresh()
+        other.journal.flush()
+        assert sorted(other.take_changes()) == [("B", ("B", None, STATUS_NONE)), ("b", None)]
+        assert sorted(texts(other)) == ["B", "a", "c", "d"]
+    finally:
+        other.close()
+
+
+@pytest.mark.parametrize("layout", [LAYOUT_QT, LAYOUT_KIVY])
+@pytest.mark.parametrize("compact", [False, True])
+def test_sqlite_first_run_after_import(tmp_path, monkeypatch, layout, compact):
+    monkeypatch.chdir(tmp_path)
+    storage = JsonStorage(DEFAULT_JSON_PATH, layout)
+    storage.put_many((text, None, STATUS_NONE) for text in TEXTS)
+    if compact:
+        storage.save()
+    storage.close()
+    storage = open_storage(layout, "sqlite")
+    try:
+        assert storage.created
+        assert storage.exists()
+        assert texts(storage) == TEXTS
+    finally:
+        storage.close()
+
+
+def test_sqlite_new_database_is_empty(tmp_path):
+    storage = SqliteStorage(str(tmp_path / "tasks.db"))
+    try:
+        assert not storage.exists()
+    finally:
+        storage.close()
+
+
+def test_close_twice(tmp_path):
+    for storage in (JsonStorage(str(tmp_path / "tasks.json")), SqliteStorage(str(tmp_path / "tasks.db"))):
+        storage.put("a", None, STATUS_NONE)
+        storage.close()
+        storage.close()
+
+
+def test_archiving_does_not_read_the_archive(tmp_path, monkeypatch):
+    path = str(tmp_path / "tasks.json")
+    storage = JsonStorage(path)
+    storage.put_many((f"old {i}", None, STATUS_DONE) for i in range(50))
+    assert len(storage.archive_done(time.time() + 1)) == 50
+    storage.archive.compact()
+    storage.close()
+
+    storage = JsonStorage(path)
+    try:
+        storage.put("new", None, STATUS_DONE)
+        reads = []
+        monkeypatch.setattr(storage.archive, "_read_state", lambda: reads.append(1) or {})
+        assert storage.archive_done(time.time() + 1) == ["new"]
+        storage.archive.flush()
+        assert reads == []
+        assert list(storage.archive.saved) == ["new"]
+        monkeypatch.undo()
+        rows, cursor = storage.archive_page()
+        assert len(rows) == 51
+    finally:
+        storage.close()
+
+
+LEGACY = [("call mum", "9:05"), ("no reminder", ""), ("stand-up", "daily 10:00")]
+
+
+def write_legacy(path, layout):
+    """ A tasks.json as the apps saved it before recurring reminders """
+    if layout == LAYOUT_KIVY:
+        tasks = {text: {"task_text": text, "reminder_time": reminder} for text, reminder in LEGACY}
+    else:
+        tasks = {text: reminder for text, reminder in LEGACY}
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(tasks, file)
+
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_legacy_kivy_time_is_once(tmp_path, stream):
+    path = str(tmp_path / "tasks.json")
+    write_legacy(path, LAYOUT_KIVY)
+    storage = reopen(JsonStorage(path, LAYOUT_KIVY), stream)
+    try:
+        text, reminder, status = storage.get("call mum")
+        assert parse_rule(reminder).kind == ONCE
+        assert first_due(reminder) == first_due("9:05")  # The next 09:05
+        assert storage.get("no reminder")[1] is None
+        assert storage.get("stand-up")[1] == "daily 10:00"
+        storage.journal.flush()
+        assert JsonStorage(path, LAYOUT_KIVY).journal.load()["call mum"]["reminder_time"] == reminder
+    finally:
+        storage.close()
+
+
+def test_legacy_qt_time_stays_daily(tmp_path):
+    path = str(tmp_path / "tasks.json")
+    write_legacy(path, LAYOUT_QT)
+    storage = JsonStorage(path, LAYOUT_QT)
+    try:
+        assert parse_rule(storage.get("call mum")[1]).kind == DAILY
+    finally:
+        storage.close()
+
+
+def test_legacy_kivy_time_imported_as_once(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_legacy(DEFAULT_JSON_PATH, LAYOUT_KIVY)
+    storage = open_storage(LAYOUT_KIVY, "sqlite")
+    try:
+        assert parse_rule(storage.get("call mum")[1]).kind == ONCE
+    finally:
+        storage.close()
@@ -0,0 +1,72 @@
+import pytest
+
+pytest.importorskip("PyQt5")
+
+from PyQt5.QtWidgets import QApplication
+
+from order import SORT_ADDED, SORT_TEXT
+from taskmodel import TaskListModel
+
+TEXTS = ["a", "b", "c", "d", "e"]
+
+
+@pytest.fixture(scope="module")
+def app():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture(params=[SORT_ADDED, SORT_TEXT])
+def model(request, app):
+    model = TaskListModel()
+    model.set_sort(request.param)
+    for text in TEXTS:
+        model.add_task(text)
+    return model
+
+
+def shown(model):
+    return [model.text_at(row) for row in range(model.rowCount())]
+
+
+def check(model):
+    """ Every shown task is found at its row, in the store and in the order added """
+    for row, text in enumerate(shown(model)):
+        assert model.row_of(text) == row
+    assert sorted(shown(model)) == sorted(text for text in model.store.texts if text is not None)
+    added = [model.store.texts[store_row] for store_row in model.order]
+    for row, text in enumerate(added):
+        assert model._added_row(text) == row
+
+
+def test_edit_after_remove(model):
+    model.remove_task("b")
+    assert model.replace_task("d", "z")
+    expected = ["a", "c", "z", "e"] if model.sort == SORT_ADDED else ["a", "c", "e", "z"]
+    assert shown(model) == expected
+    check(model)
+    model.remove_task("z")
+    assert shown(model) == ["a", "c", "e"]
+    check(model)
+
+
+def test_edit_after_removing_several(model):
+    assert sorted(model.remove_tasks(["a", "b"])) == ["a", "b"]
+    assert model.replace_task("d", "z")
+    assert model.task("z") == ("z", None, 0)
+    assert "d" not in model
+    check(model)
+    model.remove_task("c")
+    assert sorted(shown(model)) == ["e", "z"]
+    check(model)
+
+
+def test_sorted_view_moves_edited_task(app):
+    model = TaskListModel()
+    for text in TEXTS:
+        model.add_task(text)
+    model.set_sort(SORT_TEXT)
+    model.replace_task("a", "x")
+    assert shown(model) == ["b", "c", "d", "e", "x"]
+    model.set_sort(SORT_ADDED)
+    assert shown(model) == ["x", "b", "c", "d", "e"]
+    check(model)
@@ -0,0 +1,95 @@
+import random
+
+import pytest
+
+import taskstore
+from taskstore import TaskStore, due_minute, NO_REMINDER, STATUS_DONE, STATUS_NONE, STATUS_REMOVED, STATUS_WRONG
+
+
+@pytest.fixture(params=["numpy", "python"])
+def columns(request, monkeypatch):
+    """ Run due queries with NumPy where it is installed, and without it """
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(taskstore, "_numpy", False)
+
+
+def test_add_update_remove():
+    store = TaskStore()
+    assert store.add("a", "daily 09:00", STATUS_NONE, 600) == 0
+    assert store.add("b") == 1
+    assert store.add("a", None, STATUS_DONE) == 0
+    assert store.get("a") == ("a", None, STATUS_DONE)
+    assert store.due_at(0) is None
+    assert store.remove("a") == 0
+    assert store.remove("a") is None
+    assert "a" not in store and len(store) == 1
+    assert store.status[0] == STATUS_REMOVED and store.due[0] == NO_REMINDER
+    assert store.add("a") == 2  # Rows are never reused
+
+
+def test_page_skips_holes():
+    store = TaskStore()
+    store.extend((text, None, STATUS_NONE, None) for text in "abcde")
+    store.remove("b")
+    store.remove("c")
+    rows, cursor = store.page(None, 2)
+    assert [row[0] for row in rows] == ["a", "d"] and cursor == 4
+    rows, cursor = store.page(cursor, 2)
+    assert [row[0] for row in rows] == ["e"] and cursor == 5
+    assert store.page(cursor) == ([], 5)
+
+
+def test_rename_keeps_row():
+    store = TaskStore()
+    store.extend((text, None, STATUS_NONE, None) for text in "ab")
+    store.rename(0, "x")
+    assert store.row_of("x") == 0 and "a" not in store
+    assert [row[0] for row in store.page()[0]] == ["x", "b"]
+
+
+def test_count():
+    store = TaskStore()
+    store.extend((str(i), None, (STATUS_NONE, STATUS_DONE, STATUS_WRONG)[i % 3], None) for i in range(30))
+    store.remove("0")
+    store.remove("1")
+    assert store.count() == 28
+    assert store.count(STATUS_NONE) == 9
+    assert store.count(STATUS_DONE) == 9
+    assert store.count(STATUS_WRONG) == 10
+
+
+def test_due_between_matches_a_scan(columns):
+    rng = random.Random(13)
+    store = TaskStore()
+    due = {}
+    for i in range(500):
+        when = rng.choice([None, rng.randrange(10 ** 9, 10 ** 9 + 10 ** 6)])
+        store.add(f"task {i}", "rule" if when else None, STATUS_NONE, when)
+        due[f"task {i}"] = when
+    for i in range(0, 500, 7):
+        store.remove(f"task {i}")
+        del due[f"task {i}"]
+    ranges = [(None, None), (10 ** 9 + 1000, 10 ** 9 + 50000), (None, 10 ** 9 + 3000), (10 ** 9 + 9 * 10 ** 5, None)]
+    for start, end in ranges:
+        expected = {
+            text for text, when in due.items()
+            if when is not None and (start is None or due_minute(when) >= due_minute(start))
+            and (end is None or due_minute(when) <= due_minute(end))
+        }
+        found = store.due_between(start, end)
+        assert {text for text, reminder, when in found} == expected
+        assert all(when == due_minute(due[text]) * 60 for text, reminder, when in found)
+
+
+def test_due_between_empty(columns):
+    assert TaskStore().due_between() == []
+
+
+def test_set_due():
+    store = TaskStore()
+    row = store.add("a", "daily 09:00", STATUS_NONE, 125)
+    assert store.due_at(row) == 120  # Kept to the minute
+    store.set_due(row, None)
+    assert store.due_between() == []
@@ -0,0 +1,109 @@
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QColor, QFont, QPalette
+from PyQt5.QtWidgets import QAbstractItemView, QWidget
+
+DEFAULT_THEME = "light"
+THEMES = {
+    "light": {"window": "#F0F0F0", "base": "#FFFFFF", "text": "#000000", "border": "#CCCCCC"},
+    "dark": {"window": "#2E2E2E", "base": "#3E3E3E", "text": "#E0E0E0", "border": "#555555"},
+}
+
+FONT_FAMILY = "Arial"
+
+# Rules every theme shares. Item views are left out of the stylesheet on purpose: a
+# widget matched by any rule keeps the palette it was polished with, and polishing a
+# view again lays out all of its rows, so the task list takes its colours from the palette.
+COMMON_RULES = """
+QLineEdit, QPushButton, QDateTimeEdit, QComboBox, QSpinBox {
+    border-radius: 5px;
+    padding: 5px;
+}
+QPushButton {
+    font-size: 16px;
+}
+QLabel {
+    font-size: 18px;
+}
+"""
+
+# Colours of one theme, scoped to widgets inside a window whose theme property names it.
+# The window itself is not matched, its background comes from the palette.
+THEME_RULES = """
+{scope} QLabel, {scope} QProgressBar, {scope} QCheckBox {{
+    color: {text};
+}}
+{scope} QLineEdit, {scope} QPushButton, {scope} QDateTimeEdit, {scope} QComboBox, {scope} QSpinBox {{
+    background-color: {base};
+    color: {text};
+    border: 1px solid {border};
+}}
+"""
+
+
+def build_stylesheet():
+    """ One stylesheet holding every theme, so it only has to be parsed once """
+    rules = [COMMON_RULES]
+    for name, colors in THEMES.items():
+        rules.append(THEME_RULES.format(scope=f'*[theme="{name}"]', **colors))
+    return "".join(rules)
+
+
+def build_palette(colors):
+    palette = QPalette()
+    for role, key in (
+        (QPalette.Window, "window"), (QPalette.WindowText, "text"),
+        (QPalette.Base, "base"), (QPalette.AlternateBase, "window"), (QPalette.Text, "text"),
+        (QPalette.Button, "base"), (QPalette.ButtonText, "text"),
+        (QPalette.ToolTipBase, "base"), (QPalette.ToolTipText, "text"),
+    ):
+        palette.setColor(role, QColor(colors[key]))
+    return palette
+
+
+class ThemeManager:
+    """ Switches windows between THEMES without handing Qt a new stylesheet.
+
+    The stylesheet for all themes is set on the application once. Switching sets the
+    window's theme property, which selects that theme's rules, and re-polishes the
+    window's buttons and fields. Item views, dialogs and everything else the
+    stylesheet doesn't reach follow the theme's QPalette, built once per theme. The
+    task list only repaints its visible rows, so switching costs the same at any
+    number of tasks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.palettes = {}
+        font = QFont(FONT_FAMILY)
+        font.setStyleHint(QFont.SansSerif)
+        app.setFont(font)
+        app.setStyleSheet(build_stylesheet())
+
+    def palette(self, name):
+        palette = self.palettes.get(name)
+        if palette is None:
+            palette = self.palettes[name] = build_palette(THEMES[name])
+        return palette
+
+    def apply(self, window, name):
+        if name not in THEMES:
+            name = DEFAULT_THEME
+        palette = self.palette(name)
+        self.app.setPalette(palette)
+        window.setProperty("theme", name)
+        self._restyle(window, palette)
+        return name
+
+    def _restyle(self, widget, palette):
+        if isinstance(widget, QAbstractItemView):
+            # Under a stylesheet views don't pick up the application palette by themselves,
+            # and polishing a view again would lay out all of its rows
+            widget.setPalette(palette)
+            widget.viewport().setPalette(palette)
+            return
+        # Dynamic properties don't restyle by themselves, polish the widget again
+        style = widget.style()
+        style.unpolish(widget)
+        style.polish(widget)
+        for child in widget.findChildren(QWidget, options=Qt.FindDirectChildrenOnly):
+            self._restyle(child, palette)